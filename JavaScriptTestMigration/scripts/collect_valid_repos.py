@@ -3,26 +3,81 @@ import subprocess
 import json
 import fnmatch
 import csv
-import requests
+import argparse
+import contextlib
 import concurrent.futures
 
 from collections import Counter
 
-from ..utils.utils import run_parallel_package_checks
-from ..utils.utils import read_names_from_csv
+from ..utils.utils import iter_names_from_csv
+from ..utils.utils import parse_shard
+from ..utils.checkpoint import Checkpoint
+from ..utils.async_package_checks import run_async_package_checks
+from ..utils.async_package_checks import reclassify_from_cache
+from ..utils.manifest_cache import ManifestCache, MANIFEST_CACHE_PATH
+from ..utils.branch_resolver import BranchResolver
+from ..utils.framework_tally import FrameworkTally, ProgressView
+from ..utils.result_sink import ResultSink
+from ..utils.async_package_checks import DEFAULT_MAX_CONCURRENCY, DEFAULT_REQUESTS_PER_SECOND, RAW_GITHUB_URL
 from ..constants import SEART_REPOS
 
 # python -m JavaScriptTestMigration.scripts.collect_valid_repos
-def main():
-    repos = read_names_from_csv(SEART_REPOS)
-    print("Repos: ", len(repos))
+def main(max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, base_url=RAW_GITHUB_URL, cache_path=MANIFEST_CACHE_PATH, offline=False, progress_interval=None, shard=None, checkpoint_path=None):
+    checkpoint = Checkpoint(checkpoint_path) if checkpoint_path else None
+    if checkpoint is not None:
+        print(f"Skipping {len(checkpoint)} repos already processed")
+    default_branches = {}
+    # Names are read lazily, so probing starts as soon as the first row is parsed
+    repos = iter_names_from_csv(SEART_REPOS, shard=shard, done=checkpoint, default_branches=default_branches)
     UI_framework = ['react', '@angular/core', 'vue', 'svelte', 'preact']
     UI_test_framework = ['enzyme', '@testing-library/react', '@angular/core',  '@testing-library/angular', '@testing-library/vue', '@vue/test-utils', '@testing-library/svelte', '@testing-library/preact', 'preact-render-spy', 'preact']
     unit_test_library = ['jest', 'chai', 'mocha', 'jasmine', 'karma', 'jasmine-core']
 
-    nested_counter = {framework: Counter() for framework in UI_framework}
+    tally = FrameworkTally(UI_framework, UI_test_framework, unit_test_library)
+    progress = ProgressView(tally, progress_interval) if progress_interval else contextlib.nullcontext()
 
-    run_parallel_package_checks(repos, nested_counter, UI_framework, UI_test_framework, unit_test_library)
-    print("All checks completed: ", str(nested_counter))
+    cache = ManifestCache(cache_path) if cache_path else None
+    resolver = BranchResolver(csv_branches=default_branches)
+    try:
+        with ResultSink() as sink, progress:
+            if offline:
+                # Reclassify the manifests fetched by a previous run without any network requests
+                reclassify_from_cache(cache, tally, UI_framework, UI_test_framework, unit_test_library, repos, sink=sink, resolver=resolver)
+            else:
+                try:
+                    run_async_package_checks(repos, tally, UI_framework, UI_test_framework, unit_test_library, max_concurrency=max_concurrency, requests_per_second=requests_per_second, base_url=base_url, cache=cache, resolver=resolver, sink=sink, checkpoint=checkpoint)
+                finally:
+                    resolver.save()
+    finally:
+        if cache is not None:
+            cache.close()
+        if checkpoint is not None:
+            checkpoint.close()
+
+    summary = tally.summary()
+    print(f"All checks completed: {summary.checked} checked, {summary.matched} matched")
+    for combo, count in summary.combinations.most_common():
+        print(f"{combo.ui_framework}, {combo.test_framework}, {combo.unit_library}: {count}")
+    return summary
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Collect repositories that use a UI test framework')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY,
+                        help='maximum number of package.json requests in flight')
+    parser.add_argument('--rate', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help='maximum number of requests started per second (0 for no limit)')
+    parser.add_argument('--base-url', default=RAW_GITHUB_URL,
+                        help='raw content host, e.g. a local stub_package_server')
+    parser.add_argument('--cache', default=MANIFEST_CACHE_PATH,
+                        help='path of the package.json cache (empty string disables it)')
+    parser.add_argument('--offline', action='store_true',
+                        help='reclassify the cached package.json files without fetching')
+    parser.add_argument('--progress', type=float, default=None, metavar='SECONDS',
+                        help='log progress every SECONDS while checking')
+    parser.add_argument('--shard', type=parse_shard, default=None, metavar='i/N',
+                        help='only check shard i of N (0-based) of the CSV')
+    parser.add_argument('--checkpoint', default=None,
+                        help='file of processed repos; finished repos are skipped on restart')
+    args = parser.parse_args()
+    if args.offline and not args.cache:
+        parser.error('--offline requires --cache')
+    main(max_concurrency=args.concurrency, requests_per_second=args.rate, base_url=args.base_url, cache_path=args.cache, offline=args.offline, progress_interval=args.progress, shard=args.shard, checkpoint_path=args.checkpoint)
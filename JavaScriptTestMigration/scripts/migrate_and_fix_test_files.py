@@ -1,15 +1,13 @@
-from openai import OpenAI
 import subprocess
 from ..constants import *
 from ..repo_names.enzyme_repos_with_running_tests import repos
 # from ..repo_names.rtl_repos_with_running_tests import repos
+from ..utils.import_diff import added_packages
+from ..utils.llm_gateway import gateway
 from ..utils.utils import verify_tests_can_run
 import os
 import argparse
 
-# Set up your OpenAI API key
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 def PACKAGE_UPDATE_PROMPT(package_json_file, error_file_content, history):
     return f"Here is a package.json file: {package_json_file}.\n\
             These dependencies were added previously: {history}\n\n \
@@ -30,7 +28,7 @@ def write_file(file_path, content):
         file.write(content)
 
 def make_changes_to_content(content, original_test_framework, new_test_framework, error_file_content):
-    response = client.chat.completions.create(
+    return gateway.complete_sync(
         model="gpt-4o-mini",
         messages=[
             {"role": "user", "content":f"Here is a test file that was previously migrated from {original_test_framework} to {new_test_framework}:\n\n{content}\n\n \
@@ -45,11 +43,10 @@ def make_changes_to_content(content, original_test_framework, new_test_framework
             }
         ],
     )
-    return response.choices[0].message.content
 
 def make_changes_to_package(history, package_json_file, original_test_framework, new_test_framework, error_file_content):
     print("History: ", history)
-    response = client.chat.completions.create(
+    return gateway.complete_sync(
         model="gpt-4o-mini",
         messages=[
             {"role": "assistant", "content": f"Previously added packages: {history}"},
@@ -57,19 +54,6 @@ def make_changes_to_package(history, package_json_file, original_test_framework,
             }
         ],
     )
-    return response.choices[0].message.content
-
-def list_new_packages(original_file,updated_file):
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "assistant", "content": original_file},
-            {"role": "assistant", "content": updated_file},
-            {"role": "user", "content":f"List all of the new imports that you added to this file. Separate each package with a comma. Only respond with the package names."
-            }
-        ],
-    )
-    return response.choices[0].message.content
 
 def find_test_files(repo_path):
     full_path = ABSOLUTE_PATH + repo_path
@@ -138,13 +122,7 @@ def main(repo_name):
             write_file(output_file_path, modified_content)
 
             print(f"Modified content has been written to {output_file_path}")
-            new_packages_list = list_new_packages(content, modified_content)
-            # Split the comma-separated list and strip any surrounding whitespace from each item
-            items = [item.strip() for item in new_packages_list.split(',')]
-            
-            # Add each item to the set
-            for item in items:
-                new_packages.add(item)
+            new_packages.update(added_packages(content, modified_content))
 
         package_json_file_path = ABSOLUTE_PATH + repo + '/package.json'
         package_json_file = read_file(package_json_file_path) 
@@ -1,7 +1,14 @@
-from openai import OpenAI
 import subprocess
 from ..constants import *
 from ..utils.utils import *
+from ..utils.node_modules_cache import prepare_node_modules, store_node_modules
+from ..utils.results_store import ResultsStore
+from ..utils.import_diff import added_packages
+from ..utils.llm_batch import POLL_INTERVAL, BatchJob
+from ..utils.llm_cache import cache_key
+from ..utils.llm_gateway import gateway
+from ..utils.pipeline import Pipeline, Stage
+from ..utils.scheduler import PHASE_LIMITS, scheduler
 
 import logging
 import os
@@ -19,8 +26,9 @@ FRAMEWORK_CONVERSION_INFO = {
     'new': '@testing-library/react'
 }
 
-# Set up your OpenAI API key
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Concurrent LLM-bound migrations in the pipeline's migrate stage
+MIGRATION_WORKERS = 32
+
 
 def read_file(file_path):
     print("FILE: ", file_path)
@@ -33,10 +41,12 @@ def write_file(file_path, content):
     with open(file_path, 'w') as file:
         file.write(content)
 
-def make_changes_to_content(content, original_test_framework, new_test_framework):
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+MIGRATION_MODEL = "gpt-4o-mini"
+# Part of the LLM cache key; bump it to re-request files whose prompt text did not change
+MIGRATION_PROMPT_VERSION = "1"
+
+def migration_messages(content, original_test_framework, new_test_framework):
+    return [
             {"role": "user", "content":f"Here is a text file content:\n\n{content}\n\nPlease perform the following tasks:\
                 1. Complete the conversion for the test file.\
                 2. Convert all test cases and ensure the same number of tests in the file\
@@ -49,21 +59,17 @@ def make_changes_to_content(content, original_test_framework, new_test_framework
                 9. Maintain the original organization and naming of describe and it blocks.\
                 10. VERY IMPORTANT: Do not include code tags or any comments. Return only the updated file"
             }
-        ],
-    )
-    return response.choices[0].message.content
-
-def list_new_packages(original_file,updated_file):
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "assistant", "content": original_file},
-            {"role": "assistant", "content": updated_file},
-            {"role": "user", "content":f"List all of the new imports that you added to this file. Separate each package with a comma. Only respond with the package names."
-            }
-        ],
+        ]
+
+async def make_changes_to_content_async(content, original_test_framework, new_test_framework):
+    return await gateway.complete(
+        model=MIGRATION_MODEL,
+        messages=migration_messages(content, original_test_framework, new_test_framework),
+        prompt_version=MIGRATION_PROMPT_VERSION,
     )
-    return response.choices[0].message.content
+
+def make_changes_to_content(content, original_test_framework, new_test_framework):
+    return gateway.run(make_changes_to_content_async(content, original_test_framework, new_test_framework))
 
 def find_test_files(repo_path):
     full_path = os.path.join(ABSOLUTE_PATH_MIGRATION, repo_path)
@@ -209,24 +215,29 @@ def install_jest(repo_path, is_yarn_repo):
         RuntimeError: If the installation command fails.
     """
     if is_yarn_repo:
-        command = ['yarn', 'add', '--dev', 'jest@24' , 'babel-jest@24']
+        command = package_manager_command(True, ['add', '--dev', 'jest@24' , 'babel-jest@24'])
     else:
-        command = ['npm', 'install', '--save-dev', 'jest@24', 'babel-jest@24']
+        command = package_manager_command(False, ['install', '--save-dev', 'jest@24', 'babel-jest@24'])
 
     logger.info(f"Installing Jest using {'Yarn' if is_yarn_repo else 'npm'}...")
-    result = subprocess.run(
-        command,
-        cwd=repo_path,
-        capture_output=True,
-        text=True,
-        timeout=GLOBAL_TIMEOUT
-    )
+    # Start from the cached node_modules so the package manager only adds what changed
+    prepare_node_modules(repo_path)
+    with scheduler.admit('install'):
+        result = subprocess.run(
+            command,
+            cwd=repo_path,
+            capture_output=True,
+            text=True,
+            timeout=GLOBAL_TIMEOUT,
+            env=package_manager_env()
+        )
 
     if result.returncode != 0:
         error_message = result.stderr.strip() or 'Unknown error'
         logger.error(f"Failed to install Jest: {error_message}")
         raise RuntimeError(f"Jest installation failed: {error_message}")
 
+    store_node_modules(repo_path)
     logger.info("Jest installation successful.")
 
 def update_package_json_for_jest(repo_path):
@@ -287,12 +298,23 @@ def update_package_json_for_jest(repo_path):
         json.dump(package_json, f, indent=2)
         logger.info("package.json updated successfully.")
 
-def process_repository(repo):
+# Root the migrated repositories are verified from
+VERIFY_ROOT = '/home/jovyan/code/JavaScriptTesting/JavaScriptTestMigration/JavaScriptTestMigration/react_enzyme_repositories_zero_shot'
+
+def new_migration_job(repo):
     repo_name = os.path.basename(repo['repo_name'])
     full_repo_path = os.path.join(ABSOLUTE_PATH_MIGRATION, repo_name)
-    is_yarn_repo = os.path.exists(os.path.join(full_repo_path, 'yarn.lock'))
-    new_packages = set()
-    migrated_test_files = 0
+    return {
+        'repo': repo,
+        'repo_name': repo_name,
+        'full_repo_path': full_repo_path,
+        'is_yarn_repo': os.path.exists(os.path.join(full_repo_path, 'yarn.lock')),
+        'new_packages': set(),
+        'migrated_paths': [],
+    }
+
+def setup_repository(job):
+    repo_name, full_repo_path = job['repo_name'], job['full_repo_path']
 
     # Add Jest to the repository
     try:
@@ -300,14 +322,18 @@ def process_repository(repo):
         setup_jest_dom_configuration(full_repo_path)
     except Exception as e:
         logger.error(f"Error adding Jest to '{repo_name}': {e}")
-        return
+        return None
 
     # Add new packages
     try:
-        add_new_packages(full_repo_path, is_yarn_repo)
+        add_new_packages(full_repo_path, job['is_yarn_repo'])
     except Exception as e:
         logger.error(f"Error adding new packages in '{repo_name}': {e}")
-        return
+        return None
+    return job
+
+def migrate_repository(job):
+    repo_name, full_repo_path = job['repo_name'], job['full_repo_path']
 
     # Find test files
     try:
@@ -315,48 +341,169 @@ def process_repository(repo):
         logger.info(f"Found {len(test_files)} test files in repository '{repo_name}'")
     except Exception as e:
         logger.error(f"Error finding test files in '{repo_name}': {e}")
-        return
+        return None
 
-    # Process each test file
-    for file_path in test_files:
-        try:
-            if process_test_file(file_path, new_packages):
-                migrated_test_files += 1
-        except Exception as e:
-            logger.error(f"Error processing file '{file_path}': {e}")
+    # Process the repository's test files concurrently; the gateway enforces the rate limits
+    results = gateway.run_all(process_test_file_async(file_path, job['new_packages']) for file_path in test_files)
+    for file_path, result in zip(test_files, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error processing file '{file_path}': {result}")
+        elif result:
+            job['migrated_paths'].append(file_path)
 
-    if migrated_test_files == 0:
+    if not job['migrated_paths']:
         logger.info(f"No test files migrated in repository '{repo_name}'")
-        return
+        return None
+    return job
 
+def reinstall_repository(job):
+    # Picks up manifest changes made during migration; verification then finds node_modules up to date
+    if not install_dependencies(os.path.join(VERIFY_ROOT, job['repo_name']), 0):
+        logger.error(f"Error reinstalling dependencies in '{job['repo_name']}'")
+    return job
+
+def verify_repository(job, results_store=None, run_id=None):
     # Re-run the test suite
     try:
         verify_tests_can_run(
-            '/home/jovyan/code/JavaScriptTesting/JavaScriptTestMigration/JavaScriptTestMigration/react_enzyme_repositories_zero_shot', 
-            repo_name, 
+            VERIFY_ROOT, 
+            job['repo_name'], 
             0, 
             '/home/jovyan/code/JavaScriptTesting/JavaScriptTestMigration/JavaScriptTestMigration/repo_names/react/Enzyme/repos_migrated.txt', 
             '/home/jovyan/code/JavaScriptTesting/JavaScriptTestMigration/JavaScriptTestMigration/repo_names/react/Enzyme/repos_migrated_failures.txt', 
             True, 
             False, 
-            migrated_test_files, 
-            False
+            len(job['migrated_paths']), 
+            False,
+            results_store=results_store,
+            run_id=run_id,
+            # Only the migrated files are re-run; the rest keep their baseline results
+            test_files=job['migrated_paths'],
+            baseline_run=results_store.latest_run(phase='baseline') if results_store is not None else None
         )
     except Exception as e:
-        logger.error(f"Error verifying tests in '{repo_name}': {e}")
-
-def process_test_file(file_path, new_packages):
-    content = read_file(file_path)
+        logger.error(f"Error verifying tests in '{job['repo_name']}': {e}")
+    return job
+
+def process_repository(repo, results_store=None, run_id=None):
+    job = new_migration_job(repo)
+    for stage in (setup_repository, migrate_repository, reinstall_repository):
+        job = stage(job)
+        if job is None:
+            return
+    verify_repository(job, results_store, run_id)
+
+def migration_pipeline(results_store=None, run_id=None, migrate=migrate_repository):
+    """
+    Builds the setup -> migrate -> reinstall -> test pipeline. Each stage has its own
+    workers, so repositories waiting on the LLM do not hold up installs and test runs.
+    `migrate` replaces the migrate stage, e.g. with apply_batch_results in batch mode.
+    """
+    return Pipeline([
+        Stage('setup', setup_repository, workers=PHASE_LIMITS['install']),
+        # Workers mostly wait on the LLM
+        Stage('migrate', migrate, workers=MIGRATION_WORKERS),
+        Stage('reinstall', reinstall_repository, workers=PHASE_LIMITS['install']),
+        Stage('test', lambda job: verify_repository(job, results_store, run_id), workers=PHASE_LIMITS['test']),
+    ], describe=lambda job: job['repo_name'])
+
+def needs_migration(file_path, content):
     original_framework = FRAMEWORK_CONVERSION_INFO['original']
     new_framework = FRAMEWORK_CONVERSION_INFO['new']
 
     if original_framework not in content and new_framework not in content:
         logger.info(f"Skipping '{file_path}': Does not contain '{original_framework}' or '{new_framework}'")
         return False
+    return True
+
+def queue_batch_migration(repos, batch_job):
+    """
+    Queues the migration prompt of every test file in `repos` on a new `batch_job`.
+    Nothing in the repositories is modified until the results are applied.
+
+    Returns:
+        int: Number of queued test files.
+    """
+    queued = set()
+    for repo in repos:
+        repo_name = os.path.basename(repo['repo_name'])
+        if repo_name in queued:
+            # Same clone directory: a repeated entry, or a repository of the same name under another owner
+            logger.warning(f"Skipping '{repo['repo_name']}': '{repo_name}' is already queued")
+            continue
+        queued.add(repo_name)
+        try:
+            test_files = find_test_files(os.path.join(ABSOLUTE_PATH_MIGRATION, repo_name))
+        except Exception as e:
+            logger.error(f"Error finding test files in '{repo_name}': {e}")
+            continue
+        for i, file_path in enumerate(test_files):
+            try:
+                content = read_file(file_path)
+            except (OSError, UnicodeDecodeError) as e:
+                logger.error(f"Error reading file '{file_path}': {e}")
+                continue
+            if not needs_migration(file_path, content):
+                continue
+            messages = migration_messages(content, FRAMEWORK_CONVERSION_INFO['original'], FRAMEWORK_CONVERSION_INFO['new'])
+            # Ids include the owner, so they stay unique across owners
+            batch_job.add(f"{repo['repo_name'].replace('/', '__')}-{i}", messages, {'repo': repo, 'file_path': file_path})
+    return len(batch_job.state['requests'])
+
+def batch_migration_jobs(batch_job):
+    """
+    Groups the finished results of `batch_job` into one migration job per repository.
+    Failed requests are included without content and re-requested through the gateway.
+    """
+    jobs = {}
+    for custom_id, metadata, content, error in batch_job.results():
+        if error is not None:
+            logger.warning(f"Batch request for '{metadata['file_path']}' failed ({error}), it will be requested directly")
+        repo_name = os.path.basename(metadata['repo']['repo_name'])
+        if repo_name not in jobs:
+            jobs[repo_name] = new_migration_job(metadata['repo'])
+            jobs[repo_name]['batch_results'] = []
+        jobs[repo_name]['batch_results'].append((custom_id, metadata['file_path'], content))
+    return list(jobs.values())
+
+def apply_batch_results(job, batch_job):
+    """
+    Migrate stage of batch mode: writes the returned files instead of calling the LLM.
+    Files whose batch request failed are migrated with a direct request instead; if that
+    fails too, they stay unapplied and are tried again when the job is collected next.
+    """
+    for custom_id, file_path, modified_content in job['batch_results']:
+        try:
+            content = read_file(file_path)
+            if modified_content is None:
+                modified_content = make_changes_to_content(content, FRAMEWORK_CONVERSION_INFO['original'], FRAMEWORK_CONVERSION_INFO['new'])
+            elif gateway.cache is not None:
+                # Cached like a direct request, so later runs without --batch reuse the result
+                messages = migration_messages(content, FRAMEWORK_CONVERSION_INFO['original'], FRAMEWORK_CONVERSION_INFO['new'])
+                gateway.cache.put(cache_key(MIGRATION_MODEL, messages, MIGRATION_PROMPT_VERSION), modified_content, MIGRATION_MODEL)
+            apply_migrated_content(file_path, content, modified_content, job['new_packages'])
+        except Exception as e:
+            logger.error(f"Error applying the batch result to '{file_path}': {e}")
+            continue
+        job['migrated_paths'].append(file_path)
+        batch_job.mark_applied([custom_id])
+
+    if not job['migrated_paths']:
+        logger.info(f"No test files migrated in repository '{job['repo_name']}'")
+        return None
+    return job
+
+async def process_test_file_async(file_path, new_packages):
+    content = read_file(file_path)
+    if not needs_migration(file_path, content):
+        return False
 
     # Make changes to the content using OpenAI API
-    modified_content = make_changes_to_content(content, original_framework, new_framework)
+    modified_content = await make_changes_to_content_async(
+        content, FRAMEWORK_CONVERSION_INFO['original'], FRAMEWORK_CONVERSION_INFO['new'])
+    return apply_migrated_content(file_path, content, modified_content, new_packages)
 
+def apply_migrated_content(file_path, content, modified_content, new_packages):
     # Remove code tags if any
     modified_content = remove_code_tags_from_string(modified_content)
 
@@ -365,31 +512,36 @@ def process_test_file(file_path, new_packages):
     logger.info(f"Modified content written to '{file_path}'")
 
     # List new packages
-    new_packages_list = list_new_packages(content, modified_content)
-    items = [item.strip() for item in new_packages_list.split(',') if item.strip()]
-    new_packages.update(items)
+    new_packages.update(added_packages(content, modified_content))
     return True
 
+def process_test_file(file_path, new_packages):
+    return gateway.run(process_test_file_async(file_path, new_packages))
+
 def add_new_packages(repo_path, is_yarn_repo):
     if is_yarn_repo:
-        command = ['yarn', 'add', '--dev', '@testing-library/react@12', '@testing-library/jest-dom@6']
+        command = package_manager_command(True, ['add', '--dev', '@testing-library/react@12', '@testing-library/jest-dom@6'])
     else:
-        command = ['npm', 'install', '--save-dev', '@testing-library/react@12', '@testing-library/jest-dom@6']
+        command = package_manager_command(False, ['install', '--save-dev', '@testing-library/react@12', '@testing-library/jest-dom@6'])
 
     logger.info(f"Adding new packages in '{repo_path}' using {'Yarn' if is_yarn_repo else 'npm'}")
-    result = subprocess.run(
-        command,
-        cwd=repo_path,
-        capture_output=True,
-        text=True,
-        timeout=GLOBAL_TIMEOUT
-    )
+    prepare_node_modules(repo_path)
+    with scheduler.admit('install'):
+        result = subprocess.run(
+            command,
+            cwd=repo_path,
+            capture_output=True,
+            text=True,
+            timeout=GLOBAL_TIMEOUT,
+            env=package_manager_env()
+        )
 
     if result.returncode != 0:
         error_message = result.stderr.strip() or 'Unknown error'
         logger.error(f"Failed to add new packages: {error_message}")
         raise RuntimeError(f"Package installation failed: {error_message}")
 
+    store_node_modules(repo_path)
     logger.info("New packages added successfully")
 
 def is_jest_dom_installed(repo_path):
@@ -417,8 +569,9 @@ def install_jest_dom(repo_path, is_yarn_repo):
         repo_path (str): The file system path to the repository.
         is_yarn_repo (bool): True if the repository uses Yarn, False if it uses npm.
     """
-    command = ['yarn', 'add', '@testing-library/jest-dom', '--dev'] if is_yarn_repo else ['npm', 'install', '@testing-library/jest-dom', '--save-dev']
-    subprocess.run(command, cwd=repo_path, check=True)
+    command = package_manager_command(True, ['add', '@testing-library/jest-dom', '--dev']) if is_yarn_repo else package_manager_command(False, ['install', '@testing-library/jest-dom', '--save-dev'])
+    with scheduler.admit('install'):
+        subprocess.run(command, cwd=repo_path, check=True, env=package_manager_env())
 
 def setup_jest_dom_configuration(repo_path):
     """
@@ -680,6 +833,12 @@ def create_jest_config_js(jest_config_js, setup_file, logger):
 
 # TODO: Update the params to accept a list of repo's or make new method to handle single migration 
 def main():
+    parser = argparse.ArgumentParser(description='Migrate the test files of every repository with running tests')
+    parser.add_argument('--batch', default=None, help='migrate through a Batch API job with this name, resuming it if it exists')
+    parser.add_argument('--no-wait', action='store_true', help='with --batch, exit after submitting instead of waiting for results')
+    parser.add_argument('--poll-interval', type=int, default=POLL_INTERVAL, help='seconds between batch status checks')
+    args = parser.parse_args()
+
     # Path to the file containing the list of repositories
     repos_file_path = '/home/jovyan/code/JavaScriptTesting/JavaScriptTestMigration/JavaScriptTestMigration/repo_names/react/Enzyme/repos_with_running_tests.txt'  # Replace with your actual path
 
@@ -690,20 +849,38 @@ def main():
         logger.error(f"Error extracting repositories: {e}")
         return
 
-    # Define the maximum number of workers
-    max_workers = min(32, os.cpu_count() + 4)
-
-    # Use ThreadPoolExecutor for I/O-bound tasks
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Create a dictionary to hold futures
-        future_to_repo = {executor.submit(process_repository, repo): repo for repo in repos[70:]}
-
-        for future in concurrent.futures.as_completed(future_to_repo):
-            repo = future_to_repo[future]
-            try:
-                future.result()
-            except Exception as e:
-                logger.error(f"Error processing repository '{repo.get('repo_name', 'Unknown')}': {e}")
+    repos = repos[70:]
+    migrate = migrate_repository
+    if args.batch:
+        # Batch mode: one Batch API job for every test file, then install and test once results arrive.
+        # Re-running with the same --batch name resumes the job instead of submitting it again.
+        batch_job = BatchJob(args.batch, model=MIGRATION_MODEL)
+        if not batch_job.state['requests']:
+            queued = queue_batch_migration(repos, batch_job)
+            logger.info(f"Queued {queued} test files as batch job '{args.batch}'")
+            if not queued:
+                return
+        if not batch_job.submitted:
+            # Also finishes a submit that was interrupted after some batches were created
+            batch_job.submit()
+        if args.no_wait or not batch_job.wait(args.poll_interval):
+            logger.info(f"Batch job '{args.batch}' is still running; re-run with --batch {args.batch} to collect it")
+            return
+        jobs = batch_migration_jobs(batch_job)
+        migrate = lambda job: apply_batch_results(job, batch_job)
+    else:
+        jobs = (new_migration_job(repo) for repo in repos)
+
+    # Per-test results of this run, compared against the baseline with scripts/query_results.py
+    results_store = ResultsStore()
+    run_id = results_store.start_run('zero_shot', 'post_migration', notes=f'batch {args.batch}' if args.batch else None)
+
+    with results_store:
+        for job in migration_pipeline(results_store, run_id, migrate).run(jobs):
+            logger.info(f"Finished migrating '{job['repo_name']}': {len(job['migrated_paths'])} test files migrated")
+    logger.info(f"LLM usage: {gateway.stats}")
+    if gateway.cache is not None:
+        logger.info(f"LLM cache: {gateway.cache.stats}, {gateway.cache.hit_rate():.0%} hit rate")
 
 # Ex. python -m JavaScriptTestMigration.scripts.migrate_test_files
 if __name__ == '__main__':
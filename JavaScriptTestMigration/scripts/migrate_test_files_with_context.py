@@ -3,14 +3,12 @@ import re
 import argparse
 from pathlib import Path
 import subprocess
-from openai import OpenAI
 from ..constants import *
 from ..repo_names.enzyme_repos_with_running_tests import repos
+from ..utils.import_diff import added_packages
+from ..utils.llm_gateway import gateway
 from ..utils.utils import verify_tests_can_run
 
-# Set up your OpenAI API key
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 
 def build_package_update_prompt(package_json_file, error_file_content, history):
     return f"""Here is a package.json file: {package_json_file}.
@@ -44,21 +42,19 @@ def request_code_update(content, framework_conversion_info, imported_file_conten
                 Preserve all abstracted functions, original organization, and naming of describe/it blocks.
                 VERY IMPORTANT: Do not include code tags or any comments. Return only the updated file."""
     
-    response = client.chat.completions.create(
+    return gateway.complete_sync(
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": message}],
     )
-    return response.choices[0].message.content
 
 
 def generate_package_updates(history, package_json_file, error_file_content):
     prompt = build_package_update_prompt(package_json_file, error_file_content, history)
-    response = client.chat.completions.create(
+    return gateway.complete_sync(
         model="gpt-4o-mini",
         messages=[{"role": "assistant", "content": f"Previously added packages: {history}"},
                   {"role": "user", "content": prompt}],
     )
-    return response.choices[0].message.content
 
 
 def extract_import_paths(file_content):
@@ -108,19 +104,6 @@ def search_and_load_import_content(import_path, base_dir):
     return None
 
 
-def list_new_packages(original_file, updated_file):
-    prompt = f"List all of the new imports that you added to this file. Separate each package with a comma. Only respond with the package names."
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "assistant", "content": original_file},
-            {"role": "assistant", "content": updated_file},
-            {"role": "user", "content": prompt},
-        ],
-    )
-    return response.choices[0].message.content.split(',')
-
-
 def find_test_files(repo_path):
     full_path = os.path.join(ABSOLUTE_PATH, repo_path)
     test_files = []
@@ -179,7 +162,7 @@ def main():
             output_file = update_file_name_with_migrated(test_file)
             write_file(output_file, updated_content)
 
-            new_packages.update(list_new_packages(original_content, updated_content))
+            new_packages.update(added_packages(original_content, updated_content))
         
         package_json_file = os.path.join(ABSOLUTE_PATH, repo, 'package.json')
         package_content = read_file(package_json_file)
@@ -3,15 +3,13 @@ import re
 import argparse
 from pathlib import Path
 import subprocess
-from openai import OpenAI
 from ..constants import *
 from ..repo_names.enzyme.enzyme_repos_with_running_tests import repos
+from ..utils.import_diff import added_packages
+from ..utils.llm_gateway import gateway
 from ..utils.utils import verify_tests_can_run
 from collections import defaultdict
 
-# Set up your OpenAI API key
-client = OpenAI(api_key=OPENAI_API_KEY)
-
 MODEL = 'gpt-4o-mini'
 
 ESLINT = """{
@@ -81,11 +79,10 @@ def request_full_file_update(content, framework_conversion_info, imported_file_c
                 Output: Return only the fully migrated and functional test file. The file should be ready to execute with all tests passing in the new framework.
             """
     
-    response = client.chat.completions.create(
+    return gateway.complete_sync(
         model=MODEL,
         messages=[{"role": "user", "content": message}],
     )
-    return response.choices[0].message.content
 
 
 def request_code_update(content, framework_conversion_info, imported_file_contents, error_file_content):
@@ -121,11 +118,10 @@ def request_code_update(content, framework_conversion_info, imported_file_conten
                         Return only the fully migrated and functional test file. The file should be ready to execute with all tests passing in the new framework.
             """
     
-    response = client.chat.completions.create(
+    return gateway.complete_sync(
         model=MODEL,
         messages=[{"role": "user", "content": message}],
     )
-    return response.choices[0].message.content
 
 REQUIRED_ENZYME_IMPORTS = ""
 REQUIRED_RTL_IMPORTS = """These are the common imports for react-testing-library: 
@@ -163,21 +159,19 @@ def request_import_update(migrated_file, imports, framework_conversion_info, com
                 \nOutput: Return only the migrated imports.
             """
     
-    response = client.chat.completions.create(
+    return gateway.complete_sync(
         model=MODEL,
         messages=[{"role": "user", "content": message}],
     )
-    return response.choices[0].message.content
 
 
 def generate_package_updates(history, package_json_file, error_file_content, new_testing_framework):
     prompt = build_package_update_prompt(package_json_file, error_file_content, history, new_testing_framework)
-    response = client.chat.completions.create(
+    return gateway.complete_sync(
         model=MODEL,
         messages=[{"role": "assistant", "content": f"Previously added packages: {history}"},
                   {"role": "user", "content": prompt}],
     )
-    return response.choices[0].message.content
 
 
 def extract_import_paths(file_content):
@@ -228,19 +222,6 @@ def search_and_load_import_content(import_path, base_dir):
     return None
 
 
-def list_new_packages(original_file, updated_file):
-    prompt = f"List all of the new imports that you added to this file. Separate each package with a comma. Only respond with the package names."
-    response = client.chat.completions.create(
-        model=MODEL,
-        messages=[
-            {"role": "assistant", "content": original_file},
-            {"role": "assistant", "content": updated_file},
-            {"role": "user", "content": prompt},
-        ],
-    )
-    return response.choices[0].message.content.split(',')
-
-
 def find_test_files(repo_path):
     full_path = os.path.join(ABSOLUTE_PATH, repo_path)
     test_files = []
@@ -414,7 +395,7 @@ def main():
             # Overwriting the file now instead of adding -migrated
             # output_file = update_file_name_with_migrated(test_file)
             write_file(test_file, updated_file)
-            new_packages.update(list_new_packages(original_content, updated_file))
+            new_packages.update(added_packages(original_content, updated_file))
             migrated_test_files += 1
         
         package_json_file = os.path.join(ABSOLUTE_PATH, repo, 'package.json')
@@ -431,7 +412,6 @@ def main():
         verify_tests_can_run(ABSOLUTE_PATH, repo, 0, ENZYME_REPOS_WITH_RUNNING_TESTS_USING_CONTEXT_AND_ERRORS_PATH, True, False, migrated_test_files)
 
 # python -m JavaScriptTestMigration.scripts.migrate_test_files_with_context_and_errors
-# TODO: Make a script to store all the test files at a timestamp to the repo.
-# TODO: Make a script that can restore the repository to a given timestamp 
+# Snapshot the repos before migrating and restore them between runs with scripts/snapshot_repos.py
 if __name__ == '__main__':
     main()
@@ -0,0 +1,234 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /v1/chat/completions like the OpenAI API, for running the migration
+    scripts and the LLM gateway offline.
+
+    The reply is `server.reply` if set, otherwise the content of the last message. A share
+    `server.fail_rate` of requests fails with 429 or 500 (with Retry-After: 0) and every
+    request waits `server.latency` seconds. `server.stats` counts requests per status code.
+
+    The files and batches endpoints used by utils/llm_batch.py are served as well: an
+    uploaded batch completes `server.batch_delay` seconds after it is created, with its
+    requests answered like chat completions and `fail_rate` of them in the error file.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.stats_lock:
+            self.server.stats[status] = self.server.stats.get(status, 0) + 1
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def send_not_found(self):
+        self.send_json(404, {'error': {'message': f'Unknown path {self.path}', 'type': 'invalid_request_error'}})
+
+    def route(self):
+        # Paths relative to the API root, with or without the /v1 prefix
+        path = self.path.split('?')[0].rstrip('/')
+        return path[len('/v1'):] if path.startswith('/v1/') else path
+
+    def do_GET(self):
+        parts = self.route().split('/')[1:]
+        if len(parts) == 2 and parts[0] == 'batches':
+            batch = self.server.batches.get(parts[1])
+            if batch is None:
+                self.send_not_found()
+                return
+            self.send_json(200, batch)
+        elif len(parts) == 3 and parts[0] == 'files' and parts[2] == 'content':
+            stored = self.server.files.get(parts[1])
+            if stored is None:
+                self.send_not_found()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(stored['content'])))
+            self.end_headers()
+            self.wfile.write(stored['content'])
+        else:
+            self.send_not_found()
+
+    def do_POST(self):
+        route = self.route()
+        if route == '/files':
+            self.create_file()
+            return
+        if route == '/batches':
+            self.create_batch()
+            return
+        if route != '/chat/completions':
+            self.send_not_found()
+            return
+        request = self.read_json()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.fail_rate:
+            status = random.choice([429, 500])
+            self.send_json(status, {'error': {'message': 'Injected failure', 'type': 'server_error'}}, {'Retry-After': '0'})
+            return
+        self.send_json(200, chat_completion(request, self.server.reply))
+
+    def create_file(self):
+        length = int(self.headers.get('Content-Length', 0))
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode('utf-8')
+        message = BytesParser(policy=HTTP).parsebytes(header + self.rfile.read(length))
+        fields = {part.get_param('name', header='content-disposition'): part for part in message.iter_parts()}
+        if 'file' not in fields:
+            self.send_json(400, {'error': {'message': 'Missing file', 'type': 'invalid_request_error'}})
+            return
+        purpose = fields['purpose'].get_content().strip() if 'purpose' in fields else 'batch'
+        content = fields['file'].get_payload(decode=True)
+        self.send_json(200, store_file(self.server, content, purpose, fields['file'].get_filename() or 'upload.jsonl'))
+
+    def create_batch(self):
+        request = self.read_json()
+        input_file = self.server.files.get(request.get('input_file_id'))
+        if input_file is None:
+            self.send_json(400, {'error': {'message': 'Unknown input_file_id', 'type': 'invalid_request_error'}})
+            return
+        batch = {
+            'id': f'batch_{uuid.uuid4().hex}',
+            'object': 'batch',
+            'endpoint': request.get('endpoint'),
+            'input_file_id': input_file['id'],
+            'completion_window': request.get('completion_window', '24h'),
+            'status': 'in_progress',
+            'created_at': int(time.time()),
+            'output_file_id': None,
+            'error_file_id': None,
+            'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+            'metadata': request.get('metadata'),
+        }
+        self.server.batches[batch['id']] = batch
+        timer = threading.Timer(self.server.batch_delay, run_batch, args=(self.server, batch, input_file['content']))
+        timer.daemon = True
+        timer.start()
+        self.send_json(200, batch)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def store_file(server, content, purpose, filename):
+    stored = {
+        'id': f'file-{uuid.uuid4().hex}',
+        'object': 'file',
+        'bytes': len(content),
+        'created_at': int(time.time()),
+        'filename': filename,
+        'purpose': purpose,
+        'status': 'processed',
+    }
+    server.files[stored['id']] = dict(stored, content=content)
+    return stored
+
+
+def run_batch(server, batch, content):
+    # Answers every request of a batch at once and completes it
+    outputs, errors = [], []
+    for line in content.decode('utf-8').splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        result = {'id': f'batch_req_{uuid.uuid4().hex}', 'custom_id': request.get('custom_id')}
+        if random.random() < server.fail_rate:
+            result.update(response={'status_code': 500, 'request_id': uuid.uuid4().hex,
+                                    'body': {'error': {'message': 'Injected failure', 'type': 'server_error'}}}, error=None)
+            errors.append(result)
+        else:
+            result.update(response={'status_code': 200, 'request_id': uuid.uuid4().hex,
+                                    'body': chat_completion(request.get('body') or {}, server.reply)}, error=None)
+            outputs.append(result)
+    if outputs:
+        batch['output_file_id'] = store_file(server, jsonl(outputs), 'batch_output', 'output.jsonl')['id']
+    if errors:
+        batch['error_file_id'] = store_file(server, jsonl(errors), 'batch_output', 'errors.jsonl')['id']
+    batch['request_counts'] = {'total': len(outputs) + len(errors), 'completed': len(outputs), 'failed': len(errors)}
+    batch['completed_at'] = int(time.time())
+    batch['status'] = 'completed'
+
+
+def jsonl(lines):
+    return ''.join(json.dumps(line) + '\n' for line in lines).encode('utf-8')
+
+
+def chat_completion(request, reply=None):
+    messages = request.get('messages') or []
+    content = reply if reply is not None else (messages[-1].get('content', '') if messages else '')
+    prompt_tokens = sum(len(message.get('content') or '') for message in messages) // 4
+    completion_tokens = len(content) // 4
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': request.get('model', 'mock'),
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                  'total_tokens': prompt_tokens + completion_tokens},
+    }
+
+
+def make_server(host='127.0.0.1', port=0, reply=None, fail_rate=0.0, latency=0.0, batch_delay=1.0):
+    server = ThreadingHTTPServer((host, port), MockOpenAIHandler)
+    server.daemon_threads = True
+    server.reply = reply
+    server.fail_rate = fail_rate
+    server.latency = latency
+    server.batch_delay = batch_delay
+    server.files = {}
+    server.batches = {}
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def start_mock_server(host='127.0.0.1', port=0, reply=None, fail_rate=0.0, latency=0.0, batch_delay=1.0):
+    """
+    Starts the mock server on a background thread.
+
+    Returns:
+        tuple: (server, base_url) where base_url ends in /v1, ready for OpenAI(base_url=...).
+            Call server.shutdown() to stop it.
+    """
+    server = make_server(host, port, reply, fail_rate, latency, batch_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}/v1'
+
+
+# python -m JavaScriptTestMigration.scripts.mock_openai_server --port 8001 --fail-rate 0.1 --latency 0.5
+# OPENAI_BASE_URL=http://127.0.0.1:8001/v1 python -m JavaScriptTestMigration.scripts.migrate_test_files [--batch sweep]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve chat completions like the OpenAI API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--reply', default=None, help='fixed reply; defaults to echoing the last message')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of requests answered with 429 or 500')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering')
+    parser.add_argument('--batch-delay', type=float, default=1.0, help='seconds until a batch completes')
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.reply, args.fail_rate, args.latency, args.batch_delay)
+    print(f"Serving mock chat completions on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
@@ -0,0 +1,24 @@
+import argparse
+
+from ..constants import *
+from ..utils.utils import extract_repo_name_and_brace_UI_test_framework
+from ..utils.utils import run_parallel_clones
+
+
+# Checks out every repo in a repos_with_running_tests.txt style file into an experiment root.
+# Repos are fetched from GitHub once into the shared mirror store; every later experiment is a local checkout.
+# python -m JavaScriptTestMigration.scripts.prepare_experiment_checkouts --repos-file <repos.txt> --root <ABSOLUTE_PATH_MIGRATION>
+def main(repos_file, root):
+    repos = extract_repo_name_and_brace_UI_test_framework(repos_file)
+    failed = 0
+    for repo, repo_name in run_parallel_clones(repos, root, 'mirror'):
+        if not repo_name:
+            failed += 1
+    print(f"Checked out {len(repos) - failed} repos into {root}, {failed} failed")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check out repos into an experiment root from the shared mirror store')
+    parser.add_argument('--repos-file', required=True, help='file listing the repos to check out')
+    parser.add_argument('--root', required=True, help='experiment root, e.g. ABSOLUTE_PATH_MIGRATION')
+    args = parser.parse_args()
+    main(args.repos_file, args.root)
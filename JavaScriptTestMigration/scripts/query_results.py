@@ -0,0 +1,43 @@
+import argparse
+
+from ..utils.results_store import ResultsStore, RESULTS_STORE_PATH
+
+
+# List runs, compare a migration run against its baseline, or export everything for pandas/DuckDB:
+# python -m JavaScriptTestMigration.scripts.query_results runs
+# python -m JavaScriptTestMigration.scripts.query_results regressions --baseline 1 --migrated 2
+# python -m JavaScriptTestMigration.scripts.query_results export --out results_parquet
+def main(action, store_path=RESULTS_STORE_PATH, baseline=None, migrated=None, out=None, tests=False):
+    with ResultsStore(store_path) as store:
+        if action == 'runs':
+            with store.lock:
+                runs = store.connection.execute(
+                    'SELECT ru.run_id, ru.label, ru.phase, COUNT(rr.repo_id) FROM runs ru '
+                    'LEFT JOIN repo_results rr ON rr.run_id = ru.run_id GROUP BY ru.run_id ORDER BY ru.run_id').fetchall()
+            for run_id, label, phase, repos in runs:
+                print(f"{run_id}\t{label}\t{phase}\t{repos} repos")
+        elif action == 'regressions':
+            baseline = baseline or store.latest_run(phase='baseline')
+            migrated = migrated or store.latest_run(phase='post_migration')
+            if tests:
+                for repo, file, full_name, messages in store.regressed_tests(baseline, migrated):
+                    first_line = messages[0].splitlines()[0] if messages else ''
+                    print(f"{repo}\t{file}\t{full_name}\t{first_line}")
+            else:
+                for repo, file, status, message in store.regressed_files(baseline, migrated):
+                    first_line = message.splitlines()[0] if message else ''
+                    print(f"{repo}\t{file}\t{status}\t{first_line}")
+        elif action == 'export':
+            for path in store.export_parquet(out):
+                print(f"Wrote {path}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query the per-test results store')
+    parser.add_argument('action', choices=['runs', 'regressions', 'export'])
+    parser.add_argument('--store', default=RESULTS_STORE_PATH, help='path of the results database')
+    parser.add_argument('--baseline', type=int, default=None, help='baseline run id, defaults to the latest baseline run')
+    parser.add_argument('--migrated', type=int, default=None, help='migration run id, defaults to the latest post-migration run')
+    parser.add_argument('--tests', action='store_true', help='list regressed test cases instead of test files')
+    parser.add_argument('--out', default='results_parquet', help='output directory for export')
+    args = parser.parse_args()
+    main(args.action, args.store, args.baseline, args.migrated, args.out, args.tests)
@@ -2,17 +2,49 @@
 # from ..repo_names.rtl_repos_with_running_tests import repos
 from ..utils.utils import run_parallel_verifications
 from ..utils.utils import extract_repo_name_and_brace_UI_test_framework
+from ..utils.results_store import ResultsStore
+from ..utils.retention import DEFAULT_WORKSPACE_BUDGET_BYTES
+from ..utils.scratch import SCRATCH_ROOT, ScratchSpace
 from ..constants import ENZYME_REPOS_WITH_NO_CHANGES_PATH
+import argparse
+import os
 import re
 
 
 # python -m JavaScriptTestMigration.scripts.setup_and_test_repos
-def main():
+# python -m JavaScriptTestMigration.scripts.setup_and_test_repos --scratch --scratch-capacity-gb 16
+# python -m JavaScriptTestMigration.scripts.setup_and_test_repos --keep-workspaces
+def main(scratch_root=None, scratch_capacity_gb=None, prune_workspaces=True, workspace_budget_gb=None):
     start = 0
     end = 50
     repos = extract_repo_name_and_brace_UI_test_framework('/home/jovyan/code/JavaScriptTesting/JavaScriptTestMigration/JavaScriptTestMigration/repo_names/react/Enzyme/repos_with_running_tests.txt')
     print("REPOS: ", repos[0]['repo_name'])
-    run_parallel_verifications(repos[start:], '/home/jovyan/code/JavaScriptTesting/JavaScriptTestMigration/JavaScriptTestMigration/repo_names/react/enzyme/repos_with_running_tests.txt', '/home/jovyan/code/JavaScriptTesting/JavaScriptTestMigration/JavaScriptTestMigration/repo_names/react/enzyme/repos_with_failing_tests.txt')
+    with ResultsStore() as results_store:
+        run_id = results_store.start_run('enzyme', 'baseline')
+        # Opt-in: installs and test runs are staged on tmpfs (or a local SSD) and evicted back when it fills up
+        scratch = None
+        if scratch_root:
+            capacity = int(scratch_capacity_gb * 1024 ** 3) if scratch_capacity_gb else None
+            scratch = ScratchSpace(scratch_root, capacity)
+        # Finished clones are pruned oldest first once they use more than the budget, see retention.py
+        budget = int(workspace_budget_gb * 1024 ** 3) if workspace_budget_gb else DEFAULT_WORKSPACE_BUDGET_BYTES
+        run_parallel_verifications(repos[start:], '/home/jovyan/code/JavaScriptTesting/JavaScriptTestMigration/JavaScriptTestMigration/repo_names/react/enzyme/repos_with_running_tests.txt', '/home/jovyan/code/JavaScriptTesting/JavaScriptTestMigration/JavaScriptTestMigration/repo_names/react/enzyme/repos_with_failing_tests.txt', results_store=results_store, run_id=run_id, scratch=scratch, prune_workspaces=prune_workspaces, workspace_budget_bytes=budget)
+        if scratch is not None:
+            scratch.flush()
     print("Finished")
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Clone, install and test the repositories')
+    parser.add_argument('--scratch', nargs='?', const=SCRATCH_ROOT, default=os.environ.get('JSTM_SCRATCH_ROOT'), metavar='DIR',
+                        help=f'stage installs and test runs on scratch storage (default {SCRATCH_ROOT}); '
+                             'on by default when JSTM_SCRATCH_ROOT is set')
+    parser.add_argument('--scratch-capacity-gb', type=float, default=None,
+                        help='scratch space to use; on tmpfs this is RAM the install/test scheduler does not reserve '
+                             '(default 80%% of the filesystem)')
+    parser.add_argument('--keep-workspaces', dest='prune_workspaces', action='store_false',
+                        help='keep every clone and its node_modules; use it when a migration run will reuse the clones in place')
+    parser.add_argument('--workspace-budget-gb', type=float, default=None,
+                        help='disk space finished clones may use before the oldest are removed '
+                             f'(default {DEFAULT_WORKSPACE_BUDGET_BYTES // 1024 ** 3})')
+    args = parser.parse_args()
+    main(scratch_root=args.scratch, scratch_capacity_gb=args.scratch_capacity_gb, prune_workspaces=args.prune_workspaces,
+         workspace_budget_gb=args.workspace_budget_gb)
@@ -0,0 +1,37 @@
+import argparse
+import os
+
+from ..constants import *
+from ..utils.utils import extract_repo_name_and_brace_UI_test_framework
+from ..utils.workspace_snapshot import capture_snapshot, restore_snapshot, list_snapshots
+
+
+# Capture the post-install state of every repo once, then restore it before each experiment run:
+# python -m JavaScriptTestMigration.scripts.snapshot_repos capture --repos-file <repos.txt> --root <ABSOLUTE_PATH_MIGRATION> --label installed
+# python -m JavaScriptTestMigration.scripts.snapshot_repos restore --repos-file <repos.txt> --root <ABSOLUTE_PATH_MIGRATION> --label installed
+def main(action, repos_file, root, label=None):
+    repos = extract_repo_name_and_brace_UI_test_framework(repos_file)
+    for repo in repos:
+        repo_name = repo['repo_name'].split('/')[-1]
+        if not repo_name:
+            continue
+        repo_path = os.path.join(root, repo_name)
+        try:
+            if action == 'capture':
+                print(f"{repo_name}: captured {capture_snapshot(repo_path, label)}")
+            elif action == 'restore':
+                print(f"{repo_name}: restored {restore_snapshot(repo_path, label)}")
+            else:
+                print(f"{repo_name}: {', '.join(list_snapshots(repo_name)) or 'no snapshots'}")
+        except Exception as e:
+            print(f"Encountered exception {e}, for repo {repo_name}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Capture or restore repository snapshots')
+    parser.add_argument('action', choices=['capture', 'restore', 'list'])
+    parser.add_argument('--repos-file', required=True, help='file listing the repos')
+    parser.add_argument('--root', required=True, help='directory containing the cloned repos')
+    parser.add_argument('--label', default=None,
+                        help='snapshot name; defaults to a timestamp on capture and the latest snapshot on restore')
+    args = parser.parse_args()
+    main(args.action, args.repos_file, args.root, args.label)
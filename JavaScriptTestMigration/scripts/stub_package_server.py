@@ -0,0 +1,75 @@
+import argparse
+import hashlib
+import os
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubPackageHandler(BaseHTTPRequestHandler):
+    """
+    Serves files laid out like raw.githubusercontent.com:
+    <root>/<owner>/<repo>/<branch>/package.json is served at /<owner>/<repo>/<branch>/package.json
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        root = self.server.root
+        file_path = os.path.realpath(os.path.join(root, self.path.lstrip('/')))
+        if not file_path.startswith(root + os.sep) or not os.path.isfile(file_path):
+            self.send_error(404)
+            return
+
+        with open(file_path, 'rb') as f:
+            body = f.read()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(root, host='127.0.0.1', port=0):
+    """
+    Starts the stub server on a background thread.
+
+    Args:
+        root (str): Directory containing <owner>/<repo>/<branch>/package.json files.
+        host (str): Interface to bind.
+        port (int): Port to bind, 0 picks a free port.
+
+    Returns:
+        tuple: (server, base_url). Call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), StubPackageHandler)
+    server.daemon_threads = True
+    server.root = os.path.realpath(root)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
+
+
+# python -m JavaScriptTestMigration.scripts.stub_package_server --root /tmp/packages --port 8000
+# python -m JavaScriptTestMigration.scripts.collect_valid_repos --base-url http://127.0.0.1:8000
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve package.json files like raw.githubusercontent.com')
+    parser.add_argument('--root', required=True, help='directory containing <owner>/<repo>/<branch>/package.json')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), StubPackageHandler)
+    server.root = os.path.realpath(args.root)
+    print(f"Serving {server.root} on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,288 @@
+import asyncio
+import importlib.util
+import json
+import logging
+import time
+
+from itertools import islice
+
+import httpx
+
+from .utils import classify_package_json
+from .branch_resolver import BRANCH_LOOKUP_BATCH_SIZE
+from .framework_tally import record_checked
+from ..constants import *
+
+RAW_GITHUB_URL = 'https://raw.githubusercontent.com'
+
+# Upper bound on requests in flight at once, and on requests started per second.
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_REQUESTS_PER_SECOND = 100
+# Seconds to wait for one candidate branch before also probing the next
+PROBE_HEDGE_DELAY = 0.5
+
+logger = logging.getLogger(__name__)
+# httpx logs every request at INFO, which drowns out the results for a 30k repo run
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+
+class RateLimiter:
+    """
+    Spaces out request start times so that at most `rate` requests begin per second.
+    A rate of None or 0 disables the limit.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_start = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def create_http_client(max_concurrency, timeout=GLOBAL_TIMEOUT):
+    """
+    Creates the single pooled, keep-alive client shared by every probe.
+
+    HTTP/2 is used when the optional `h2` package is installed, so that all requests to
+    raw.githubusercontent.com are multiplexed over a handful of connections.
+
+    Args:
+        max_concurrency (int): Maximum number of open connections in the pool.
+        timeout (float): Per-request timeout in seconds.
+
+    Returns:
+        httpx.AsyncClient: The shared client.
+    """
+    http2 = importlib.util.find_spec('h2') is not None
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+
+
+async def fetch_manifest(client, limiter, repo, branch, base_url=RAW_GITHUB_URL, cache=None):
+    """
+    Fetches the raw package.json of a repository. When a ManifestCache is given, a cached
+    manifest is revalidated with a conditional GET and reused on 304 Not Modified.
+
+    Returns:
+        tuple: (content, headers), where headers is the (ETag, Last-Modified) pair of a fresh
+            response that still has to be written back with `store_manifest`, or None when the
+            cached copy was reused. None if the manifest could not be fetched.
+    """
+    url = f'{base_url}/{repo}/{branch}/package.json'
+    headers = cache.conditional_headers(repo, branch) if cache is not None else {}
+    await limiter.wait()
+    try:
+        response = await client.get(url, headers=headers)
+    except httpx.HTTPError as e:
+        logger.info(f"Failed to fetch {url}: {e}")
+        return None
+
+    if response.status_code == 304 and cache is not None:
+        cached = cache.get(repo, branch)
+        if cached is None:
+            return None
+        cache.touch(repo, branch)
+        return cached[0], None
+    if response.status_code != 200:
+        logger.info(f"Failed to fetch {url}")
+        return None
+    return response.content, (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+
+def store_manifest(cache, repo, branch, content, headers):
+    if cache is not None and headers is not None:
+        cache.put(repo, branch, content, *headers)
+
+
+def decode_manifest(repo, content):
+    try:
+        return json.loads(content)
+    except ValueError:
+        logger.info(f"Error decoding JSON for {repo}")
+        return None
+
+
+async def fetch_package_json(client, limiter, repo, branch, base_url=RAW_GITHUB_URL, cache=None):
+    """
+    Fetches and decodes the package.json of a repository.
+
+    When a ManifestCache is given, a cached manifest is revalidated with a conditional GET
+    and reused on 304 Not Modified; fresh responses are written back to the cache.
+
+    Returns:
+        dict: The decoded package.json, or None if it could not be fetched or decoded.
+    """
+    fetched = await fetch_manifest(client, limiter, repo, branch, base_url, cache)
+    if fetched is None:
+        return None
+    store_manifest(cache, repo, branch, *fetched)
+    return decode_manifest(repo, fetched[0])
+
+
+async def fetch_first_package_json(client, limiter, repo, branches, base_url=RAW_GITHUB_URL, cache=None, hedge_delay=PROBE_HEDGE_DELAY):
+    """
+    Probes the candidate branches, most likely first, and returns the first package.json found.
+
+    The next candidate is only requested once the previous one has failed or has not
+    answered within `hedge_delay` seconds, so a repository whose first candidate answers
+    promptly costs a single request. Only the branch that is returned is written to the cache.
+
+    Returns:
+        tuple: (branch, package_json), or (None, None) if no branch has a package.json.
+    """
+    if len(branches) == 1:
+        package_json = await fetch_package_json(client, limiter, repo, branches[0], base_url, cache)
+        return (branches[0], package_json) if package_json is not None else (None, None)
+
+    async def probe(branch):
+        return branch, await fetch_manifest(client, limiter, repo, branch, base_url, cache)
+
+    remaining = list(branches)
+    pending = set()
+    try:
+        while remaining or pending:
+            if remaining:
+                pending.add(asyncio.ensure_future(probe(remaining.pop(0))))
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay if remaining else None, return_when=asyncio.FIRST_COMPLETED)
+            for branch, fetched in sorted((task.result() for task in done), key=lambda result: branches.index(result[0])):
+                if fetched is None:
+                    continue
+                package_json = decode_manifest(repo, fetched[0])
+                if package_json is not None:
+                    store_manifest(cache, repo, branch, *fetched)
+                    return branch, package_json
+    finally:
+        for task in pending:
+            task.cancel()
+    return None, None
+
+
+async def check_package_in_repo_async(client, limiter, repo, nested_counter, UI_framework, UI_test_framework, unit_test_library, branches=('master',), base_url=RAW_GITHUB_URL, cache=None, resolver=None, sink=None):
+    branch, package_json = await fetch_first_package_json(client, limiter, repo, list(branches), base_url, cache)
+    if package_json is None:
+        return False
+    if resolver is not None:
+        resolver.record(repo, branch)
+    return classify_package_json(repo, package_json, nested_counter, UI_framework, UI_test_framework, unit_test_library, sink)
+
+
+async def check_packages_async(repos, nested_counter, UI_framework, UI_test_framework, unit_test_library, branch=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, base_url=RAW_GITHUB_URL, cache=None, resolver=None, sink=None, checkpoint=None):
+    limiter = RateLimiter(requests_per_second)
+    repo_iter = iter(repos)
+    queue = asyncio.Queue(maxsize=max_concurrency * 2)
+    matched = 0
+
+    def branches_for(repo):
+        if branch:
+            return [branch]
+        if resolver is not None:
+            return resolver.candidates(repo)
+        return ['master']
+
+    # The feeder resolves default branches a batch at a time and hands repositories to a
+    # fixed set of workers, so the number of requests in flight never exceeds
+    # max_concurrency and no task is created per repository up front.
+    async def feeder(client):
+        try:
+            while True:
+                batch = list(islice(repo_iter, BRANCH_LOOKUP_BATCH_SIZE))
+                if not batch:
+                    break
+                if resolver is not None and not branch:
+                    await resolver.resolve_batch(client, batch)
+                for repo in batch:
+                    await queue.put(repo)
+        finally:
+            for _ in range(max_concurrency):
+                await queue.put(None)
+
+    async def worker(client):
+        nonlocal matched
+        while True:
+            repo = await queue.get()
+            if repo is None:
+                return
+            try:
+                is_match = await check_package_in_repo_async(client, limiter, repo, nested_counter, UI_framework, UI_test_framework, unit_test_library, branches_for(repo), base_url, cache, resolver, sink)
+                record_checked(nested_counter, is_match)
+                if is_match:
+                    matched += 1
+                if checkpoint is not None and sink is not None:
+                    # Only once its repos.txt row is on disk, so a crash cannot skip it on resume
+                    sink.on_flushed(lambda repo=repo: checkpoint.mark_done(repo))
+                elif checkpoint is not None:
+                    checkpoint.mark_done(repo)
+            except Exception as exc:
+                logger.error(f"Repo {repo} generated an exception: {exc}")
+
+    async with create_http_client(max_concurrency) as client:
+        await asyncio.gather(feeder(client), *(worker(client) for _ in range(max_concurrency)))
+    return matched
+
+
+def run_async_package_checks(repos, nested_counter, UI_framework, UI_test_framework, unit_test_library, branch=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, requests_per_second=DEFAULT_REQUESTS_PER_SECOND, base_url=RAW_GITHUB_URL, cache=None, resolver=None, sink=None, checkpoint=None):
+    """
+    Asyncio replacement for `run_parallel_package_checks`.
+
+    Every package.json is fetched through one pooled HTTP client, with at most
+    `max_concurrency` requests in flight and at most `requests_per_second` started per
+    second. Classification is identical to `check_package_in_repo`.
+
+    Args:
+        repos (iterable): Repository names in the form 'owner/name'. Consumed lazily, so a
+            generator such as `iter_names_from_csv` starts probing immediately.
+        nested_counter (FrameworkTally): Tally updated with the matches (a legacy
+            {UI framework: Counter()} dictionary is also accepted).
+        UI_framework (list): UI framework package names.
+        UI_test_framework (list): UI test framework package names.
+        unit_test_library (list): Unit test library package names.
+        branch (str): Branch to read package.json from. When None, the branches are chosen
+            by `resolver`, falling back to 'master' without one.
+        max_concurrency (int): Maximum number of requests in flight.
+        requests_per_second (float): Maximum request rate, or None for no limit.
+        base_url (str): Raw content host, overridable to point at a local stub server.
+        cache (ManifestCache): Optional manifest cache used for conditional revalidation.
+        resolver (BranchResolver): Optional default-branch resolver.
+        sink (ResultSink): Optional single-writer sink for the repos.txt rows.
+        checkpoint (Checkpoint): Optional record that each finished repository is added to,
+            once the sink has written its row.
+
+    Returns:
+        int: Number of repositories that matched a UI and UI test framework.
+    """
+    return asyncio.run(check_packages_async(repos, nested_counter, UI_framework, UI_test_framework, unit_test_library, branch, max_concurrency, requests_per_second, base_url, cache, resolver, sink, checkpoint))
+
+
+def reclassify_from_cache(cache, nested_counter, UI_framework, UI_test_framework, unit_test_library, repos=None, sink=None, resolver=None):
+    """
+    Re-runs the classification over cached manifests without touching the network.
+
+    Useful after changing the UI_test_framework or unit_test_library lists. Each repository
+    is classified once: when several of its branches are cached, the one known to `resolver`
+    is used, otherwise the most recently fetched one.
+
+    Returns:
+        int: Number of repositories that matched a UI and UI test framework.
+    """
+    matched = 0
+    preferred_branch = resolver.known_branch if resolver is not None else None
+    for repo, branch, content in cache.iter_manifests(repos, preferred_branch):
+        try:
+            package_json = json.loads(content)
+        except ValueError:
+            logger.info(f"Error decoding cached JSON for {repo}")
+            continue
+        is_match = classify_package_json(repo, package_json, nested_counter, UI_framework, UI_test_framework, unit_test_library, sink)
+        record_checked(nested_counter, is_match)
+        if is_match:
+            matched += 1
+    return matched
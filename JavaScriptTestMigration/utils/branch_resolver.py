@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+
+from collections import Counter
+from threading import Lock
+
+import httpx
+
+from ..constants import *
+
+BRANCH_MEMO_PATH = os.path.join(SEART_FILTERED_REPOS, 'default_branches.json')
+GITHUB_GRAPHQL_URL = 'https://api.github.com/graphql'
+
+# Branches probed when nothing is known about a repository, in order unless the memo shows
+# that another one is more common
+DEFAULT_BRANCH_CANDIDATES = ['main', 'master']
+# GitHub allows up to 100 aliased repository lookups in a single GraphQL query
+BRANCH_LOOKUP_BATCH_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+class BranchResolver:
+    """
+    Works out which branch to read a repository's package.json from.
+
+    Sources, in order of preference:
+        1. Branches memoized from earlier lookups or successful probes (persisted to `memo_path`).
+        2. The defaultBranch column of the SEART CSV.
+        3. Batched GitHub GraphQL lookups, when a GITHUB_TOKEN is available.
+    Repositories that are still unknown fall back to probing DEFAULT_BRANCH_CANDIDATES,
+    the candidate that has been the default branch most often so far first.
+    """
+
+    def __init__(self, memo_path=BRANCH_MEMO_PATH, csv_branches=None, token=None):
+        self.memo_path = memo_path
+        # Not `or {}`: callers pass a dict that iter_names_from_csv only fills in as rows are read
+        self.csv_branches = csv_branches if csv_branches is not None else {}
+        self.token = token if token is not None else os.environ.get('GITHUB_TOKEN')
+        self.lock = Lock()
+        self.memo = {}
+        if memo_path and os.path.exists(memo_path):
+            with open(memo_path, 'r', encoding='utf-8') as f:
+                self.memo = json.load(f)
+        self.branch_counts = Counter(self.memo.values())
+
+    def known_branch(self, repo):
+        with self.lock:
+            branch = self.memo.get(repo)
+        return branch or self.csv_branches.get(repo)
+
+    def candidates(self, repo):
+        branch = self.known_branch(repo)
+        if branch:
+            return [branch]
+        with self.lock:
+            return sorted(DEFAULT_BRANCH_CANDIDATES, key=lambda candidate: -self.branch_counts[candidate])
+
+    def record(self, repo, branch):
+        with self.lock:
+            previous = self.memo.get(repo)
+            if previous == branch:
+                return
+            if previous is not None:
+                self.branch_counts[previous] -= 1
+            self.memo[repo] = branch
+            self.branch_counts[branch] += 1
+
+    async def resolve_batch(self, client, repos):
+        """
+        Looks up the default branch of every repository in `repos` that is not already known,
+        using one GraphQL request per BRANCH_LOOKUP_BATCH_SIZE repositories.
+        """
+        if not self.token:
+            return
+        unknown = [repo for repo in repos if '/' in repo and not self.known_branch(repo)]
+        for start in range(0, len(unknown), BRANCH_LOOKUP_BATCH_SIZE):
+            batch = unknown[start:start + BRANCH_LOOKUP_BATCH_SIZE]
+            fields = []
+            for idx, repo in enumerate(batch):
+                owner, name = repo.split('/', 1)
+                fields.append(f'r{idx}: repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) {{ defaultBranchRef {{ name }} }}')
+            query = 'query { ' + ' '.join(fields) + ' }'
+            try:
+                response = await client.post(GITHUB_GRAPHQL_URL, json={'query': query}, headers={'Authorization': f'bearer {self.token}'})
+                data = response.json().get('data') or {}
+            except (httpx.HTTPError, ValueError) as e:
+                logger.info(f"Default branch lookup failed: {e}")
+                continue
+
+            for idx, repo in enumerate(batch):
+                result = data.get(f'r{idx}') or {}
+                branch_ref = result.get('defaultBranchRef') or {}
+                if branch_ref.get('name'):
+                    self.record(repo, branch_ref['name'])
+
+    def save(self):
+        if not self.memo_path:
+            return
+        directory = os.path.dirname(self.memo_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self.lock:
+            memo = dict(self.memo)
+        tmp_path = self.memo_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(memo, f, indent=0, sort_keys=True)
+        os.replace(tmp_path, self.memo_path)
@@ -0,0 +1,68 @@
+import os
+
+from threading import Lock
+
+DEFAULT_FLUSH_EVERY = 100
+
+
+class Checkpoint:
+    """
+    Append-only record of repositories that have already been processed.
+
+    The file holds one repository name per line. Names are buffered and appended every
+    `flush_every` calls to `mark_done`, and on `close()`. A partially written last line from
+    a crashed run is ignored on load, so that repository is simply processed again.
+    """
+
+    def __init__(self, path, flush_every=DEFAULT_FLUSH_EVERY):
+        self.path = path
+        self.flush_every = flush_every
+        self.lock = Lock()
+        self.done = set()
+        self.buffer = []
+        if os.path.exists(path):
+            with open(path, mode='r', encoding='utf-8') as file:
+                content = file.read()
+            lines = content.split('\n')
+            # The last element is either '' (clean end of file) or a truncated name
+            self.done.update(line for line in lines[:-1] if line)
+            if lines[-1]:
+                with open(path, mode='w', encoding='utf-8') as file:
+                    file.write(''.join(f"{line}\n" for line in lines[:-1] if line))
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    def __contains__(self, repo):
+        return repo in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def mark_done(self, repo):
+        with self.lock:
+            self.done.add(repo)
+            self.buffer.append(repo)
+            if len(self.buffer) >= self.flush_every:
+                self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        with open(self.path, mode='a', encoding='utf-8') as file:
+            file.write(''.join(f"{repo}\n" for repo in self.buffer))
+        self.buffer = []
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
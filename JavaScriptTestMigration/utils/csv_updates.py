@@ -0,0 +1,166 @@
+import atexit
+import csv
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# Suffix of the SQLite file holding the pending updates of a CSV file
+UPDATES_SUFFIX = '.updates.sqlite'
+# The CSV is rewritten after this many appends, so it never lags far behind the run
+DEFAULT_EXPORT_EVERY = 50
+
+
+class CsvRowUpdates:
+    """
+    Keyed, transactional updates to the rows of a results CSV file.
+
+    `append` records data to append to one repo's row in a SQLite table indexed by repo
+    name, so an update costs one indexed write no matter how many rows the CSV has, and
+    concurrent workers cannot lose each other's updates. As with a direct rewrite, every
+    call appends its data, in call order, to the first row whose name matches.
+
+    `export` applies all pending updates to the CSV in a single read and an atomic rewrite.
+    It runs every `export_every` appends and at exit (see `csv_row_updates`). Updates are
+    committed to SQLite before they are exported, so those of a crashed run are applied by
+    the next export.
+    """
+
+    def __init__(self, csv_path, export_every=DEFAULT_EXPORT_EVERY):
+        self.csv_path = csv_path
+        self.export_every = export_every
+        self.lock = Lock()
+        self.unexported = 0
+        self.connection = sqlite3.connect(csv_path + UPDATES_SUFFIX, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS appends (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                repo TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS appends_by_repo ON appends (repo);
+        """)
+        self.connection.commit()
+
+    def append(self, repo, data):
+        with self.lock:
+            with self.connection:
+                self.connection.execute('INSERT INTO appends (repo, data, created_at) VALUES (?, ?, ?)',
+                                        (repo, json.dumps(list(data)), time.time()))
+            self.unexported += 1
+            if self.export_every and self.unexported >= self.export_every:
+                try:
+                    self.export_locked()
+                except (OSError, csv.Error) as e:
+                    # Kept pending; the next export retries
+                    logger.error(f"Could not apply updates to {self.csv_path}: {e}")
+
+    def pending(self):
+        """
+        Returns:
+            list: (repo, data) for every update not yet exported, in call order.
+        """
+        with self.lock:
+            return [(repo, json.loads(data)) for repo, data in self.connection.execute('SELECT repo, data FROM appends ORDER BY id')]
+
+    def export(self):
+        """
+        Appends every pending update to its row and atomically replaces the CSV file.
+        Updates are removed once exported, including those whose repo is not in the CSV,
+        so exporting twice never appends the same data twice.
+
+        Returns:
+            int: Number of updates applied.
+        """
+        with self.lock:
+            return self.export_locked()
+
+    def export_locked(self):
+        # Callers hold self.lock
+        self.unexported = 0
+        updates = self.connection.execute('SELECT id, repo, data FROM appends ORDER BY id').fetchall()
+        if not updates:
+            return 0
+
+        with open(self.csv_path, mode='r', newline='', encoding='utf-8') as file:
+            lines = list(csv.reader(file))
+        rows = {}
+        # The header row is never matched
+        for row in lines[1:]:
+            name = row[0].split('/') if row else []
+            if len(name) > 1:
+                rows.setdefault(name[1], row)
+        applied = 0
+        for _, repo, data in updates:
+            if repo in rows:
+                rows[repo].extend(json.loads(data))
+                applied += 1
+            else:
+                logger.warning(f"Name '{repo}' not found in {self.csv_path}")
+
+        if applied:
+            tmp_path = f'{self.csv_path}.{uuid.uuid4().hex}.tmp'
+            try:
+                with open(tmp_path, mode='w', newline='', encoding='utf-8') as file:
+                    writer = csv.writer(file, delimiter=',', quoting=csv.QUOTE_NONE, quotechar=None)
+                    writer.writerows(lines)
+                    file.flush()
+                    os.fsync(file.fileno())
+                os.replace(tmp_path, self.csv_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        with self.connection:
+            self.connection.execute('DELETE FROM appends WHERE id <= ?', (updates[-1][0],))
+        logger.info(f"Applied {applied} updates to {self.csv_path}")
+        return applied
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+open_updates = {}
+open_updates_lock = Lock()
+
+
+def csv_row_updates(csv_path):
+    """
+    Returns the shared CsvRowUpdates of a CSV file. Pending updates of every file opened
+    this way are exported when the process exits.
+    """
+    csv_path = os.path.abspath(csv_path)
+    with open_updates_lock:
+        if not open_updates:
+            atexit.register(export_csv_updates)
+        if csv_path not in open_updates:
+            open_updates[csv_path] = CsvRowUpdates(csv_path)
+        return open_updates[csv_path]
+
+
+def export_csv_updates(csv_path=None):
+    """
+    Applies the pending updates of one CSV file, including any left by an earlier process,
+    or of every file with updates in this process.
+    """
+    if csv_path is not None:
+        targets = [csv_row_updates(csv_path)]
+    else:
+        with open_updates_lock:
+            targets = list(open_updates.values())
+    for updates in targets:
+        try:
+            updates.export()
+        except (OSError, csv.Error) as e:
+            logger.error(f"Could not apply updates to {updates.csv_path}: {e}")
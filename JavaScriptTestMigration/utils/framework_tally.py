@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+
+from collections import Counter, namedtuple
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+FrameworkCombination = namedtuple('FrameworkCombination', ['ui_framework', 'test_framework', 'unit_library'])
+
+
+@dataclass
+class FrameworkSummary:
+    """
+    Merged result of a FrameworkTally.
+
+    Attributes:
+        combinations (Counter): FrameworkCombination -> number of repositories using it.
+        checked (int): Number of repositories checked.
+        matched (int): Number of repositories with a UI framework and a UI test framework.
+    """
+    combinations: Counter = field(default_factory=Counter)
+    checked: int = 0
+    matched: int = 0
+
+    def by_ui_framework(self, ui_framework):
+        return Counter({combo: count for combo, count in self.combinations.items() if combo.ui_framework == ui_framework})
+
+    def as_nested_counter(self, ui_frameworks):
+        """
+        Returns the legacy {UI framework: Counter()} shape, where every (test framework,
+        unit library) combination adds one to both the test framework and the unit library.
+        """
+        nested_counter = {framework: Counter() for framework in ui_frameworks}
+        for combo, count in self.combinations.items():
+            if combo.ui_framework in nested_counter:
+                nested_counter[combo.ui_framework][combo.test_framework] += count
+                nested_counter[combo.ui_framework][combo.unit_library] += count
+        return nested_counter
+
+
+class TallyShard:
+    def __init__(self):
+        self.combinations = Counter()
+        self.checked = 0
+        self.matched = 0
+
+
+class FrameworkTally:
+    """
+    Counts UI framework x test framework x unit library combinations across worker threads.
+
+    Each thread increments its own shard, so no lock is taken on the hot path; the shards
+    are merged once by `summary()` after the workers have finished.
+    """
+
+    def __init__(self, ui_frameworks, ui_test_frameworks, unit_test_libraries):
+        self.ui_frameworks = list(ui_frameworks)
+        self.ui_test_frameworks = set(ui_test_frameworks)
+        self.unit_test_libraries = set(unit_test_libraries)
+        self.local = threading.local()
+        self.shards = []
+        self.shards_lock = threading.Lock()
+
+    def shard(self):
+        shard = getattr(self.local, 'shard', None)
+        if shard is None:
+            shard = TallyShard()
+            self.local.shard = shard
+            # Only taken once per thread, when its shard is registered
+            with self.shards_lock:
+                self.shards.append(shard)
+        return shard
+
+    def increment(self, ui_framework, test_framework, unit_library):
+        if ui_framework not in self.ui_frameworks:
+            return
+        if test_framework not in self.ui_test_frameworks or unit_library not in self.unit_test_libraries:
+            return
+        self.shard().combinations[FrameworkCombination(ui_framework, test_framework, unit_library)] += 1
+
+    def record_checked(self, matched):
+        shard = self.shard()
+        shard.checked += 1
+        if matched:
+            shard.matched += 1
+
+    def progress(self):
+        """
+        Returns (checked, matched) so far. Safe to call while workers are running.
+        """
+        with self.shards_lock:
+            shards = list(self.shards)
+        return sum(shard.checked for shard in shards), sum(shard.matched for shard in shards)
+
+    def summary(self):
+        with self.shards_lock:
+            shards = list(self.shards)
+        summary = FrameworkSummary()
+        for shard in shards:
+            summary.combinations.update(shard.combinations)
+            summary.checked += shard.checked
+            summary.matched += shard.matched
+        return summary
+
+
+def record_checked(nested_counter, matched):
+    """
+    Counts a checked repository when `nested_counter` is a FrameworkTally; no-op for the
+    legacy {UI framework: Counter()} dictionary.
+    """
+    if isinstance(nested_counter, FrameworkTally):
+        nested_counter.record_checked(matched)
+
+
+class ProgressView:
+    """
+    Logs the number of repositories checked and matched every `interval` seconds from a
+    background thread, instead of printing from the workers.
+    """
+
+    def __init__(self, tally, interval=5.0, total=None):
+        self.tally = tally
+        self.interval = interval
+        self.total = total
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='progress', daemon=True)
+        self.start_time = None
+
+    def report(self):
+        checked, matched = self.tally.progress()
+        elapsed = max(time.monotonic() - self.start_time, 1e-9)
+        total = f"/{self.total}" if self.total else ''
+        logger.info(f"Checked {checked}{total} repos, {matched} matched ({checked / elapsed:.1f} repos/s)")
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.report()
+
+    def __enter__(self):
+        self.start_time = time.monotonic()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.report()
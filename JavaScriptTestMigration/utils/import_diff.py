@@ -0,0 +1,126 @@
+import re
+
+# Node core modules, which never need installing
+NODE_BUILTINS = frozenset((
+    'assert', 'async_hooks', 'buffer', 'child_process', 'cluster', 'console', 'constants', 'crypto',
+    'dgram', 'diagnostics_channel', 'dns', 'domain', 'events', 'fs', 'http', 'http2', 'https',
+    'inspector', 'module', 'net', 'os', 'path', 'perf_hooks', 'process', 'punycode', 'querystring',
+    'readline', 'repl', 'stream', 'string_decoder', 'sys', 'timers', 'tls', 'trace_events', 'tty',
+    'url', 'util', 'v8', 'vm', 'wasi', 'worker_threads', 'zlib',
+))
+
+# One token of JavaScript: a comment, a string or template literal, a lone slash (division
+# or the start of a regular expression) or a run of other code
+TOKEN_PATTERN = re.compile(r"""
+    //[^\n]*
+  | /\*[\s\S]*?(?:\*/|\Z)
+  | '(?:\\[\s\S]|[^'\\\n])*'?
+  | "(?:\\[\s\S]|[^"\\\n])*"?
+  | `(?:\\[\s\S]|[^`\\])*`?
+  | /
+  | [^/'"`]+
+""", re.VERBOSE)
+REGEX_LITERAL_PATTERN = re.compile(r'/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*')
+# A slash after one of these starts a regular expression rather than a division
+REGEX_PRECEDING_CHARS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_PRECEDING_WORD_PATTERN = re.compile(r'\b(?:return|typeof|case|do|else|in|of|void|throw|delete|new|await|yield)$')
+# Matched against the code left by `strip_literals`, where "N" stands for the Nth string literal:
+# import x from 'a', import { x,\n y } from 'a', import 'a', export * from 'a', import type { X } from 'a'
+STATIC_IMPORT_PATTERN = re.compile(r'''\b(?:import|export)\s+(?:type\s+)?(?:[^"`;]*?\s+from\s*)?"(\d+)"''')
+# import('a'), require('a'), jest.requireActual('a')
+CALL_IMPORT_PATTERN = re.compile(r'''\b(?:import|require|requireActual)\s*\(\s*"(\d+)"\s*\)''')
+PACKAGE_NAME_PATTERN = re.compile(r'^(?:@[\w.-]+/)?[\w.-]+$')
+
+
+def starts_regex(code):
+    for chunk in reversed(code):
+        previous = chunk.rstrip()
+        if previous:
+            return previous[-1] in REGEX_PRECEDING_CHARS or bool(REGEX_PRECEDING_WORD_PATTERN.search(previous))
+    return True
+
+
+def strip_literals(source):
+    """
+    Drops comments, template literals and regular expressions and replaces every string
+    literal with a numbered placeholder, so import-like text inside any of them is never
+    mistaken for an import.
+
+    Returns:
+        tuple: (code, literals), where the placeholder "N" in `code` stands for literals[N].
+    """
+    code = []
+    literals = []
+    position = 0
+    while position < len(source):
+        match = TOKEN_PATTERN.match(source, position)
+        token = match.group()
+        position = match.end()
+        if token.startswith(('//', '/*')):
+            code.append(' ')
+        elif token[0] in '\'"':
+            literals.append(token[1:-1] if len(token) > 1 and token[-1] == token[0] else token[1:])
+            code.append(f'"{len(literals) - 1}"')
+        elif token[0] == '`':
+            code.append(' ')
+        elif token == '/' and starts_regex(code):
+            regex = REGEX_LITERAL_PATTERN.match(source, match.start())
+            if regex:
+                position = regex.end()
+                code.append(' ')
+            else:
+                code.append(token)
+        else:
+            code.append(token)
+    return ''.join(code), literals
+
+
+def import_specifiers(source):
+    """
+    Returns every module specifier imported or required by a JavaScript/TypeScript source,
+    in order of appearance. Imports inside comments, strings and template literals are ignored.
+    """
+    code, literals = strip_literals(source)
+    matches = [(match.start(), match.group(1)) for match in STATIC_IMPORT_PATTERN.finditer(code)]
+    matches += [(match.start(), match.group(1)) for match in CALL_IMPORT_PATTERN.finditer(code)]
+    return [literals[int(index)] for _, index in sorted(matches)]
+
+
+def package_name(specifier):
+    """
+    Maps a module specifier to the npm package that provides it, or None for relative and
+    absolute paths, Node builtins and other specifiers that are not packages.
+
+    e.g. 'lodash/fp' -> 'lodash', '@testing-library/react/pure' -> '@testing-library/react'
+    """
+    # Webpack loader syntax, e.g. 'style-loader!css-loader!./styles.css'
+    specifier = specifier.split('!')[-1].split('?')[0]
+    if not specifier or specifier.startswith(('.', '/', '~', '#')) or ':' in specifier:
+        # Paths, subpath imports, and URLs or protocols such as node:fs
+        return None
+    parts = specifier.split('/')
+    name = '/'.join(parts[:2]) if specifier.startswith('@') else parts[0]
+    if name in NODE_BUILTINS or not PACKAGE_NAME_PATTERN.match(name):
+        # Also drops aliases such as '@/components'
+        return None
+    return name
+
+
+def imported_packages(source):
+    """
+    Returns the set of npm packages a source file imports.
+    """
+    packages = set()
+    for specifier in import_specifiers(source):
+        name = package_name(specifier)
+        if name:
+            packages.add(name)
+    return packages
+
+
+def added_packages(original_source, updated_source):
+    """
+    Returns the packages imported by `updated_source` that `original_source` did not import,
+    e.g. the packages a migrated test file now needs.
+    """
+    return imported_packages(updated_source) - imported_packages(original_source)
@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import re
+
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# Name of the report written by `jest --json --outputFile=...`, matching update_package_json_for_jest
+JEST_OUTPUT_FILE = 'output.json'
+# Reports larger than this are streamed with ijson when it is installed
+STREAMING_THRESHOLD_BYTES = 32 * 1024 * 1024
+
+
+@dataclass
+class JestTestRecord:
+    """
+    One test case from a jest JSON report.
+    """
+    file: str
+    full_name: str
+    status: str
+    duration_ms: float = None
+    failure_messages: list = field(default_factory=list)
+
+
+@dataclass
+class JestRunResult:
+    """
+    Parsed jest JSON report.
+    """
+    num_passed_tests: int = 0
+    num_failed_tests: int = 0
+    num_pending_tests: int = 0
+    num_passed_suites: int = 0
+    num_failed_suites: int = 0
+    success: bool = False
+    tests: list = field(default_factory=list)
+    # file -> (status, failure message) for every test file, including files that failed to run
+    files: dict = field(default_factory=dict)
+
+    def counts(self):
+        """
+        Returns:
+            tuple: (passing_tests, failing_tests, passing_test_suites, failing_test_suites)
+        """
+        return (self.num_passed_tests, self.num_failed_tests, self.num_passed_suites, self.num_failed_suites)
+
+
+def add_test_file(result, test_file):
+    name = test_file.get('name') or test_file.get('testFilePath', '')
+    result.files[name] = (test_file.get('status', ''), test_file.get('message') or test_file.get('failureMessage') or '')
+    for assertion in test_file.get('assertionResults') or []:
+        result.tests.append(JestTestRecord(
+            file=name,
+            full_name=assertion.get('fullName') or assertion.get('title', ''),
+            status=assertion.get('status', ''),
+            duration_ms=assertion.get('duration'),
+            failure_messages=list(assertion.get('failureMessages') or []),
+        ))
+
+
+def set_totals(result, report):
+    result.num_passed_tests = report.get('numPassedTests', 0)
+    result.num_failed_tests = report.get('numFailedTests', 0)
+    result.num_pending_tests = report.get('numPendingTests', 0)
+    result.num_passed_suites = report.get('numPassedTestSuites', 0)
+    # Already includes suites that failed to run (testExecError), such as files that do not parse
+    result.num_failed_suites = report.get('numFailedTestSuites', 0)
+    result.success = bool(report.get('success', False))
+
+
+def parse_jest_report(report):
+    result = JestRunResult()
+    set_totals(result, report)
+    for test_file in report.get('testResults') or []:
+        add_test_file(result, test_file)
+    return result
+
+
+def stream_jest_json(path):
+    import ijson
+
+    result = JestRunResult()
+    totals = {}
+    builder = None
+    with open(path, 'rb') as f:
+        # Single pass: top-level totals are picked up as they go by and each entry of
+        # testResults is built, recorded and dropped before the next one is read
+        for prefix, event, value in ijson.parse(f):
+            if builder is not None:
+                if prefix == 'testResults.item' and event == 'end_map':
+                    builder.event(event, value)
+                    add_test_file(result, builder.value)
+                    builder = None
+                else:
+                    builder.event(event, value)
+            elif prefix == 'testResults.item' and event == 'start_map':
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            elif '.' not in prefix and event in ('number', 'boolean'):
+                totals[prefix] = value
+    set_totals(result, totals)
+    return result
+
+
+def parse_jest_json(path):
+    """
+    Reads a jest `--json` report into typed per-test records.
+
+    Returns:
+        JestRunResult: The parsed report, or None if the file is missing or invalid.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        if os.path.getsize(path) > STREAMING_THRESHOLD_BYTES:
+            try:
+                return stream_jest_json(path)
+            except ImportError:
+                pass
+        with open(path, 'r', encoding='utf-8') as f:
+            return parse_jest_report(json.load(f))
+    except (ValueError, OSError) as e:
+        logger.warning(f"Could not parse jest report {path}: {e}")
+        return None
+
+
+SUMMARY_PATTERNS = {
+    'passed': re.compile(r'(\d+) passed'),
+    'failed': re.compile(r'(\d+) failed'),
+}
+
+
+def parse_summary_line(text, str_to_match):
+    """
+    Extracts (passed, failed) from the first line of jest's console summary starting with
+    `str_to_match` ('Tests:' or 'Test Suites:'), or (-1, -1) if there is no such line.
+    """
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith(str_to_match):
+            counts = []
+            for key in ('passed', 'failed'):
+                match = SUMMARY_PATTERNS[key].search(line)
+                counts.append(int(match.group(1)) if match else 0)
+            return tuple(counts)
+    return (-1, -1)
+
+
+def parse_jest_summary(text):
+    """
+    Fallback for test runners that did not write a JSON report.
+
+    Returns:
+        tuple: (passing_tests, failing_tests, passing_test_suites, failing_test_suites)
+    """
+    return parse_summary_line(text, 'Tests:') + parse_summary_line(text, 'Test Suites:')
+
+
+def relative_test_path(file, repo_path):
+    if repo_path and os.path.isabs(file):
+        relative = os.path.relpath(file, repo_path)
+        if not relative.startswith('..'):
+            return relative
+    return file
+
+
+def with_relative_paths(report, repo_path):
+    """
+    Returns a copy of `report` with test file paths relative to `repo_path`.
+    """
+    relative = JestRunResult(report.num_passed_tests, report.num_failed_tests, report.num_pending_tests,
+                             report.num_passed_suites, report.num_failed_suites, report.success)
+    relative.files = {relative_test_path(file, repo_path): status for file, status in report.files.items()}
+    relative.tests = [JestTestRecord(relative_test_path(test.file, repo_path), test.full_name, test.status,
+                                     test.duration_ms, test.failure_messages) for test in report.tests]
+    return relative
+
+
+def merge_reports(updated, baseline):
+    """
+    Combines a run of a subset of test files with the baseline results of every other file.
+    Files present in `updated` replace their baseline entry; totals are recomputed from the
+    merged per-file and per-test results. Both reports must name files the same way.
+
+    Returns:
+        JestRunResult: The merged report.
+    """
+    merged = JestRunResult()
+    merged.files = {file: status for file, status in baseline.files.items() if file not in updated.files}
+    merged.files.update(updated.files)
+    merged.tests = [test for test in baseline.tests if test.file not in updated.files] + list(updated.tests)
+
+    merged.num_passed_tests = sum(1 for test in merged.tests if test.status == 'passed')
+    merged.num_failed_tests = sum(1 for test in merged.tests if test.status == 'failed')
+    merged.num_pending_tests = len(merged.tests) - merged.num_passed_tests - merged.num_failed_tests
+    merged.num_passed_suites = sum(1 for status, _ in merged.files.values() if status == 'passed')
+    # Skipped and pending files count as neither
+    merged.num_failed_suites = sum(1 for status, _ in merged.files.values() if status == 'failed')
+    merged.success = merged.num_failed_tests == 0 and merged.num_failed_suites == 0
+    return merged
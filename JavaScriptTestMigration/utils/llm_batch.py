@@ -0,0 +1,230 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from ..constants import *
+
+BATCH_ROOT = os.path.join(os.path.dirname(os.path.normpath(ABSOLUTE_PATH)), 'batches')
+BATCH_ENDPOINT = '/v1/chat/completions'
+COMPLETION_WINDOW = '24h'
+# Limit of requests in one batch input file
+MAX_REQUESTS_PER_BATCH = 50000
+POLL_INTERVAL = 60
+FINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+logger = logging.getLogger(__name__)
+
+
+def batch_line(custom_id, messages, model):
+    """
+    Returns one line of a batch input file: a chat completion request tagged with `custom_id`.
+    """
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': BATCH_ENDPOINT,
+        'body': {'model': model, 'messages': messages},
+    }
+
+
+def response_content(line):
+    """
+    Extracts (content, error) from one line of a batch output or error file.
+    """
+    if line.get('error'):
+        return None, line['error'].get('message') or str(line['error'])
+    response = line.get('response') or {}
+    body = response.get('body') or {}
+    if response.get('status_code') != 200:
+        return None, (body.get('error') or {}).get('message') or f"status {response.get('status_code')}"
+    try:
+        return body['choices'][0]['message']['content'], None
+    except (KeyError, IndexError, TypeError):
+        return None, 'response without choices'
+
+
+class BatchJob:
+    """
+    A named set of chat completions submitted through the Batch API instead of one call
+    each. Batch requests are cheaper and are not bound by the per-minute limits, but
+    complete within `COMPLETION_WINDOW` rather than right away.
+
+    Requests are added with `add(custom_id, messages, metadata)` and written to
+    `root/<name>.jsonl`. `submit` uploads them (split into batches of at most
+    MAX_REQUESTS_PER_BATCH) and `wait` polls until every batch is done. `results` then
+    yields (custom_id, metadata, content, error) for each request.
+
+    The job's state (batch ids, statuses and request metadata) is kept in `root/<name>.json`
+    and the ids of applied results are appended to `root/<name>.applied`, so a sweep can be
+    submitted by one process and collected by a later one with `BatchJob(name)`.
+    """
+
+    def __init__(self, name, model='gpt-4o-mini', root=BATCH_ROOT, client=None):
+        os.makedirs(root, exist_ok=True)
+        self.name = name
+        self.state_path = os.path.join(root, f'{name}.json')
+        self.input_path = os.path.join(root, f'{name}.jsonl')
+        self.applied_path = os.path.join(root, f'{name}.applied')
+        self.client = client
+        self.lock = threading.Lock()
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        else:
+            self.state = {'name': name, 'model': model, 'submitted': False, 'batches': [], 'requests': {}}
+            for path in (self.input_path, self.applied_path):
+                if os.path.exists(path):
+                    # Left by a job that was never saved
+                    os.remove(path)
+        self.applied = set(self.state.get('applied', []))
+        if os.path.exists(self.applied_path):
+            with open(self.applied_path, 'r', encoding='utf-8') as f:
+                self.applied.update(line.rstrip('\n') for line in f if line.strip())
+
+    def get_client(self):
+        if self.client is None:
+            from openai import OpenAI
+
+            # OPENAI_BASE_URL in the environment points this at a fake endpoint
+            self.client = OpenAI(api_key=OPENAI_API_KEY)
+        return self.client
+
+    def save(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    @property
+    def submitted(self):
+        return self.state.get('submitted', False)
+
+    @property
+    def done(self):
+        return self.submitted and all(batch['status'] in FINAL_STATUSES for batch in self.state['batches'])
+
+    def add(self, custom_id, messages, metadata=None):
+        """
+        Queues one chat completion. Must be called before `submit`.
+
+        Args:
+            custom_id (str): Unique id of the request within the job.
+            messages (list): Chat messages.
+            metadata (dict): JSON-serialisable data returned with the result, e.g. the file to write it to.
+        """
+        if self.state['batches']:
+            raise RuntimeError(f"Batch job '{self.name}' has already been submitted")
+        if custom_id in self.state['requests']:
+            raise ValueError(f"Duplicate request id '{custom_id}'")
+        with open(self.input_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(batch_line(custom_id, messages, self.state['model'])) + '\n')
+        self.state['requests'][custom_id] = metadata or {}
+
+    def submit(self):
+        """
+        Uploads the queued requests and creates their batches.
+
+        Returns:
+            list: The ids of the created batches.
+        """
+        if self.submitted:
+            return [batch['id'] for batch in self.state['batches']]
+        if not self.state['requests']:
+            raise RuntimeError(f"Batch job '{self.name}' has no requests")
+        self.save()
+        client = self.get_client()
+        with open(self.input_path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        # Resumes after the batches an interrupted submit already created
+        first = len(self.state['batches']) * MAX_REQUESTS_PER_BATCH
+        for start in range(first, len(lines), MAX_REQUESTS_PER_BATCH):
+            part_path = f'{self.input_path}.{start // MAX_REQUESTS_PER_BATCH}'
+            with open(part_path, 'w', encoding='utf-8') as f:
+                f.writelines(lines[start:start + MAX_REQUESTS_PER_BATCH])
+            with open(part_path, 'rb') as f:
+                input_file = client.files.create(file=f, purpose='batch')
+            os.remove(part_path)
+            batch = client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                          completion_window=COMPLETION_WINDOW, metadata={'job': self.name})
+            self.state['batches'].append({'id': batch.id, 'input_file_id': input_file.id, 'status': batch.status,
+                                          'output_file_id': None, 'error_file_id': None})
+            # Saved after every batch, so an interrupted submit does not create duplicates when resumed
+            self.save()
+            logger.info(f"Submitted batch {batch.id} with {len(lines[start:start + MAX_REQUESTS_PER_BATCH])} requests")
+        self.state['submitted'] = True
+        self.save()
+        return [batch['id'] for batch in self.state['batches']]
+
+    def refresh(self):
+        """
+        Fetches the status of every unfinished batch.
+
+        Returns:
+            bool: True once all batches are done.
+        """
+        client = self.get_client()
+        for batch in self.state['batches']:
+            if batch['status'] in FINAL_STATUSES:
+                continue
+            remote = client.batches.retrieve(batch['id'])
+            batch.update(status=remote.status, output_file_id=remote.output_file_id, error_file_id=remote.error_file_id)
+            counts = remote.request_counts
+            if counts is not None:
+                logger.info(f"Batch {batch['id']}: {remote.status}, {counts.completed}/{counts.total} completed, {counts.failed} failed")
+        self.save()
+        return self.done
+
+    def wait(self, poll_interval=POLL_INTERVAL, timeout=None):
+        """
+        Polls until every batch is done or `timeout` seconds have passed.
+
+        Returns:
+            bool: True if every batch is done.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while not self.refresh():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll_interval)
+        return True
+
+    def read_file_lines(self, file_id):
+        if not file_id:
+            return []
+        content = self.get_client().files.content(file_id)
+        return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+    def results(self):
+        """
+        Yields (custom_id, metadata, content, error) for every request of finished batches
+        that has not been marked applied. Requests missing from the output (e.g. of an
+        expired batch) are yielded with an error.
+        """
+        applied = set(self.applied)
+        seen = set()
+        for batch in self.state['batches']:
+            if batch['status'] not in FINAL_STATUSES:
+                continue
+            for line in self.read_file_lines(batch['output_file_id']) + self.read_file_lines(batch['error_file_id']):
+                custom_id = line.get('custom_id')
+                if custom_id not in self.state['requests'] or custom_id in applied or custom_id in seen:
+                    continue
+                seen.add(custom_id)
+                content, error = response_content(line)
+                yield custom_id, self.state['requests'][custom_id], content, error
+        if self.done:
+            for custom_id, metadata in self.state['requests'].items():
+                if custom_id not in applied and custom_id not in seen:
+                    yield custom_id, metadata, None, 'no result returned'
+
+    def mark_applied(self, custom_ids):
+        """
+        Records that results have been written, so a resumed run does not apply them twice.
+        The ids are appended to the journal rather than rewriting the state file.
+        """
+        with self.lock:
+            with open(self.applied_path, 'a', encoding='utf-8') as f:
+                f.writelines(f'{custom_id}\n' for custom_id in custom_ids)
+            self.applied.update(custom_ids)
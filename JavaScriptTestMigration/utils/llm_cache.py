@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from threading import Lock
+
+from ..constants import *
+
+LLM_CACHE_PATH = os.path.join(os.path.dirname(os.path.normpath(ABSOLUTE_PATH)), 'llm_cache.sqlite')
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+# Evictions remove this share of the limit at once, so a full cache does not evict on every insert
+EVICTION_SLACK = 0.05
+
+
+def cache_key(model, messages, version=None, **kwargs):
+    """
+    Hashes everything that determines a completion: the model, the prompt template version,
+    the messages (prompt, test file content and any context) and the request options.
+    """
+    payload = json.dumps({'model': model, 'version': version, 'messages': messages, 'options': kwargs},
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent cache of LLM responses, so re-running a sweep (after a crash, or to change
+    only the install and test stages) does not send the same prompts again.
+
+    Responses are stored in SQLite keyed by `cache_key`. The total size of the stored
+    responses is kept under `max_bytes` by removing the least recently used ones.
+    `stats` counts hits, misses, stores and evictions of this process.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_by_last_used ON responses (last_used);
+        """)
+        self.connection.commit()
+        self.total_bytes = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, key):
+        """
+        Returns the cached response for `key`, or None.
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self.connection.execute('UPDATE responses SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.connection.commit()
+            self.stats['hits'] += 1
+            return row[0]
+
+    def put(self, key, response, model=None):
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self.lock:
+            previous = self.connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                (key, model, response, size, now, now))
+            self.total_bytes += size - (previous[0] if previous else 0)
+            self.stats['stores'] += 1
+            if self.total_bytes > self.max_bytes:
+                self.evict(self.max_bytes * (1 - EVICTION_SLACK))
+            self.connection.commit()
+
+    def evict(self, target_bytes):
+        # Callers hold self.lock
+        victims = []
+        for key, size in self.connection.execute('SELECT key, size FROM responses ORDER BY last_used'):
+            if self.total_bytes <= target_bytes:
+                break
+            victims.append((key,))
+            self.total_bytes -= size
+        self.connection.executemany('DELETE FROM responses WHERE key = ?', victims)
+        self.stats['evictions'] += len(victims)
+
+    def hit_rate(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return self.stats['hits'] / lookups if lookups else 0.0
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from .llm_cache import LLM_CACHE_PATH, ResponseCache, cache_key
+from ..constants import *
+
+DEFAULT_MODEL = 'gpt-4o-mini'
+# Limits of the account tier; requests and tokens are budgeted per minute like the API does
+REQUESTS_PER_MINUTE = 500
+TOKENS_PER_MINUTE = 200000
+MAX_CONCURRENCY = 32
+MAX_RETRIES = 6
+BASE_RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+# Rough size of a completion, reserved up front and corrected from the reported usage
+EXPECTED_COMPLETION_TOKENS = 1024
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(messages):
+    # ~4 characters per token for English and code
+    return sum(len(message.get('content') or '') for message in messages) // 4 + EXPECTED_COMPLETION_TOKENS
+
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `per_minute` / 60 per second, holding at
+    most one minute's worth. `acquire` waits until the requested amount is available;
+    `adjust` returns or charges the difference once the real cost is known.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount):
+        # A single request larger than the bucket would never fit
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            while True:
+                self.refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, amount):
+        self.refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Full-jitter exponential backoff, never shorter than the server's Retry-After.
+    """
+    delay = random.uniform(0, min(MAX_RETRY_DELAY, BASE_RETRY_DELAY * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+class LLMGateway:
+    """
+    Shared async client for every chat completion made by the migration scripts.
+
+    All calls go through one AsyncOpenAI client (one HTTP connection pool) running on a
+    background event loop, so worker threads and coroutines share the same limits:
+    at most `max_concurrency` requests in flight, and token buckets for requests and
+    tokens per minute. 429, 5xx, timeout and connection errors are retried with jittered
+    exponential backoff. Point `base_url` at scripts/mock_openai_server.py to test offline.
+
+    Responses are cached in a ResponseCache at `cache_path` (None disables it), so a repeated
+    request is answered without a network call or rate-limit token.
+
+    Coroutines use `await gateway.complete(messages)`; threads use `gateway.complete_sync`,
+    and `gateway.run(coroutine)` runs any coroutine (e.g. a gather over a repo's test
+    files) on the gateway's loop.
+    """
+
+    def __init__(self, api_key=OPENAI_API_KEY, base_url=None, model=DEFAULT_MODEL, requests_per_minute=REQUESTS_PER_MINUTE,
+                 tokens_per_minute=TOKENS_PER_MINUTE, max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES, timeout=GLOBAL_TIMEOUT,
+                 cache_path=LLM_CACHE_PATH):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.cache_path = cache_path
+        self.response_cache = None
+        self.cache_lock = threading.Lock()
+        self.loop = None
+        self.loop_lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'prompt_tokens': 0, 'completion_tokens': 0}
+
+    @property
+    def cache(self):
+        # Opened on first use rather than in setup(), so callers that only read or fill the
+        # cache (e.g. applying batch results) get it without starting the event loop
+        with self.cache_lock:
+            if self.response_cache is None and self.cache_path:
+                self.response_cache = ResponseCache(self.cache_path)
+        return self.response_cache
+
+    def ensure_loop(self):
+        with self.loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name='llm-gateway', daemon=True).start()
+                asyncio.run_coroutine_threadsafe(self.setup(), self.loop).result()
+        return self.loop
+
+    async def setup(self):
+        # Created on the gateway's loop, which every request then runs on
+        import httpx
+        from openai import AsyncOpenAI
+
+        self.http_client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency))
+        # Retries are done here, so they share the rate limits
+        self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0, http_client=self.http_client)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.request_bucket = TokenBucket(self.requests_per_minute)
+        self.token_bucket = TokenBucket(self.tokens_per_minute)
+
+    async def complete(self, messages, model=None, prompt_version=None, use_cache=True, **kwargs):
+        """
+        Sends one chat completion and returns the content of the first choice.
+
+        Args:
+            messages (list): Chat messages.
+            model (str): Model name, defaults to the gateway's model.
+            prompt_version (str): Version of the prompt template, part of the cache key.
+                Bump it when a change should invalidate cached responses.
+            use_cache (bool): Whether to look up and store the response in the cache.
+            **kwargs: Passed to chat.completions.create.
+
+        Returns:
+            str: The response content.
+        """
+        import openai
+
+        model = model or self.model
+        key = None
+        if use_cache and self.cache is not None:
+            key = cache_key(model, messages, prompt_version, **kwargs)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        estimate = estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(estimate)
+            try:
+                async with self.semaphore:
+                    response = await self.client.chat.completions.create(model=model, messages=messages, **kwargs)
+            except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+                # APITimeoutError is an APIConnectionError; InternalServerError covers every 5xx
+                if attempt == self.max_retries:
+                    self.stats['failures'] += 1
+                    raise
+                response_headers = getattr(getattr(e, 'response', None), 'headers', None) or {}
+                delay = retry_delay(attempt, response_headers.get('retry-after'))
+                self.stats['retries'] += 1
+                logger.warning(f"LLM request failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            self.stats['requests'] += 1
+            usage = getattr(response, 'usage', None)
+            if usage is not None:
+                self.stats['prompt_tokens'] += usage.prompt_tokens
+                self.stats['completion_tokens'] += usage.completion_tokens
+                self.token_bucket.adjust(usage.total_tokens - estimate)
+            content = response.choices[0].message.content
+            if key is not None and content is not None:
+                self.cache.put(key, content, model)
+            return content
+
+    def run(self, coroutine, timeout=None):
+        """
+        Runs a coroutine on the gateway's loop from any thread and returns its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.ensure_loop()).result(timeout)
+
+    async def gather(self, coroutines):
+        return await asyncio.gather(*coroutines, return_exceptions=True)
+
+    def run_all(self, coroutines):
+        """
+        Runs coroutines concurrently on the gateway's loop.
+
+        Returns:
+            list: Their results in order, with the exception in place of a failed one's result.
+        """
+        return self.run(self.gather(coroutines))
+
+    def complete_sync(self, messages, model=None, **kwargs):
+        return self.run(self.complete(messages, model, **kwargs))
+
+    def close(self):
+        with self.loop_lock:
+            loop, self.loop = self.loop, None
+        with self.cache_lock:
+            cache, self.response_cache = self.response_cache, None
+        if cache is not None:
+            cache.close()
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.client.close(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+# Shared by every script in the process; OPENAI_BASE_URL in the environment redirects it, e.g. to the mock server
+gateway = LLMGateway()
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+from itertools import groupby
+from threading import Lock
+
+from ..constants import *
+
+MANIFEST_CACHE_PATH = os.path.join(SEART_FILTERED_REPOS, 'manifest_cache.sqlite')
+
+
+class ManifestCache:
+    """
+    Persistent cache of fetched package.json files.
+
+    Manifests are stored content-addressed: the `blobs` table maps a sha256 of the raw
+    bytes to the bytes themselves, and the `manifests` table maps (repo, branch) to that
+    hash along with the ETag and Last-Modified headers needed for conditional GETs.
+    """
+
+    def __init__(self, path=MANIFEST_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                content_hash TEXT PRIMARY KEY,
+                content BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS manifests (
+                repo TEXT NOT NULL,
+                branch TEXT NOT NULL,
+                content_hash TEXT NOT NULL REFERENCES blobs(content_hash),
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (repo, branch)
+            );
+        """)
+        self.connection.commit()
+
+    def get(self, repo, branch):
+        """
+        Returns:
+            tuple: (content, etag, last_modified) for the cached manifest, or None.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT b.content, m.etag, m.last_modified FROM manifests m '
+                'JOIN blobs b ON b.content_hash = m.content_hash '
+                'WHERE m.repo = ? AND m.branch = ?', (repo, branch)).fetchone()
+        return row
+
+    def conditional_headers(self, repo, branch):
+        """
+        Builds the If-None-Match / If-Modified-Since headers for revalidating a cached manifest.
+        """
+        cached = self.get(repo, branch)
+        headers = {}
+        if cached is None:
+            return headers
+        _, etag, last_modified = cached
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def put(self, repo, branch, content, etag=None, last_modified=None):
+        content_hash = hashlib.sha256(content).hexdigest()
+        with self.lock:
+            self.connection.execute('INSERT OR IGNORE INTO blobs (content_hash, content) VALUES (?, ?)', (content_hash, content))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO manifests (repo, branch, content_hash, etag, last_modified, fetched_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (repo, branch, content_hash, etag, last_modified, time.time()))
+            self.connection.commit()
+        return content_hash
+
+    def touch(self, repo, branch):
+        """
+        Marks a cached manifest as revalidated (the server answered 304 Not Modified).
+        """
+        with self.lock:
+            self.connection.execute('UPDATE manifests SET fetched_at = ? WHERE repo = ? AND branch = ?', (time.time(), repo, branch))
+            self.connection.commit()
+
+    def iter_manifests(self, repos=None, preferred_branch=None):
+        """
+        Yields (repo, branch, content) for every cached repository, or only for `repos` if given.
+
+        A repository is yielded once even if manifests of several of its branches are cached:
+        the branch returned by `preferred_branch(repo)` if that one is cached, otherwise the
+        most recently fetched one.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT m.repo, m.branch, b.content FROM manifests m '
+                'JOIN blobs b ON b.content_hash = m.content_hash ORDER BY m.repo, m.fetched_at DESC').fetchall()
+        wanted = set(repos) if repos is not None else None
+        for repo, group in groupby(rows, key=lambda row: row[0]):
+            if wanted is not None and repo not in wanted:
+                continue
+            group = list(group)
+            preferred = preferred_branch(repo) if preferred_branch is not None else None
+            yield next((row for row in group if row[1] == preferred), group[0])
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
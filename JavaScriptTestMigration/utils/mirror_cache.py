@@ -0,0 +1,88 @@
+import logging
+import os
+import shutil
+import subprocess
+
+from collections import defaultdict
+from threading import Lock
+
+from ..constants import *
+
+# Shared by every experiment root (ABSOLUTE_PATH, ABSOLUTE_PATH_MIGRATION, ABSOLUTE_PATH_NAIVE_COPY)
+MIRROR_ROOT = os.path.join(os.path.dirname(os.path.normpath(ABSOLUTE_PATH)), 'mirrors')
+
+# 'worktree' adds a detached `git worktree` of the bare mirror, 'reference' makes a
+# `git clone --shared` that borrows the mirror's objects. Neither copies any objects.
+CHECKOUT_MODES = ('worktree', 'reference')
+DEFAULT_CHECKOUT_MODE = 'worktree'
+
+logger = logging.getLogger(__name__)
+
+_mirror_locks = defaultdict(Lock)
+_mirror_locks_lock = Lock()
+
+
+def mirror_lock(repo):
+    with _mirror_locks_lock:
+        return _mirror_locks[repo]
+
+
+def mirror_path(repo, mirror_root=MIRROR_ROOT):
+    return os.path.join(mirror_root, repo.replace('/', '__') + '.git')
+
+
+def run_git(args, cwd=None):
+    return subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True, text=True, timeout=GLOBAL_TIMEOUT)
+
+
+def ensure_mirror(repo, url, mirror_root=MIRROR_ROOT, refresh=False):
+    """
+    Makes sure a bare mirror of `repo` exists under `mirror_root`, cloning it from `url`
+    the first time. With `refresh`, an existing mirror is fetched again.
+
+    Returns:
+        str: Path of the bare mirror.
+    """
+    path = mirror_path(repo, mirror_root)
+    with mirror_lock(repo):
+        if not os.path.exists(path):
+            os.makedirs(mirror_root, exist_ok=True)
+            tmp_path = path + '.tmp'
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            run_git(['clone', '--mirror', url, tmp_path])
+            # Only a complete mirror is ever visible under its final name
+            os.replace(tmp_path, path)
+            logger.info(f"Created mirror of {repo} at {path}")
+        elif refresh:
+            run_git(['remote', 'update', '--prune'], cwd=path)
+            logger.info(f"Refreshed mirror of {repo}")
+    return path
+
+
+def checkout_from_mirror(repo, dest_root, url, mirror_root=MIRROR_ROOT, mode=DEFAULT_CHECKOUT_MODE):
+    """
+    Checks out HEAD of `repo` into `dest_root/<repo name>` from the local mirror, creating
+    the mirror on first use.
+
+    Returns:
+        str: The repository directory name inside `dest_root`.
+    """
+    repo_name = repo.split('/')[-1]
+    dest = os.path.join(dest_root, repo_name)
+    if os.path.exists(dest):
+        logger.info(f"{repo_name} already exists in {dest_root}. Skipping checkout.")
+        return repo_name
+
+    path = ensure_mirror(repo, url, mirror_root)
+    os.makedirs(dest_root, exist_ok=True)
+    with mirror_lock(repo):
+        if mode == 'worktree':
+            # Forget worktrees whose directories were deleted by an earlier clean-up
+            run_git(['worktree', 'prune'], cwd=path)
+            run_git(['worktree', 'add', '--detach', dest, 'HEAD'], cwd=path)
+        elif mode == 'reference':
+            run_git(['clone', '--shared', path, dest])
+            run_git(['remote', 'set-url', 'origin', url], cwd=dest)
+        else:
+            raise ValueError(f"Unknown checkout mode '{mode}', expected one of {CHECKOUT_MODES}")
+    return repo_name
@@ -0,0 +1,176 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import uuid
+
+from threading import Lock
+
+from .workspace_snapshot import clone_tree
+from ..constants import *
+
+NODE_MODULES_CACHE_ROOT = os.path.join(os.path.dirname(os.path.normpath(ABSOLUTE_PATH)), 'node_modules_cache')
+MANIFEST_FILES = ('package.json', 'yarn.lock', 'package-lock.json', 'npm-shrinkwrap.json')
+# Maps repo name -> the key of the last node_modules tree stored for it
+INDEX_FILE = 'index.json'
+# Written inside node_modules with the key of the manifest it was installed for
+MARKER_FILE = '.manifest_key'
+
+logger = logging.getLogger(__name__)
+index_lock = Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def node_version():
+    try:
+        return subprocess.run(['node', '--version'], capture_output=True, text=True, timeout=60).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+
+
+def manifest_key(repo_path):
+    """
+    Hashes package.json, the lockfile and the Node version into the cache key for a
+    node_modules tree. Returns None when the repository has no package.json.
+    """
+    if not os.path.exists(os.path.join(repo_path, 'package.json')):
+        return None
+    digest = hashlib.sha256()
+    digest.update(node_version().encode('utf-8'))
+    for name in MANIFEST_FILES:
+        path = os.path.join(repo_path, name)
+        if os.path.exists(path):
+            digest.update(name.encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def entry_path(key, cache_root=NODE_MODULES_CACHE_ROOT):
+    return os.path.join(cache_root, key[:2], key)
+
+
+def read_index(cache_root=NODE_MODULES_CACHE_ROOT):
+    path = os.path.join(cache_root, INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def record_in_index(repo_name, key, cache_root=NODE_MODULES_CACHE_ROOT):
+    with index_lock:
+        index = read_index(cache_root)
+        index[repo_name] = key
+        tmp_path = os.path.join(cache_root, f'{INDEX_FILE}.{uuid.uuid4().hex}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, os.path.join(cache_root, INDEX_FILE))
+
+
+def installed_key(repo_path):
+    try:
+        with open(os.path.join(repo_path, 'node_modules', MARKER_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def mark_installed(repo_path, key):
+    node_modules = os.path.join(repo_path, 'node_modules')
+    if key is None or not os.path.isdir(node_modules):
+        return
+    tmp_path = os.path.join(node_modules, f'{MARKER_FILE}.{uuid.uuid4().hex}.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(key)
+    os.replace(tmp_path, os.path.join(node_modules, MARKER_FILE))
+
+
+def node_modules_up_to_date(repo_path):
+    """
+    Returns True if the repository's node_modules was installed or restored for its current
+    manifest, i.e. package.json and the lockfile have not changed since.
+    """
+    key = installed_key(repo_path)
+    return key is not None and key == manifest_key(repo_path)
+
+
+def restore_node_modules(repo_path, key=None, cache_root=NODE_MODULES_CACHE_ROOT):
+    """
+    Replaces the repository's node_modules with the cached tree for `key` (by default the
+    key of its current manifest). Files are reflinked where the filesystem supports it and
+    copied otherwise, never hardlinked: installs, postinstall scripts and tools writing to
+    node_modules/.cache modify files in place, which would corrupt the cache entry.
+
+    Returns:
+        bool: True on a cache hit.
+    """
+    key = key or manifest_key(repo_path)
+    if key is None:
+        return False
+    path = entry_path(key, cache_root)
+    if not os.path.isdir(os.path.join(path, 'node_modules')):
+        return False
+
+    node_modules = os.path.join(repo_path, 'node_modules')
+    if os.path.exists(node_modules):
+        shutil.rmtree(node_modules)
+    # The entry directory only holds node_modules, so this copies it straight into the repo
+    clone_tree(path, repo_path)
+    mark_installed(repo_path, key)
+    logger.info(f"Restored node_modules for {os.path.basename(repo_path)} from cache {key[:12]}")
+    return True
+
+
+def store_node_modules(repo_path, key=None, cache_root=NODE_MODULES_CACHE_ROOT):
+    """
+    Adds the repository's node_modules to the cache under `key` (by default the key of its
+    current manifest). Pass the key computed before an install: installs may create or
+    rewrite the lockfile, and a fresh checkout is looked up by its manifest as cloned.
+    Files are reflinked or copied, like in `restore_node_modules`.
+    """
+    current_key = manifest_key(repo_path)
+    key = key or current_key
+    node_modules = os.path.join(repo_path, 'node_modules')
+    if key is None or not os.path.isdir(node_modules):
+        return None
+
+    # The marker describes the repository's own manifest; restores rewrite it for theirs
+    mark_installed(repo_path, current_key)
+    path = entry_path(key, cache_root)
+    if not os.path.exists(path):
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        clone_tree(node_modules, os.path.join(tmp_path, 'node_modules'))
+        try:
+            os.replace(tmp_path, path)
+            logger.info(f"Stored node_modules for {os.path.basename(repo_path)} as {key[:12]}")
+        except OSError:
+            # Another worker stored the same key first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+    record_in_index(os.path.basename(os.path.normpath(repo_path)), key, cache_root)
+    return key
+
+
+def prepare_node_modules(repo_path, cache_root=NODE_MODULES_CACHE_ROOT):
+    """
+    Gives a repository the closest cached node_modules before an install.
+
+    An exact manifest match is restored as is. Otherwise, if the repository has no
+    node_modules yet (e.g. a fresh checkout whose manifest was changed by
+    `add_jest_to_repository`), the tree last stored for this repository is restored so
+    the package manager only has to install the difference.
+
+    Returns:
+        bool: True if the exact manifest was found and no install is needed.
+    """
+    if restore_node_modules(repo_path, cache_root=cache_root):
+        return True
+    if os.path.exists(os.path.join(repo_path, 'node_modules')):
+        return False
+    previous_key = read_index(cache_root).get(os.path.basename(os.path.normpath(repo_path)))
+    if previous_key:
+        restore_node_modules(repo_path, previous_key, cache_root)
+    return False
@@ -0,0 +1,132 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the input on a stage queue
+END = object()
+
+
+class Stage:
+    """
+    One step of a Pipeline.
+
+    Args:
+        name (str): Name used in logs and stats.
+        func (callable): Called with a job; returns the job (or a new one) to hand to the
+            next stage, or None to stop processing it. Exceptions are logged and drop the job.
+        workers (int): Number of jobs this stage processes concurrently.
+        queue_size (int): Jobs that may wait in front of this stage, defaults to 2 * workers.
+            A full queue blocks the previous stage, so a slow stage cannot pile up work.
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size or 2 * workers
+
+
+class StageStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.completed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def record(self, outcome, seconds):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.busy_seconds += seconds
+
+
+class Pipeline:
+    """
+    Runs jobs through a sequence of stages connected by bounded queues.
+
+    Every stage has its own worker threads, so e.g. while one repository waits on the LLM
+    in the migrate stage, others are being installed or tested. Heavy stages should still
+    go through the resource scheduler inside their function; the pipeline only bounds how
+    many jobs each stage holds.
+    """
+
+    def __init__(self, stages, describe=str):
+        self.stages = stages
+        # Turns a job into the short name used in error messages
+        self.describe = describe
+        self.stats = {stage.name: StageStats() for stage in stages}
+
+    def run(self, jobs):
+        """
+        Feeds `jobs` through every stage.
+
+        Returns:
+            generator: The jobs returned by the last stage, in completion order.
+        """
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        output = queue.Queue()
+        queues.append(output)
+        threads = [threading.Thread(target=self.feed, args=(jobs, queues[0]), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            remaining_lock = threading.Lock()
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self.work, args=(stage, queues[i], queues[i + 1], remaining, remaining_lock), daemon=True))
+
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        while True:
+            job = output.get()
+            if job is END:
+                break
+            yield job
+        for thread in threads:
+            thread.join()
+        self.log_stats(time.monotonic() - start)
+
+    def feed(self, jobs, first_queue):
+        try:
+            for job in jobs:
+                first_queue.put(job)
+        finally:
+            first_queue.put(END)
+
+    def work(self, stage, input_queue, output_queue, remaining, remaining_lock):
+        stats = self.stats[stage.name]
+        while True:
+            job = input_queue.get()
+            if job is END:
+                # Let the other workers of this stage see the end as well
+                input_queue.put(END)
+                break
+            start = time.monotonic()
+            try:
+                result = stage.func(job)
+            except Exception as e:
+                stats.record('failed', time.monotonic() - start)
+                logger.error(f"Stage '{stage.name}' failed for {self.describe(job)}: {e}")
+                continue
+            if result is None:
+                stats.record('dropped', time.monotonic() - start)
+                continue
+            stats.record('completed', time.monotonic() - start)
+            output_queue.put(result)
+
+        with remaining_lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            output_queue.put(END)
+
+    def log_stats(self, elapsed):
+        for stage in self.stages:
+            stats = self.stats[stage.name]
+            # Share of the stage's worker capacity that was spent on jobs
+            utilization = stats.busy_seconds / (elapsed * stage.workers) if elapsed else 0
+            logger.info(f"Stage '{stage.name}': {stats.completed} completed, {stats.dropped} dropped, "
+                        f"{stats.failed} failed, {utilization:.0%} busy over {elapsed:.0f}s")
@@ -0,0 +1,141 @@
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from collections import deque, namedtuple
+
+from ..constants import *
+
+DEFAULT_TAIL_LINES = 200
+# Time given to the process group to exit after SIGTERM before it is killed
+KILL_GRACE_SECONDS = 5
+POLL_INTERVAL_SECONDS = 0.1
+
+logger = logging.getLogger(__name__)
+
+CommandResult = namedtuple('CommandResult', ['returncode', 'duration', 'peak_rss_kb', 'tail', 'timed_out'])
+CommandResult.__doc__ = """
+Outcome of `run_command`.
+
+Attributes:
+    returncode (int): Exit code, negative if the process was killed by a signal.
+    duration (float): Wall-clock seconds.
+    peak_rss_kb (int): Peak resident set size of the process and the children it waited for, in KB.
+    tail (str): The last lines of combined stdout/stderr.
+    timed_out (bool): True if the process group was killed for exceeding the timeout.
+"""
+
+
+def exit_code_from_status(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def kill_process_group(pid, sig):
+    try:
+        os.killpg(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def run_command(command, cwd, timeout=GLOBAL_TIMEOUT, log_path=None, log_mode='w', env=None, tail_lines=DEFAULT_TAIL_LINES):
+    """
+    Runs a command while draining stdout and stderr concurrently.
+
+    Both streams are read on their own threads, so neither pipe can fill up and block the
+    child. Every line is written to `log_path` (stderr lines prefixed with '[stderr] ') and
+    kept in a bounded ring buffer of the last `tail_lines` lines. The command runs in its
+    own process group; on timeout the whole group (npm and every node process it spawned)
+    is terminated, and once the command exits anything it left running in the group is killed.
+
+    Args:
+        command (list): The command and its arguments.
+        cwd (str): Working directory.
+        timeout (float): Seconds before the process group is killed, or None.
+        log_path (str): Optional file receiving the full output.
+        log_mode (str): 'w' to overwrite the log file, 'a' to append to it.
+        env (dict): Optional environment.
+        tail_lines (int): Number of output lines kept in the result.
+
+    Returns:
+        CommandResult: The exit code, duration, peak RSS and output tail.
+    """
+    start = time.monotonic()
+    tail = deque(maxlen=tail_lines)
+    lock = threading.Lock()
+    log_file = open(log_path, log_mode, encoding='utf-8') if log_path else None
+
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, errors='replace', start_new_session=True)
+
+    def drain(stream, prefix):
+        for line in stream:
+            with lock:
+                tail.append(prefix + line)
+                if log_file is not None:
+                    log_file.write(prefix + line)
+        stream.close()
+
+    readers = [
+        threading.Thread(target=drain, args=(process.stdout, ''), daemon=True),
+        threading.Thread(target=drain, args=(process.stderr, '[stderr] '), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    # os.wait4 reports the child's resource usage, which subprocess.wait() discards
+    timed_out = False
+    deadline = start + timeout if timeout else None
+    status, rusage = None, None
+    try:
+        while True:
+            pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                timed_out = True
+                logger.warning(f"{' '.join(command)} timed out after {timeout}s in {cwd}, killing its process group")
+                kill_process_group(process.pid, signal.SIGTERM)
+                grace_deadline = time.monotonic() + KILL_GRACE_SECONDS
+                while time.monotonic() < grace_deadline:
+                    pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+                    if pid:
+                        break
+                    time.sleep(POLL_INTERVAL_SECONDS)
+                else:
+                    kill_process_group(process.pid, signal.SIGKILL)
+                    _, status, rusage = os.wait4(process.pid, 0)
+                break
+            time.sleep(POLL_INTERVAL_SECONDS)
+    except BaseException:
+        kill_process_group(process.pid, signal.SIGKILL)
+        raise
+    finally:
+        returncode = exit_code_from_status(status) if status is not None else -signal.SIGKILL
+        # Tell Popen the child has been reaped so it does not try to wait for it again
+        process.returncode = returncode
+        # Kill whatever the command left behind in its group, e.g. a daemon started by a postinstall
+        # script: it would hold the pipes open and keep the readers waiting
+        kill_process_group(process.pid, signal.SIGKILL)
+        for reader in readers:
+            # Bounded only for processes that left the group (setsid) but kept the pipes
+            reader.join(timeout=KILL_GRACE_SECONDS)
+        with lock:
+            if log_file is not None:
+                log_file.close()
+                # A reader still running stops writing to the log
+                log_file = None
+
+    with lock:
+        tail_text = ''.join(tail)
+    return CommandResult(
+        returncode=returncode,
+        duration=time.monotonic() - start,
+        peak_rss_kb=rusage.ru_maxrss if rusage is not None else 0,
+        tail=tail_text,
+        timed_out=timed_out,
+    )
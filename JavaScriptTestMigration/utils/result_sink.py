@@ -0,0 +1,141 @@
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_ROWS = 500
+DEFAULT_FLUSH_SECONDS = 2.0
+
+_CLOSE = object()
+_CALLBACK = object()
+
+
+class ResultSink:
+    """
+    Single-writer sink for result lines such as SEART_FILTERED_REPOS/<framework>/repos.txt.
+
+    Workers call `write(path, line)`, which only enqueues. One writer thread batches lines
+    per output file and appends a batch to `<path>.partial` once it reaches `flush_rows`
+    lines or `flush_seconds` have passed. On `close()` the remaining lines are flushed and
+    each `.partial` file is merged into its target through a temporary file and
+    `os.replace`, so the target is only ever replaced as a whole.
+
+    `on_flushed(callback)` runs `callback` on the writer thread once every line written
+    before it has reached its `.partial` file, e.g. to checkpoint a repository only after
+    its rows are on disk.
+    """
+
+    def __init__(self, flush_rows=DEFAULT_FLUSH_ROWS, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue()
+        self.pending = defaultdict(list)
+        self.touched = set()
+        self.callbacks = []
+        self.thread = threading.Thread(target=self.run, name='result-sink', daemon=True)
+        self.started = False
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            self.thread.start()
+        return self
+
+    def write(self, path, line):
+        if not line.endswith('\n'):
+            line += '\n'
+        self.queue.put((path, line))
+
+    def on_flushed(self, callback):
+        self.queue.put((_CALLBACK, callback))
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(self.flush_seconds - (time.monotonic() - last_flush), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _CLOSE:
+                break
+            if item is not None and item[0] is _CALLBACK:
+                # Every line queued before the callback is already pending
+                self.callbacks.append(item[1])
+            elif item is not None:
+                path, line = item
+                if path not in self.touched and os.path.exists(path + '.partial'):
+                    # Left behind by a run that crashed before close(); merge it on this commit
+                    self.touched.add(path)
+                self.pending[path].append(line)
+                if len(self.pending[path]) >= self.flush_rows:
+                    self.flush_path(path)
+
+            if time.monotonic() - last_flush >= self.flush_seconds:
+                self.flush_all()
+                last_flush = time.monotonic()
+
+        self.flush_all()
+        self.commit()
+
+    def flush_path(self, path):
+        lines = self.pending.pop(path, None)
+        if not lines:
+            return
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(path + '.partial', mode='a', encoding='utf-8') as file:
+                file.write(''.join(lines))
+            self.touched.add(path)
+        except Exception as e:
+            logger.error(f"An error occurred while writing to {path}: {e}")
+
+    def flush_all(self):
+        for path in list(self.pending):
+            self.flush_path(path)
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"A flush callback failed: {e}")
+
+    def commit(self):
+        for path in self.touched:
+            partial_path = path + '.partial'
+            tmp_path = path + '.tmp'
+            try:
+                with open(tmp_path, mode='wb') as out:
+                    if os.path.exists(path):
+                        with open(path, mode='rb') as existing:
+                            shutil.copyfileobj(existing, out)
+                    with open(partial_path, mode='rb') as partial:
+                        shutil.copyfileobj(partial, out)
+                    out.flush()
+                    os.fsync(out.fileno())
+                os.replace(tmp_path, path)
+                os.remove(partial_path)
+            except Exception as e:
+                logger.error(f"An error occurred while committing {path}: {e}")
+        self.touched.clear()
+
+    def close(self):
+        if self.started:
+            self.queue.put(_CLOSE)
+            self.thread.join()
+            self.started = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
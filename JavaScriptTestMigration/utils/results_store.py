@@ -0,0 +1,267 @@
+import json
+import os
+import sqlite3
+import time
+
+from threading import Lock
+
+from .jest_results import JestRunResult, JestTestRecord, relative_test_path
+from ..constants import *
+
+RESULTS_STORE_PATH = os.path.join(os.path.dirname(os.path.normpath(ABSOLUTE_PATH)), 'results.sqlite')
+
+# Outcome of a repo in a run, besides a completed test run
+STATUS_COMPLETED = 'completed'
+STATUS_CLONE_FAILED = 'clone_failed'
+STATUS_INSTALL_FAILED = 'install_failed'
+STATUS_TEST_ERROR = 'test_error'
+STATUS_NO_TESTS = 'no_tests'
+
+# Tables exported by `export_parquet`, in dependency order
+TABLES = ('runs', 'repos', 'repo_results', 'test_files', 'tests')
+
+
+class ResultsStore:
+    """
+    SQLite store for the outcome of every test run.
+
+    A run (`runs`) is one pass over a set of repos, e.g. the baseline or a migration
+    experiment. For each repo in a run, `repo_results` holds the summary counts that used
+    to be written as a comma-joined line, `test_files` the status and error message of
+    every test file, and `tests` every test case with its duration and failure messages.
+    Test file paths are stored relative to the repo, so runs made in different checkout
+    directories (ABSOLUTE_PATH, ABSOLUTE_PATH_MIGRATION, ...) can be compared directly.
+    """
+
+    def __init__(self, path=RESULTS_STORE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('PRAGMA foreign_keys=ON')
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                label TEXT NOT NULL,
+                phase TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                notes TEXT
+            );
+            CREATE TABLE IF NOT EXISTS repos (
+                repo_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS repo_results (
+                run_id INTEGER NOT NULL REFERENCES runs(run_id),
+                repo_id INTEGER NOT NULL REFERENCES repos(repo_id),
+                status TEXT NOT NULL,
+                passed_tests INTEGER,
+                failed_tests INTEGER,
+                pending_tests INTEGER,
+                passed_suites INTEGER,
+                failed_suites INTEGER,
+                files_migrated INTEGER,
+                duration REAL,
+                recorded_at REAL NOT NULL,
+                PRIMARY KEY (run_id, repo_id)
+            );
+            CREATE TABLE IF NOT EXISTS test_files (
+                run_id INTEGER NOT NULL,
+                repo_id INTEGER NOT NULL,
+                file TEXT NOT NULL,
+                status TEXT NOT NULL,
+                message TEXT,
+                PRIMARY KEY (run_id, repo_id, file),
+                FOREIGN KEY (run_id, repo_id) REFERENCES repo_results(run_id, repo_id) ON DELETE CASCADE
+            );
+            CREATE TABLE IF NOT EXISTS tests (
+                run_id INTEGER NOT NULL,
+                repo_id INTEGER NOT NULL,
+                file TEXT NOT NULL,
+                full_name TEXT NOT NULL,
+                status TEXT NOT NULL,
+                duration_ms REAL,
+                failure_messages TEXT,
+                FOREIGN KEY (run_id, repo_id) REFERENCES repo_results(run_id, repo_id) ON DELETE CASCADE
+            );
+            CREATE INDEX IF NOT EXISTS tests_by_file ON tests (run_id, repo_id, file);
+            CREATE INDEX IF NOT EXISTS repo_results_by_repo ON repo_results (repo_id, run_id);
+        """)
+        self.connection.commit()
+
+    def start_run(self, label, phase='baseline', notes=None):
+        """
+        Registers a new run.
+
+        Args:
+            label (str): Human readable name, e.g. 'zero_shot'.
+            phase (str): 'baseline' or 'post_migration'.
+            notes (str): Optional free text, e.g. the model or prompt used.
+
+        Returns:
+            int: The id of the run.
+        """
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (label, phase, started_at, notes) VALUES (?, ?, ?, ?)',
+                (label, phase, time.time(), notes))
+        return cursor.lastrowid
+
+    def latest_run(self, label=None, phase=None):
+        query = 'SELECT run_id FROM runs WHERE (? IS NULL OR label = ?) AND (? IS NULL OR phase = ?) ORDER BY run_id DESC LIMIT 1'
+        with self.lock:
+            row = self.connection.execute(query, (label, label, phase, phase)).fetchone()
+        return row[0] if row else None
+
+    def repo_id(self, name):
+        # Callers hold self.lock
+        self.connection.execute('INSERT OR IGNORE INTO repos (name) VALUES (?)', (name,))
+        return self.connection.execute('SELECT repo_id FROM repos WHERE name = ?', (name,)).fetchone()[0]
+
+    def record_repo_result(self, run_id, repo, status=STATUS_COMPLETED, counts=None, files_migrated=-1, report=None, repo_path=None, duration=None):
+        """
+        Records (or replaces) the outcome of one repo in a run.
+
+        Args:
+            run_id (int): Run returned by `start_run`.
+            repo (str): Repository name.
+            status (str): One of the STATUS_* values.
+            counts (tuple): (passing_tests, failing_tests, passing_test_suites, failing_test_suites).
+            files_migrated (int): Number of migrated test files, -1 for baseline runs.
+            report (JestRunResult): Parsed jest report with the per-file and per-test results.
+            repo_path (str): Checkout the report was produced in, used to make file paths relative.
+            duration (float): Wall-clock seconds of the test run.
+        """
+        passed_tests, failed_tests, passed_suites, failed_suites = counts or (None, None, None, None)
+        pending_tests = report.num_pending_tests if report is not None else None
+        with self.lock, self.connection:
+            repo_id = self.repo_id(repo)
+            self.connection.execute('DELETE FROM tests WHERE run_id = ? AND repo_id = ?', (run_id, repo_id))
+            self.connection.execute('DELETE FROM test_files WHERE run_id = ? AND repo_id = ?', (run_id, repo_id))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO repo_results (run_id, repo_id, status, passed_tests, failed_tests, pending_tests, '
+                'passed_suites, failed_suites, files_migrated, duration, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (run_id, repo_id, status, passed_tests, failed_tests, pending_tests, passed_suites, failed_suites,
+                 files_migrated, duration, time.time()))
+            if report is None:
+                return
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO test_files (run_id, repo_id, file, status, message) VALUES (?, ?, ?, ?, ?)',
+                ((run_id, repo_id, relative_test_path(file, repo_path), file_status, message)
+                 for file, (file_status, message) in report.files.items()))
+            self.connection.executemany(
+                'INSERT INTO tests (run_id, repo_id, file, full_name, status, duration_ms, failure_messages) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                ((run_id, repo_id, relative_test_path(test.file, repo_path), test.full_name, test.status, test.duration_ms,
+                  json.dumps(test.failure_messages) if test.failure_messages else None)
+                 for test in report.tests))
+
+    def repo_results(self, run_id):
+        """
+        Returns:
+            list: (repo, status, passed_tests, failed_tests, passed_suites, failed_suites, files_migrated) per repo in the run.
+        """
+        with self.lock:
+            return self.connection.execute(
+                'SELECT r.name, rr.status, rr.passed_tests, rr.failed_tests, rr.passed_suites, rr.failed_suites, rr.files_migrated '
+                'FROM repo_results rr JOIN repos r ON r.repo_id = rr.repo_id WHERE rr.run_id = ? ORDER BY r.name',
+                (run_id,)).fetchall()
+
+    def load_report(self, run_id, repo):
+        """
+        Rebuilds the per-file and per-test results of a repo in a run, with file paths
+        relative to the repo, e.g. to merge a partial re-run with its baseline.
+
+        Returns:
+            JestRunResult: The stored results, or None if the repo has no test files in the run.
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT repo_id FROM repos WHERE name = ?', (repo,)).fetchone()
+            if row is None:
+                return None
+            files = self.connection.execute(
+                'SELECT file, status, message FROM test_files WHERE run_id = ? AND repo_id = ?', (run_id, row[0])).fetchall()
+            tests = self.connection.execute(
+                'SELECT file, full_name, status, duration_ms, failure_messages FROM tests WHERE run_id = ? AND repo_id = ? ORDER BY rowid',
+                (run_id, row[0])).fetchall()
+        if not files:
+            return None
+        report = JestRunResult()
+        report.files = {file: (status, message or '') for file, status, message in files}
+        report.tests = [JestTestRecord(file, full_name, status, duration_ms, json.loads(messages) if messages else [])
+                        for file, full_name, status, duration_ms, messages in tests]
+        return report
+
+    def regressed_files(self, baseline_run, migrated_run):
+        """
+        Finds test files that passed in the baseline run but did not pass after migration.
+
+        Returns:
+            list: (repo, file, migrated_status, migrated_message) for every regressed file.
+        """
+        with self.lock:
+            return self.connection.execute(
+                'SELECT r.name, m.file, m.status, m.message FROM test_files b '
+                'JOIN test_files m ON m.repo_id = b.repo_id AND m.file = b.file AND m.run_id = ? '
+                'JOIN repos r ON r.repo_id = b.repo_id '
+                "WHERE b.run_id = ? AND b.status = 'passed' AND m.status != 'passed' "
+                'ORDER BY r.name, m.file',
+                (migrated_run, baseline_run)).fetchall()
+
+    def regressed_tests(self, baseline_run, migrated_run):
+        """
+        Finds test cases that passed in the baseline run but failed after migration.
+
+        Returns:
+            list: (repo, file, full_name, failure_messages) for every regressed test.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT r.name, m.file, m.full_name, m.failure_messages FROM tests b '
+                'JOIN tests m ON m.repo_id = b.repo_id AND m.file = b.file AND m.full_name = b.full_name AND m.run_id = ? '
+                'JOIN repos r ON r.repo_id = b.repo_id '
+                "WHERE b.run_id = ? AND b.status = 'passed' AND m.status = 'failed' "
+                'ORDER BY r.name, m.file, m.full_name',
+                (migrated_run, baseline_run)).fetchall()
+        return [(repo, file, full_name, json.loads(messages) if messages else []) for repo, file, full_name, messages in rows]
+
+    def export_parquet(self, directory):
+        """
+        Writes every table to `<directory>/<table>.parquet` for analysis in pandas/DuckDB.
+        Needs the optional pyarrow dependency (`pip install .[results]`).
+
+        Returns:
+            list: Paths of the written files.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Exporting to Parquet requires pyarrow: pip install pyarrow")
+
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for table in TABLES:
+            with self.lock:
+                cursor = self.connection.execute(f'SELECT * FROM {table}')
+                columns = [description[0] for description in cursor.description]
+                rows = cursor.fetchall()
+            data = {column: [row[i] for row in rows] for i, column in enumerate(columns)}
+            path = os.path.join(directory, f'{table}.parquet')
+            pq.write_table(pa.table(data), path)
+            paths.append(path)
+        return paths
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
@@ -0,0 +1,162 @@
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+from collections import deque
+
+from .jest_results import JEST_OUTPUT_FILE
+from .scratch import ORIGIN_SUFFIX, tree_size
+from ..constants import *
+
+ARTIFACT_ROOT = os.path.join(os.path.dirname(os.path.normpath(ABSOLUTE_PATH)), 'artifacts')
+# Files kept from every repository, on top of whatever git reports as changed
+ARTIFACT_FILES = ('test_suite_results.txt', JEST_OUTPUT_FILE, 'package.json')
+# Disk space the finished clones may use before the oldest ones are removed
+DEFAULT_WORKSPACE_BUDGET_BYTES = 50 * 1024 ** 3
+# Clones are removed regardless of the budget while the filesystem has less free space than this
+MIN_FREE_BYTES = 10 * 1024 ** 3
+
+logger = logging.getLogger(__name__)
+
+
+def changed_files(repo_path):
+    """
+    Lists files git reports as modified or untracked (e.g. migrated tests), relative to the repo.
+    Untracked directories are skipped rather than expanded, so an unignored node_modules
+    is never listed file by file.
+    """
+    try:
+        result = subprocess.run(['git', 'status', '--porcelain', '-z', '--untracked-files=normal'], cwd=repo_path,
+                                capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.SubprocessError):
+        return []
+    if result.returncode != 0:
+        return []
+    files = []
+    entries = iter(result.stdout.split('\0'))
+    for entry in entries:
+        if len(entry) < 4:
+            continue
+        status, path = entry[:2], entry[3:]
+        if 'R' in status or 'C' in status:
+            # Renames are followed by the original path
+            next(entries, None)
+        if 'D' in status or path.endswith('/') or path.split('/')[0] == 'node_modules':
+            continue
+        files.append(path)
+    return files
+
+
+class RetentionManager:
+    """
+    Garbage collects finished repositories so long batch runs keep disk usage steady.
+
+    `release(repo_path)` copies the artifacts needed later (test_suite_results.txt,
+    output.json, package.json and every file git reports as changed, e.g. migrated tests)
+    to `artifact_root/<repo>`, then hands the repository to a background thread. That
+    thread deletes node_modules right away (the node_modules cache can restore it) and
+    keeps the rest of the clone until the finished clones exceed `budget_bytes` or the
+    filesystem has less than `min_free_bytes` free; then the oldest clones are removed.
+
+    scripts/setup_and_test_repos.py uses it by default. Clones within the budget stay
+    usable, but the migration scripts read the clones, including test_suite_results.txt,
+    in place rather than from artifact_root, so run the sweep with --keep-workspaces
+    when a migration run will reuse every clone.
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_WORKSPACE_BUDGET_BYTES, artifact_root=ARTIFACT_ROOT, min_free_bytes=MIN_FREE_BYTES):
+        self.budget_bytes = budget_bytes
+        self.artifact_root = artifact_root
+        self.min_free_bytes = min_free_bytes
+        self.pending = queue.Queue()
+        # (repo path, size) of finished clones still on disk, oldest first
+        self.retained = deque()
+        self.retained_bytes = 0
+        self.worker = threading.Thread(target=self.prune_loop, daemon=True)
+        self.worker.start()
+
+    def collect_artifacts(self, repo_path):
+        repo_name = os.path.basename(os.path.normpath(repo_path))
+        destination = os.path.join(self.artifact_root, repo_name)
+        kept = 0
+        for relative_path in set(ARTIFACT_FILES) | set(changed_files(repo_path)):
+            source = os.path.join(repo_path, relative_path)
+            if not os.path.isfile(source):
+                continue
+            target = os.path.join(destination, relative_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+            kept += 1
+        return kept
+
+    def release(self, repo_path, staged_path=None):
+        """
+        Keeps the artifacts of a finished repository and schedules its workspace for pruning.
+
+        Args:
+            repo_path (str): The repository's persistent checkout.
+            staged_path (str): Its scratch copy, if it is still staged (see ScratchSpace.detach).
+                Artifacts are taken from this copy, which is the most recent one.
+        """
+        source = staged_path if staged_path and os.path.isdir(staged_path) else repo_path
+        if os.path.isdir(source):
+            try:
+                kept = self.collect_artifacts(source)
+                logger.info(f"Kept {kept} artifacts of {os.path.basename(os.path.normpath(repo_path))}")
+            except OSError as e:
+                logger.error(f"Could not keep the artifacts of {repo_path}: {e}")
+        self.pending.put((repo_path, staged_path))
+
+    def over_budget(self, root):
+        if self.retained_bytes > self.budget_bytes:
+            return True
+        try:
+            return shutil.disk_usage(root).free < self.min_free_bytes
+        except OSError:
+            return False
+
+    def prune_loop(self):
+        while True:
+            item = self.pending.get()
+            try:
+                if item is None:
+                    return
+                self.prune(*item)
+            except Exception as e:
+                logger.error(f"Could not prune {item[0]}: {e}")
+            finally:
+                self.pending.task_done()
+
+    def prune(self, repo_path, staged_path=None):
+        if staged_path:
+            shutil.rmtree(staged_path, ignore_errors=True)
+            if os.path.exists(staged_path + ORIGIN_SUFFIX):
+                os.remove(staged_path + ORIGIN_SUFFIX)
+        shutil.rmtree(os.path.join(repo_path, 'node_modules'), ignore_errors=True)
+        if os.path.isdir(repo_path):
+            size = tree_size(repo_path)
+            self.retained.append((repo_path, size))
+            self.retained_bytes += size
+
+        root = os.path.dirname(os.path.normpath(repo_path))
+        while self.retained and self.over_budget(root):
+            oldest, size = self.retained.popleft()
+            shutil.rmtree(oldest, ignore_errors=True)
+            self.retained_bytes -= size
+            logger.info(f"Removed finished clone {os.path.basename(oldest)} ({size // (1024 * 1024)} MB)")
+
+    def close(self):
+        """
+        Waits for every released repository to be pruned and stops the background thread.
+        """
+        self.pending.put(None)
+        self.worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
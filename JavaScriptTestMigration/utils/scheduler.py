@@ -0,0 +1,124 @@
+import contextlib
+import logging
+import os
+import threading
+import time
+
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+PhaseCost = namedtuple('PhaseCost', ['memory_mb', 'cpu'])
+
+# Rough per-job cost of each phase. Clones and LLM calls mostly wait on the network,
+# installs are network/disk bound with a large node heap, jest saturates its CPU workers.
+PHASE_COSTS = {
+    'clone': PhaseCost(memory_mb=150, cpu=0.2),
+    'install': PhaseCost(memory_mb=1024, cpu=1.0),
+    'migrate': PhaseCost(memory_mb=50, cpu=0.1),
+    'test': PhaseCost(memory_mb=1536, cpu=2.0),
+}
+
+# Upper bound on concurrent jobs per phase, on top of the memory and CPU checks
+CPU_COUNT = os.cpu_count() or 1
+PHASE_LIMITS = {
+    'clone': 16,
+    'install': max(2, CPU_COUNT // 2),
+    'migrate': 32,
+    'test': max(1, CPU_COUNT // 2),
+}
+
+# Memory kept free for the OS and everything else on the host
+MEMORY_RESERVE_MB = 2048
+# A freshly started job has not allocated its memory yet, so its cost is still counted
+# against MemAvailable for this long after it is admitted
+WARMUP_SECONDS = 30
+POLL_INTERVAL_SECONDS = 1.0
+
+
+def available_memory_mb():
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+
+
+def load_average():
+    try:
+        return os.getloadavg()[0]
+    except OSError:
+        return 0.0
+
+
+class ResourceScheduler:
+    """
+    Admits install/test jobs based on free memory, CPU and load instead of a fixed thread count.
+
+    Each phase has its own queue: a job waits in `admit(phase)` until its phase is below
+    its concurrency limit, the CPU it needs is not already reserved by running jobs, the
+    one-minute load average is below `max_load`, and MemAvailable (minus the cost of jobs
+    that are still warming up) leaves `memory_reserve_mb` free after it starts. A job is
+    always admitted when nothing else is running, so a small host cannot deadlock.
+    """
+
+    def __init__(self, phase_costs=None, phase_limits=None, memory_reserve_mb=MEMORY_RESERVE_MB, max_load=None, cpu_count=CPU_COUNT):
+        self.phase_costs = dict(PHASE_COSTS, **(phase_costs or {}))
+        self.phase_limits = dict(PHASE_LIMITS, **(phase_limits or {}))
+        self.memory_reserve_mb = memory_reserve_mb
+        self.cpu_count = cpu_count
+        self.max_load = max_load if max_load is not None else cpu_count * 1.5
+        self.condition = threading.Condition()
+        self.running = {phase: 0 for phase in self.phase_costs}
+        self.reserved_cpu = 0.0
+        self.warming_up = []
+
+    def cost(self, phase):
+        return self.phase_costs.get(phase, PhaseCost(memory_mb=0, cpu=0))
+
+    def can_admit(self, phase):
+        if not any(self.running.values()):
+            return True
+        if self.running.get(phase, 0) >= self.phase_limits.get(phase, self.cpu_count):
+            return False
+
+        cost = self.cost(phase)
+        if self.reserved_cpu + cost.cpu > self.cpu_count or load_average() > self.max_load:
+            return False
+
+        now = time.monotonic()
+        self.warming_up = [(started, memory_mb) for started, memory_mb in self.warming_up if now - started < WARMUP_SECONDS]
+        pending_mb = sum(memory_mb for _, memory_mb in self.warming_up)
+        return available_memory_mb() - pending_mb - cost.memory_mb >= self.memory_reserve_mb
+
+    @contextlib.contextmanager
+    def admit(self, phase):
+        cost = self.cost(phase)
+        waited = time.monotonic()
+        with self.condition:
+            while not self.can_admit(phase):
+                self.condition.wait(POLL_INTERVAL_SECONDS)
+            self.running[phase] = self.running.get(phase, 0) + 1
+            self.reserved_cpu += cost.cpu
+            self.warming_up.append((time.monotonic(), cost.memory_mb))
+        waited = time.monotonic() - waited
+        if waited > POLL_INTERVAL_SECONDS:
+            logger.info(f"Admitted {phase} job after waiting {waited:.0f}s")
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.running[phase] -= 1
+                self.reserved_cpu -= cost.cpu
+                self.condition.notify_all()
+
+    def snapshot(self):
+        with self.condition:
+            return dict(self.running)
+
+
+# Shared by every worker thread in the process
+scheduler = ResourceScheduler()
@@ -0,0 +1,257 @@
+import atexit
+import contextlib
+import hashlib
+import logging
+import os
+import shutil
+import time
+
+from collections import OrderedDict
+from threading import Condition, Lock
+
+from .workspace_snapshot import clone_tree
+
+# RAM-backed by default; point it at a local SSD with JSTM_SCRATCH_ROOT
+SCRATCH_ROOT = os.environ.get('JSTM_SCRATCH_ROOT', os.path.join('/dev/shm', 'jstm_scratch'))
+# Share of the scratch filesystem used when no capacity is given
+DEFAULT_CAPACITY_FRACTION = 0.8
+# Written next to each staged repository with the path it was staged from
+ORIGIN_SUFFIX = '.origin'
+
+logger = logging.getLogger(__name__)
+
+
+def tree_size(path):
+    """
+    Returns the disk usage of a directory tree in bytes, counting hardlinked files once.
+    """
+    total = 0
+    seen = set()
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                stat = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            if (stat.st_dev, stat.st_ino) in seen:
+                continue
+            seen.add((stat.st_dev, stat.st_ino))
+            total += stat.st_blocks * 512
+    return total
+
+
+def default_capacity(root):
+    stat = os.statvfs(root)
+    return int(stat.f_blocks * stat.f_frsize * DEFAULT_CAPACITY_FRACTION)
+
+
+class ScratchSpace:
+    """
+    Stages repositories on a fast scratch directory (tmpfs or local SSD) while they are
+    installed and tested, keeping the most recently used ones there up to a capacity.
+
+    `stage(repo_path)` copies a repository from persistent storage into the scratch root
+    (or reuses the staged copy) and pins it for the duration of the `with` block. When room
+    is needed, the least recently used unpinned repositories are evicted: copied back over
+    their persistent directory and removed from scratch. node_modules is not copied back
+    unless `evict_node_modules` is False, since the node_modules cache restores it.
+    Repositories that cannot fit are used in place.
+
+    Repositories found in the scratch root at startup are left over from an earlier process
+    and are adopted, so a crash does not lose their changes.
+
+    On tmpfs the capacity is RAM that the ResourceScheduler's memory admission does not
+    know about, so scratch staging is opt-in and `capacity_bytes` should leave room for the
+    install and test jobs themselves.
+    """
+
+    def __init__(self, root=SCRATCH_ROOT, capacity_bytes=None, evict_node_modules=True):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.capacity_bytes = capacity_bytes or default_capacity(root)
+        self.evict_node_modules = evict_node_modules
+        self.lock = Lock()
+        self.condition = Condition(self.lock)
+        # scratch path -> [persistent path, size in bytes, pin count], least recently used first
+        self.entries = OrderedDict()
+        # Scratch paths being copied in or evicted; `stage` waits for them
+        self.busy = set()
+        self.adopt_leftovers()
+        atexit.register(self.flush)
+
+    def scratch_path(self, persistent_path):
+        persistent_path = os.path.abspath(persistent_path)
+        # Keep the repo name as the basename so logs and jest paths stay recognisable
+        digest = hashlib.sha1(os.path.dirname(persistent_path).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.root, digest, os.path.basename(persistent_path))
+
+    def adopt_leftovers(self):
+        staged = []
+        for parent in os.listdir(self.root):
+            parent_path = os.path.join(self.root, parent)
+            if not os.path.isdir(parent_path):
+                continue
+            for name in os.listdir(parent_path):
+                scratch = os.path.join(parent_path, name)
+                if not os.path.isdir(scratch) or name.endswith('.tmp'):
+                    continue
+                try:
+                    with open(scratch + ORIGIN_SUFFIX, 'r', encoding='utf-8') as f:
+                        persistent = f.read().strip()
+                except OSError:
+                    # Never finished staging, the persistent copy is still current
+                    shutil.rmtree(scratch, ignore_errors=True)
+                    continue
+                staged.append((os.path.getmtime(scratch), scratch, persistent))
+        for _, scratch, persistent in sorted(staged):
+            self.entries[scratch] = [persistent, tree_size(scratch), 0]
+        if staged:
+            logger.info(f"Adopted {len(staged)} repositories left in {self.root}")
+
+    def used_bytes(self):
+        return sum(size for _, size, _ in self.entries.values())
+
+    def pick_victims(self, needed):
+        """
+        Removes least recently used, unpinned entries until `needed` bytes fit.
+        Callers hold self.lock and evict the returned entries after releasing it.
+
+        Returns:
+            tuple: (fits, [(scratch, persistent, size), ...])
+        """
+        victims = []
+        for scratch in list(self.entries):
+            if self.used_bytes() + needed <= self.capacity_bytes:
+                break
+            persistent, size, pins = self.entries[scratch]
+            if pins == 0:
+                del self.entries[scratch]
+                self.busy.add(scratch)
+                victims.append((scratch, persistent, size))
+        return self.used_bytes() + needed <= self.capacity_bytes, victims
+
+    def evict(self, scratch, persistent, size):
+        """
+        Copies a staged repository back to persistent storage and removes it from scratch.
+        """
+        start = time.monotonic()
+        tmp_path = os.path.normpath(persistent) + '.evict.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if self.evict_node_modules:
+            shutil.rmtree(os.path.join(scratch, 'node_modules'), ignore_errors=True)
+        clone_tree(scratch, tmp_path)
+        if os.path.exists(persistent):
+            shutil.rmtree(persistent)
+        os.replace(tmp_path, persistent)
+        os.remove(scratch + ORIGIN_SUFFIX)
+        shutil.rmtree(scratch, ignore_errors=True)
+        logger.info(f"Evicted {os.path.basename(scratch)} ({size // (1024 * 1024)} MB) from scratch in {time.monotonic() - start:.1f}s")
+
+    def evict_all(self, victims):
+        for scratch, persistent, size in victims:
+            try:
+                self.evict(scratch, persistent, size)
+            except OSError as e:
+                logger.error(f"Could not evict {scratch} to {persistent}: {e}")
+            finally:
+                self.release_busy(scratch)
+
+    def release_busy(self, scratch):
+        with self.condition:
+            self.busy.discard(scratch)
+            self.condition.notify_all()
+
+    def copy_in(self, scratch, persistent_path):
+        """
+        Reserves room for a repository and copies it into scratch. Callers have marked
+        `scratch` busy.
+
+        Returns:
+            bool: False if it does not fit.
+        """
+        size = tree_size(persistent_path)
+        with self.lock:
+            fits, victims = self.pick_victims(size)
+            if fits:
+                # Reserve the space and pin the entry before copying outside the lock
+                self.entries[scratch] = [os.path.abspath(persistent_path), size, 1]
+        self.evict_all(victims)
+        if not fits:
+            logger.info(f"No scratch space for {os.path.basename(persistent_path)}, using it in place")
+            return False
+        try:
+            tmp_path = scratch + '.tmp'
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            clone_tree(persistent_path, tmp_path)
+            os.replace(tmp_path, scratch)
+            with open(scratch + ORIGIN_SUFFIX, 'w', encoding='utf-8') as f:
+                f.write(os.path.abspath(persistent_path))
+        except BaseException:
+            with self.lock:
+                del self.entries[scratch]
+            raise
+        return True
+
+    @contextlib.contextmanager
+    def stage(self, persistent_path):
+        """
+        Yields the path to use for a repository: its scratch copy, or `persistent_path`
+        itself if it does not fit in the scratch space.
+        """
+        scratch = self.scratch_path(persistent_path)
+        with self.condition:
+            # Another thread copying this repository in or evicting it finishes first
+            while scratch in self.busy:
+                self.condition.wait()
+            staged = scratch in self.entries
+            if staged:
+                self.entries.move_to_end(scratch)
+                self.entries[scratch][2] += 1
+            else:
+                self.busy.add(scratch)
+        if not staged:
+            try:
+                fits = self.copy_in(scratch, persistent_path)
+            finally:
+                self.release_busy(scratch)
+            if not fits:
+                yield persistent_path
+                return
+
+        try:
+            yield scratch
+        finally:
+            # Installs grow the repository, so its size is measured again once it is released
+            size = tree_size(scratch)
+            with self.lock:
+                entry = self.entries[scratch]
+                entry[1] = size
+                entry[2] -= 1
+                _, victims = self.pick_victims(0)
+            self.evict_all(victims)
+
+    def detach(self, persistent_path):
+        """
+        Stops tracking a repository without copying it back, e.g. because it is being deleted.
+
+        Returns:
+            str: Its scratch path, now owned by the caller, or None if it is not staged or in use.
+        """
+        scratch = self.scratch_path(persistent_path)
+        with self.lock:
+            entry = self.entries.get(scratch)
+            if entry is None or entry[2] > 0:
+                return None
+            del self.entries[scratch]
+        return scratch
+
+    def flush(self):
+        """
+        Evicts every staged repository that is not in use.
+        """
+        with self.lock:
+            victims = [(scratch, persistent, size) for scratch, (persistent, size, pins) in self.entries.items() if pins == 0]
+            for scratch, _, _ in victims:
+                del self.entries[scratch]
+                self.busy.add(scratch)
+        self.evict_all(victims)
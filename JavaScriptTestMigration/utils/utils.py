@@ -6,14 +6,27 @@ import fnmatch
 import csv
 import requests
 import concurrent.futures
+import contextlib
 import shutil
 import argparse
 import re
+import zlib
 import logging
+import tempfile
+import time
 
 from threading import Lock
 from itertools import product
 from collections import Counter
+from .csv_updates import csv_row_updates
+from .framework_tally import FrameworkTally, record_checked
+from .jest_results import JEST_OUTPUT_FILE, merge_reports, parse_jest_json, parse_jest_summary, parse_summary_line, with_relative_paths
+from .mirror_cache import checkout_from_mirror
+from .node_modules_cache import manifest_key, node_modules_up_to_date, prepare_node_modules, store_node_modules
+from .process_runner import run_command
+from .retention import DEFAULT_WORKSPACE_BUDGET_BYTES, RetentionManager
+from .results_store import STATUS_CLONE_FAILED, STATUS_COMPLETED, STATUS_INSTALL_FAILED, STATUS_NO_TESTS, STATUS_TEST_ERROR
+from .scheduler import scheduler
 from ..constants import *
 
 logging.basicConfig(level=logging.INFO, format='%(threadName)s: %(message)s')
@@ -60,34 +73,15 @@ def save_test_suite_results(repo_path, test_suite_results_path, res):
         print(f"An error occurred while saving test suite results for {repo_path}: {e}")
 
 def append_to_csv(filename, name_to_search, data_to_append):
-    # Read the existing data into memory
-    with open(filename, mode='r', newline='', encoding='utf-8') as file:
-        reader = csv.reader(file)
-        lines = list(reader)
-    
-    # Find the index of the row containing the name
-    header = lines[0]
-    name_index = None
-    for i, row in enumerate(lines[1:]):
-        # Step 1: Split the row by '/'
-        name = row[0].split('/')
-        print("Name: ", name)
-        if name_to_search == name[1]:
-            name_index = i + 1
-            break
-    
-    # Append data to the row if the name is found
-    if name_index is not None:
-        lines[name_index].extend(data_to_append)
-    else:
-        print(f"Name '{name_to_search}' not found in the CSV file.")
-        return
-    print("Writing new data: ", lines[name_index])
-    # Write the updated data back to the CSV file
-    with open(filename, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.writer(file, delimiter=',', quoting=csv.QUOTE_NONE, quotechar='')
-        writer.writerows(lines)
-    print("Data appended successfully.")
+    """
+    Queues `data_to_append` to be appended to the row of `name_to_search` in `filename`.
+
+    The update is an indexed insert in a SQLite table next to the CSV, so it is safe to call
+    from worker threads and costs the same however large the file is. The CSV itself is
+    rewritten every DEFAULT_EXPORT_EVERY updates, by `export_csv_updates(filename)` and when
+    the process exits.
+    """
+    csv_row_updates(filename).append(name_to_search, data_to_append)
 
 def get_test_files(directory):
     print("Directory: ", directory)
@@ -99,78 +93,161 @@ def get_test_files(directory):
                 test_files.append(os.path.join(root, file))
     return test_files
 
-def clone_repo(repo_path, repo):
+GITHUB_CLONE_URL = 'https://github.com/{repo}.git'
+
+# The pipeline only needs the working tree at HEAD, so history and blobs can be skipped
+CLONE_STRATEGIES = {
+    'full': [],
+    'shallow': ['--depth', '1'],
+    'blobless': ['--filter=blob:none'],
+    'sparse': ['--depth', '1', '--filter=blob:none', '--no-checkout'],
+    # Checked out from the shared bare mirror in MIRROR_ROOT, see mirror_cache.py
+    'mirror': None,
+}
+DEFAULT_CLONE_STRATEGY = 'shallow'
+DEFAULT_CLONE_WORKERS = 8
+
+# Non-cone sparse checkout patterns for the 'sparse' strategy: everything except large assets
+SPARSE_CHECKOUT_PATTERNS = [
+    '/*',
+    '!*.png', '!*.jpg', '!*.jpeg', '!*.gif', '!*.webp', '!*.ico', '!*.psd',
+    '!*.mp4', '!*.mov', '!*.webm', '!*.mp3', '!*.wav',
+    '!*.woff', '!*.woff2', '!*.ttf', '!*.otf', '!*.eot',
+    '!*.pdf', '!*.zip', '!*.tar.gz', '!*.tgz',
+]
+
+def clone_repo(repo_path, repo, strategy=DEFAULT_CLONE_STRATEGY, url=None):
     print(f'{repo} - clone')
-    url = f'https://github.com/{repo}.git'
+    url = url or GITHUB_CLONE_URL.format(repo=repo)
     repo_name = repo.split('/')[-1]
 
     if os.path.exists(os.path.join(repo_path, repo_name)):
         print(f'{repo_name} already exists. Skipping clone.')
         return repo_name
     try:
-        result = subprocess.run(['git', 'clone', url], cwd=repo_path, check=True, capture_output=True, text=True, timeout=GLOBAL_TIMEOUT)
+        with scheduler.admit('clone'):
+            if strategy == 'mirror':
+                checkout_from_mirror(repo, repo_path, url)
+                print(f'Checked out {repo} into {repo_name} from mirror')
+                return repo_name
+            result = subprocess.run(['git', 'clone', *CLONE_STRATEGIES[strategy], url, repo_name], cwd=repo_path, check=True, capture_output=True, text=True, timeout=GLOBAL_TIMEOUT)
+            if strategy == 'sparse':
+                full_repo_path = os.path.join(repo_path, repo_name)
+                subprocess.run(['git', 'sparse-checkout', 'set', '--no-cone', *SPARSE_CHECKOUT_PATTERNS], cwd=full_repo_path, check=True, capture_output=True, text=True, timeout=GLOBAL_TIMEOUT)
+                subprocess.run(['git', 'checkout'], cwd=full_repo_path, check=True, capture_output=True, text=True, timeout=GLOBAL_TIMEOUT)
         print(f'Successfully cloned {repo} into {repo_name}')
     except subprocess.CalledProcessError as e:
         print(f'Error cloning {repo}: {e.stderr}')
+        remove_directory(os.path.join(repo_path, repo_name))
+        return None
+    except subprocess.TimeoutExpired:
+        print(f'Timed out cloning {repo}')
+        remove_directory(os.path.join(repo_path, repo_name))
         return None
     return repo_name
 
-def install_dependencies(repo_path, idx):
+def run_parallel_clones(repos, repo_path, strategy=DEFAULT_CLONE_STRATEGY, max_workers=DEFAULT_CLONE_WORKERS):
+    """
+    Clones repositories on a dedicated, bounded pool and yields (repo, repo_name) as each
+    clone finishes. repo_name is None if the clone failed.
+
+    Kept separate from the install/test pool so network-bound clones never hold a slot
+    that npm or jest could be using.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='clone') as executor:
+        futures = {executor.submit(clone_repo, repo_path, repo['repo_name'] if isinstance(repo, dict) else repo, strategy): repo for repo in repos}
+        for future in concurrent.futures.as_completed(futures):
+            repo = futures[future]
+            try:
+                yield repo, future.result()
+            except Exception as exc:
+                print(f"Repo {repo} generated an exception while cloning: {exc}")
+                yield repo, None
+
+# Shared, content-addressed package caches used by every repo, so each tarball is downloaded once per machine
+PACKAGE_CACHE_ROOT = os.path.join(os.path.dirname(os.path.normpath(ABSOLUTE_PATH)), 'package_cache')
+NPM_CACHE_DIR = os.path.join(PACKAGE_CACHE_ROOT, 'npm')
+YARN_CACHE_DIR = os.path.join(PACKAGE_CACHE_ROOT, 'yarn')
+YARN_OFFLINE_MIRROR_DIR = os.path.join(PACKAGE_CACHE_ROOT, 'yarn-offline-mirror')
+# Resolve from the shared caches first and only go to the registry for missing packages
+PREFER_OFFLINE = True
+
+def package_manager_env(base_env=None):
+    env = dict(os.environ if base_env is None else base_env)
+    env['npm_config_cache'] = NPM_CACHE_DIR
+    env['YARN_CACHE_FOLDER'] = YARN_CACHE_DIR
+    # yarn v1 maps YARN_<KEY> variables onto its config, this sets yarn-offline-mirror
+    env['YARN_YARN_OFFLINE_MIRROR'] = YARN_OFFLINE_MIRROR_DIR
+    env['YARN_YARN_OFFLINE_MIRROR_PRUNING'] = 'false'
+    return env
+
+def package_manager_command(is_yarn_repo, args, prefer_offline=PREFER_OFFLINE):
+    command = ['yarn' if is_yarn_repo else 'npm', *args]
+    if prefer_offline:
+        command.append('--prefer-offline')
+    return command
+
+def install_dependencies(repo_path, idx, prefer_offline=PREFER_OFFLINE, use_cache=True):
     full_repo_path = os.path.join(ABSOLUTE_PATH, repo_path)
     print("Install - Dependencies -> Full_repo_path: ", full_repo_path)
     test_suite_results_path = os.path.join(full_repo_path, 'test_suite_results.txt')
-    f = open(test_suite_results_path, 'w')
-    
-    if os.path.exists(os.path.join(full_repo_path, 'yarn.lock')):
-        # Use yarn to install dependencies
-        try:
-            # Open the file in write mode
-            with open(test_suite_results_path, 'w', encoding='utf-8') as file:
-                # Start the subprocess
-                process = subprocess.Popen(['yarn', 'install'], cwd=full_repo_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                print("Running yarn command...")
-
-                # Write stdout and stderr to the file continuously
-                for line in process.stdout:
-                    file.write(str(line))
-                
-                # Optionally write stderr after stdout is finished
-                stderr_output = process.stderr.read()
-                if stderr_output:
-                    file.write("\nStandard Error:\n")
-                    file.write(stderr_output)
-            
-            print(f"Command output saved to {test_suite_results_path}")
-            return True
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            return False
-    else:
-        try:
-            # Open the file in write mode
-            with open(test_suite_results_path, 'w', encoding='utf-8') as file:
-                # Start the subprocess
-                process = subprocess.Popen(['npm', 'install'], cwd=full_repo_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                print("Running npm command...")
-                
-                # Write stdout and stderr to the file continuously
-                for line in process.stdout:
-                    file.write(line)
-                
-                # Optionally write stderr after stdout is finished
-                stderr_output = process.stderr.read()
-                if stderr_output:
-                    file.write("\nStandard Error:\n")
-                    file.write(stderr_output)
-                    return False
-            
-            print(f"Command output saved to {test_suite_results_path}")
-            return True
-        except Exception as e:
-            print(f"An error occurred: {e}")
-            return False
 
-def run_test_suite(repo_path, idx):
+    if use_cache and node_modules_up_to_date(full_repo_path):
+        # e.g. re-verifying after a migration that did not add packages
+        logging.info(f"node_modules of {repo_path} is up to date, skipping install")
+        return True
+
+    if use_cache and prepare_node_modules(full_repo_path):
+        with open(test_suite_results_path, 'w', encoding='utf-8') as file:
+            file.write("Restored node_modules from the lockfile cache\n")
+        return True
+
+    # Keyed by the manifest as checked out, before the install creates or rewrites the lockfile
+    key = manifest_key(full_repo_path)
+    is_yarn_repo = os.path.exists(os.path.join(full_repo_path, 'yarn.lock'))
+    print(f"Running {'yarn' if is_yarn_repo else 'npm'} command...")
+    try:
+        # Streams both pipes into test_suite_results.txt and kills the whole process group on timeout
+        with scheduler.admit('install'):
+            result = run_command(package_manager_command(is_yarn_repo, ['install'], prefer_offline), full_repo_path, timeout=GLOBAL_TIMEOUT, log_path=test_suite_results_path, env=package_manager_env())
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return False
+
+    print(f"Command output saved to {test_suite_results_path}")
+    logging.info(f"Install for {repo_path} exited with {result.returncode} in {result.duration:.1f}s, peak RSS {result.peak_rss_kb // 1024} MB")
+    if result.returncode != 0:
+        if result.timed_out:
+            print(f"Install timed out after {GLOBAL_TIMEOUT}s")
+        print(f"Install failed:\n{result.tail[-2000:]}")
+        return False
+
+    if use_cache:
+        store_node_modules(full_repo_path, key)
+    return True
+
+# Test runners that accept jest's --json/--outputFile flags
+JEST_RUNNERS = ('jest', 'react-scripts')
+# jest's transform cache and haste map live on tmpfs when the host has one
+JEST_CACHE_ROOT = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'jest_cache')
+
+def jest_cache_directory(repo_path):
+    return os.path.join(JEST_CACHE_ROOT, os.path.basename(os.path.normpath(repo_path)))
+
+def run_test_suite(repo_path, idx, test_files=None, find_related=False):
+    """
+    Runs the repository's test script and counts passing/failing tests and suites.
+
+    Args:
+        repo_path (str): Path of the repository, relative to ABSOLUTE_PATH or absolute.
+        idx (int): Index of the repository, used in error messages.
+        test_files (list): Only run these test files instead of the whole suite (jest runners only).
+        find_related (bool): Run the tests related to `test_files` (jest --findRelatedTests)
+            instead of exactly those files.
+
+    Returns:
+        tuple: (passing_tests, failing_tests, passing_test_suites, failing_test_suites), -1 each on error.
+    """
     full_repo_path = os.path.join(ABSOLUTE_PATH, repo_path)
     test_suite_results_path = os.path.join(full_repo_path, 'test_suite_results.txt')
     try:
@@ -184,15 +261,28 @@ def run_test_suite(repo_path, idx):
 
                 if test_package:
                     try:
-                        res = subprocess.run([test_package, 'test'], cwd=full_repo_path, capture_output=True, check=False, text=True, timeout=GLOBAL_TIMEOUT) 
-                        # print(f'Result from testing: {res}')
-                        save_test_suite_results(repo_path, test_suite_results_path, res)
-                        print("Here_01")
-                        
-                        passing_tests, failing_tests = verify_test_suite_results(res, "Tests:")
-                        print("Here_02")
-                        passing_test_suites, failing_test_suites = verify_test_suite_results(res, "Test Suites:")
-                        print("Here_03")
+                        command = [test_package, 'test']
+                        report_path = os.path.join(full_repo_path, JEST_OUTPUT_FILE)
+                        if os.path.exists(report_path):
+                            os.remove(report_path)
+                        if test_package in JEST_RUNNERS:
+                            # Have jest write its JSON report instead of scraping the console summary;
+                            # its transform cache is kept on tmpfs until the verification ends
+                            command += ['--json', f'--outputFile={report_path}', f'--cacheDirectory={jest_cache_directory(full_repo_path)}']
+                            if test_files:
+                                if test_package == 'jest':
+                                    # A bare `jest test` treats 'test' as a path pattern
+                                    command.remove('test')
+                                command += ['--findRelatedTests' if find_related else '--runTestsByPath', *test_files]
+                        with scheduler.admit('test'):
+                            res = subprocess.run(command, cwd=full_repo_path, capture_output=True, check=False, text=True, timeout=GLOBAL_TIMEOUT) 
+                        save_test_suite_results(repo_path, test_suite_results_path, res.stdout + res.stderr)
+
+                        report = parse_jest_json(report_path)
+                        if report is not None:
+                            passing_tests, failing_tests, passing_test_suites, failing_test_suites = report.counts()
+                        else:
+                            passing_tests, failing_tests, passing_test_suites, failing_test_suites = parse_jest_summary(res.stdout + res.stderr)
                         print(f'Successfully ran test in {repo_path}. {passing_tests} passed and {failing_tests} failed.')
                         print(f'Successfully ran test suite in {repo_path}. {passing_test_suites} passed and {failing_test_suites} failed.')
                         return (passing_tests, failing_tests, passing_test_suites, failing_test_suites)
@@ -210,78 +300,104 @@ def run_test_suite(repo_path, idx):
         return (-1,-1,-1,-1)
 
 def verify_test_suite_results(output, str_to_match):
-    print("Verifying test_suite_results: ", output)
-    text = str(output)
-    print("after text to str")
-    lines = text.strip().split("\\n")
-
-    # Find the line starting with str_to_match
-    tests_line = None
-    for line in lines:
-        if line.strip().startswith(str_to_match):
-            tests_line = line
-            break
-
-    if tests_line == None:
-        return (-1,-1)
-    # Regular expressions to extract numbers
-    total_tests_pattern = r'(\d+) total'
-    passed_tests_pattern = r'(\d+) passed'
-    skipped_tests_pattern = r'(\d+) skipped'
-    failed_tests_pattern = r'(\d+) failed'
-
-    # Extracting the numbers using regular expressions
-    total_tests = int(found_match(total_tests_pattern, tests_line))
-    passing_tests = int(found_match(passed_tests_pattern, tests_line))
-    skipped_tests = int(found_match(skipped_tests_pattern, tests_line))
-    failing_tests = int(found_match(failed_tests_pattern, tests_line))
-
-    # Output the results
-    print(f"Number of tests that passed: {passing_tests}")
-    print(f"Number of tests that failed: {failing_tests}")
-    return (passing_tests, failing_tests)
-
-def found_match(pattern, text):
-    match = re.search(pattern, text)
-    print("FOUND MATCH: ", match)
-    if match:
-        return match.group(1)
-    return 0
-
-def verify_tests_can_run(repo_path, repo, idx, file_path_to_update, file_path_to_update_failures=None, should_write_to_file=True, is_post_migration=False, files_migrated=-1, should_clone = True):
-    repo_name = repo
-    if should_clone:
-        repo_name = clone_repo(repo_path, repo['repo_name'])    
-
-    if not repo_name:
-        logging.error(f"Failed to clone repository {repo}")
-        if should_write_to_file and file_path_to_update_failures is not None:
-            write_failure(repo, file_path_to_update_failures)
-        return
-
-    repo_path = os.path.join(repo_path, repo_name)
+    """
+    Extracts passed/failed counts from jest's console summary. `run_test_suite` reads the
+    JSON report instead and only falls back to this for runners that do not write one.
+
+    Args:
+        output (subprocess.CompletedProcess | str): Output of the test run.
+        str_to_match (str): 'Tests:' or 'Test Suites:'.
+
+    Returns:
+        tuple: (passed, failed), or (-1, -1) if the summary line is missing.
+    """
+    if isinstance(output, subprocess.CompletedProcess):
+        text = (output.stdout or '') + (output.stderr or '')
+    else:
+        text = str(output)
+    return parse_summary_line(text, str_to_match)
+
+def install_and_test(repo, repo_path, idx, test_files=None):
+    """
+    Returns:
+        tuple: (status, counts, duration) where status is one of the results_store STATUS_*
+            values and counts is (passing_tests, failing_tests, passing_test_suites, failing_test_suites).
+    """
     if not install_dependencies(repo_path, idx):
         logging.error(f"Failed to install dependencies for {repo}")
-        if should_write_to_file and file_path_to_update_failures is not None:
-            write_failure(repo, file_path_to_update_failures)
-        return
+        return STATUS_INSTALL_FAILED, None, None
 
     try:
-        passing_tests, failing_tests, passing_test_suites, failing_test_suites = run_test_suite(repo_path, idx)
+        start = time.monotonic()
+        counts = run_test_suite(repo_path, idx, test_files)
+        duration = time.monotonic() - start
     except Exception as e:
         logging.error(f"An error occurred while running the test suite for {repo}: {e}")
-        if should_write_to_file and file_path_to_update_failures is not None:
-            write_failure(repo, file_path_to_update_failures)
-        return
+        return STATUS_TEST_ERROR, None, None
 
     logging.info(f"Test suite completed for {repo}")
 
-    if passing_tests == -1:
+    if counts[0] == -1:
         logging.warning(f"No passing tests for {repo}")
+        return STATUS_NO_TESTS, None, duration
+    return STATUS_COMPLETED, counts, duration
+
+def verify_tests_can_run(repo_path, repo, idx, file_path_to_update, file_path_to_update_failures=None, should_write_to_file=True, is_post_migration=False, files_migrated=-1, should_clone = True, clone_strategy=DEFAULT_CLONE_STRATEGY, results_store=None, run_id=None, test_files=None, baseline_run=None, scratch=None):
+    """
+    Clones (optionally), installs and tests a repository, then records the results.
+
+    Passing `test_files` verifies incrementally: only those files are run, and when
+    `baseline_run` is given the other files keep their results from that run in the
+    results store, so the counts still cover the whole suite.
+    `scratch` (a ScratchSpace) stages the repository on fast scratch storage for the install
+    and test run.
+    """
+    repo_name = repo['repo_name'].split('/')[-1] if isinstance(repo, dict) else repo
+    result_name, full_repo_path = repo_name, None
+    if should_clone:
+        repo_name = clone_repo(repo_path, repo['repo_name'], clone_strategy)    
+
+    def record_result(status, counts=None, report=None, duration=None):
+        if results_store is not None and run_id is not None:
+            results_store.record_repo_result(run_id, result_name, status, counts, files_migrated, report, full_repo_path, duration)
+
+    if not repo_name:
+        logging.error(f"Failed to clone repository {repo}")
+        record_result(STATUS_CLONE_FAILED)
+        if should_write_to_file and file_path_to_update_failures is not None:
+            write_failure(repo, file_path_to_update_failures)
+        return
+
+    repo_path = os.path.join(repo_path, repo_name)
+    # Installs and test runs happen on the scratch copy when a scratch space is given
+    staging = scratch.stage(os.path.join(ABSOLUTE_PATH, repo_path)) if scratch is not None else contextlib.nullcontext(repo_path)
+    persistent_repo_path = os.path.join(ABSOLUTE_PATH, repo_path)
+    with staging as repo_path:
+        full_repo_path = os.path.join(ABSOLUTE_PATH, repo_path)
+        if test_files and full_repo_path != persistent_repo_path:
+            test_files = [os.path.join(full_repo_path, os.path.relpath(file, persistent_repo_path)) if os.path.isabs(file) else file for file in test_files]
+        try:
+            status, counts, duration = install_and_test(repo, repo_path, idx, test_files)
+            report = parse_jest_json(os.path.join(full_repo_path, JEST_OUTPUT_FILE)) if status == STATUS_COMPLETED else None
+        finally:
+            # One directory per repo on RAM-backed tmpfs; a long run would otherwise fill it
+            shutil.rmtree(jest_cache_directory(full_repo_path), ignore_errors=True)
+
+    if status != STATUS_COMPLETED:
+        record_result(status, duration=duration)
         if should_write_to_file and file_path_to_update_failures is not None:
             write_failure(repo, file_path_to_update_failures)
         return
 
+    passing_tests, failing_tests, passing_test_suites, failing_test_suites = counts
+    if report is not None and test_files and results_store is not None and baseline_run is not None:
+        baseline = results_store.load_report(baseline_run, result_name)
+        if baseline is not None:
+            report = merge_reports(with_relative_paths(report, full_repo_path), baseline)
+            passing_tests, failing_tests, passing_test_suites, failing_test_suites = report.counts()
+            logging.info(f"Merged {len(test_files)} re-run test files of {repo} with baseline run {baseline_run}")
+    record_result(STATUS_COMPLETED, (passing_tests, failing_tests, passing_test_suites, failing_test_suites), report, duration)
+
     if should_write_to_file:
         data_to_append = [
             str(passing_tests), str(failing_tests),
@@ -344,23 +460,68 @@ def read_names_from_csv(file_path):
     except Exception as e:
         print(f"An error occurred: {e}")
 
+def parse_shard(shard):
+    # '2/8' -> (2, 8): this machine handles shard 2 of 8 (shards are numbered from 0)
+    index, count = (int(part) for part in shard.split('/'))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{shard}', expected i/N with 0 <= i < N")
+    return index, count
+
+def in_shard(name, shard):
+    if shard is None:
+        return True
+    index, count = shard
+    # crc32 rather than hash() so that every machine assigns a repo to the same shard
+    return zlib.crc32(name.encode('utf-8')) % count == index
+
+def iter_names_from_csv(file_path, shard=None, done=None, default_branches=None, branch_column='defaultBranch'):
+    """
+    Lazily yields repository names from the SEART CSV.
+
+    Args:
+        file_path (str): Path to the CSV file.
+        shard (tuple): Optional (index, count); only names in this shard are yielded.
+        done (container): Optional names to skip, e.g. a Checkpoint of finished repos.
+        default_branches (dict): Optional dict filled with name -> default branch as rows are read.
+        branch_column (str): Column holding the default branch.
+    """
+    with open(file_path, mode='r', newline='', encoding='utf-8') as csvfile:
+        csv_reader = csv.DictReader(csvfile)
+        if 'name' not in csv_reader.fieldnames:
+            print(f"'name' column not found in {file_path}")
+            return
+        has_branch_column = branch_column in csv_reader.fieldnames
+
+        for row in csv_reader:
+            name = row['name']
+            if not in_shard(name, shard):
+                continue
+            if done is not None and name in done:
+                continue
+            if default_branches is not None and has_branch_column and row[branch_column]:
+                default_branches[name] = row[branch_column]
+            yield name
+
 def find_all_matching_strings(dependencies, dev_dependencies, string_list):
     dependencies_result = {s for s in string_list if s in dependencies}
     dev_dependencies_result = {s for s in string_list if s in dev_dependencies}
     return dependencies_result.union(dev_dependencies_result)
 
 def increment_nested_counter(nested_counter, UI_test_framework, unit_test_library, ui_framework, test_framework=None, unit_library=None):
-    print("Increment the counter: ", nested_counter, test_framework, unit_library)
+    if isinstance(nested_counter, FrameworkTally):
+        nested_counter.increment(ui_framework, test_framework, unit_library)
+        return
+
+    # Legacy {framework: Counter()} dictionary. Not safe to share between threads, use a FrameworkTally instead.
     if ui_framework in nested_counter:
-        print("Increment the framework: ", ui_framework)
         if test_framework in UI_test_framework:
             nested_counter[ui_framework][test_framework] += 1
         if unit_library in unit_test_library:
             nested_counter[ui_framework][unit_library] += 1
     else:
-        print(f"{ui_framework} is not in the list of UI frameworks.")
+        logging.debug(f"{ui_framework} is not in the list of UI frameworks.")
 
-def check_package_in_repo(repo, nested_counter, UI_framework, UI_test_framework, unit_test_library, branch='master'):
+def check_package_in_repo(repo, nested_counter, UI_framework, UI_test_framework, unit_test_library, branch='master', sink=None):
     url = f'https://raw.githubusercontent.com/{repo}/{branch}/package.json'
     response = requests.get(url)
     
@@ -377,6 +538,9 @@ def check_package_in_repo(repo, nested_counter, UI_framework, UI_test_framework,
         print(f"Error decoding JSON for {repo}")
         return False
 
+    return classify_package_json(repo, package_json, nested_counter, UI_framework, UI_test_framework, unit_test_library, sink)
+
+def classify_package_json(repo, package_json, nested_counter, UI_framework, UI_test_framework, unit_test_library, sink=None):
     dependencies = package_json.get('dependencies', {})
     dev_dependencies = package_json.get('devDependencies', {})
 
@@ -399,7 +563,6 @@ def check_package_in_repo(repo, nested_counter, UI_framework, UI_test_framework,
 
             # Iterate through every combination of test_frameworks and unit_test_libraries
             for test_framework, unit_library in product(test_frameworks, unit_test_libraries):
-                print("Updating counter")
                 increment_nested_counter(nested_counter, UI_test_framework, unit_test_library, package_name, test_framework, unit_library)
 
             if not test_frameworks:
@@ -408,6 +571,11 @@ def check_package_in_repo(repo, nested_counter, UI_framework, UI_test_framework,
 
             ui_repo_path = os.path.join(SEART_FILTERED_REPOS, repo_name, 'repos.txt')
 
+            if sink is not None:
+                # Hand the row to the single writer instead of opening the file from this worker
+                sink.write(ui_repo_path, f"{repo},{test_frameworks},{unit_test_libraries}")
+                return True
+
             try:
                 with open(ui_repo_path, mode='a', encoding='utf-8') as file:
                     file.write(f"{repo},{test_frameworks},{unit_test_libraries}\n")
@@ -418,20 +586,32 @@ def check_package_in_repo(repo, nested_counter, UI_framework, UI_test_framework,
     return False
 
 
-def run_parallel_package_checks(repos, nested_counter, UI_framework, UI_test_framework, unit_test_library, branch='master'):
+def run_parallel_package_checks(repos, nested_counter, UI_framework, UI_test_framework, unit_test_library, branch='master', sink=None):
     with concurrent.futures.ThreadPoolExecutor(max_workers=None) as executor:
-        futures = {executor.submit(check_package_in_repo, repo, nested_counter, UI_framework, UI_test_framework, unit_test_library, branch): repo for repo in repos}
+        futures = {executor.submit(check_package_in_repo, repo, nested_counter, UI_framework, UI_test_framework, unit_test_library, branch, sink): repo for repo in repos}
         for future in concurrent.futures.as_completed(futures):
             repo = futures[future]
             try:
-                future.result(timeout=GLOBAL_TIMEOUT)
+                record_checked(nested_counter, future.result(timeout=GLOBAL_TIMEOUT))
             except Exception as exc:
                 print(f"Repo {repo} generated an exception: {exc}")
 
-def run_parallel_verifications(repos, file_to_update, failure_file_to_update):
-    with concurrent.futures.ThreadPoolExecutor(max_workers=30) as executor:
-        futures = {
-            executor.submit(
+# Threads are cheap while they wait for admission; the scheduler decides how many installs and test runs actually execute
+VERIFICATION_WORKERS = 64
+
+def run_parallel_verifications(repos, file_to_update, failure_file_to_update, clone_strategy=DEFAULT_CLONE_STRATEGY, clone_workers=DEFAULT_CLONE_WORKERS, results_store=None, run_id=None, scratch=None, prune_workspaces=False, workspace_budget_bytes=DEFAULT_WORKSPACE_BUDGET_BYTES):
+    # Keeps the artifacts of each finished repo and prunes its node_modules and clone in the background.
+    # Off for library callers because the migration scripts work on the ABSOLUTE_PATH clones (and their
+    # test_suite_results.txt) in place afterwards; setup_and_test_repos turns it on unless --keep-workspaces is given.
+    retention = RetentionManager(workspace_budget_bytes) if prune_workspaces else None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=VERIFICATION_WORKERS) as executor:
+        futures = {}
+        # Clones run on their own bounded pool; each repo is handed to the install/test pool as soon as it is on disk
+        for idx, (repo, repo_name) in enumerate(run_parallel_clones(repos, ABSOLUTE_PATH, clone_strategy, clone_workers)):
+            if not repo_name:
+                logging.error(f"Failed to clone repository {repo}")
+                continue
+            futures[executor.submit(
                 verify_tests_can_run,
                 ABSOLUTE_PATH,
                 repo,
@@ -439,9 +619,13 @@ def run_parallel_verifications(repos, file_to_update, failure_file_to_update):
                 file_to_update,
                 failure_file_to_update,
                 False,
-                False
-            ): repo for idx, repo in enumerate(repos)
-        }
+                False,
+                -1,
+                False,
+                results_store=results_store,
+                run_id=run_id,
+                scratch=scratch
+            )] = repo
         for future in concurrent.futures.as_completed(futures):
             repo = futures[future]
             repo_name = repo['repo_name'].split('/')[-1]
@@ -454,7 +638,7 @@ def run_parallel_verifications(repos, file_to_update, failure_file_to_update):
                 print(f"Repo {repo} generated an exception: {exc}")
             finally:
                 # Clean up the directory regardless of success or failure
-                print("Removing directory...")
-                # remove_directory(path)
-
-
+                if retention is not None:
+                    retention.release(path, scratch.detach(path) if scratch is not None else None)
+    if retention is not None:
+        retention.close()
\ No newline at end of file
@@ -0,0 +1,145 @@
+import errno
+import fcntl
+import logging
+import os
+import shutil
+import time
+
+from ..constants import *
+
+SNAPSHOT_ROOT = os.path.join(os.path.dirname(os.path.normpath(ABSOLUTE_PATH)), 'snapshots')
+
+# ioctl request code for FICLONE (reflink the whole file) on Linux
+FICLONE = 0x40049409
+
+logger = logging.getLogger(__name__)
+
+
+def reflink_or_copy(src, dst):
+    """
+    Copies a file as a reflink (copy-on-write clone) when the filesystem supports it,
+    otherwise falls back to a regular copy.
+    """
+    try:
+        with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        shutil.copystat(src, dst)
+    except OSError as e:
+        if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.EBADF):
+            raise
+        shutil.copy2(src, dst)
+
+
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        reflink_or_copy(src, dst)
+
+
+def is_hardlink_path(relative_path):
+    return relative_path.startswith(os.path.join('.git', 'objects') + os.sep)
+
+
+def clone_tree(src, dst):
+    """
+    Recreates `src` at `dst`: files under .git/objects are hardlinked, every other file
+    (node_modules included) is reflinked or copied, and symlinks are preserved as symlinks.
+    """
+    for root, dirs, files in os.walk(src):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=True)
+
+        for name in dirs + files:
+            src_path = os.path.join(root, name)
+            dst_path = os.path.join(target_root, name)
+            # git never rewrites an object file, so those can share inodes. node_modules cannot:
+            # package managers, postinstall scripts and .cache directories write into it in place
+            if os.path.islink(src_path):
+                os.symlink(os.readlink(src_path), dst_path)
+                if name in dirs:
+                    dirs.remove(name)
+            elif name in files:
+                if is_hardlink_path(os.path.relpath(src_path, src)):
+                    link_or_copy(src_path, dst_path)
+                else:
+                    reflink_or_copy(src_path, dst_path)
+        shutil.copystat(root, target_root)
+
+
+def snapshot_dir(repo_name, snapshot_root=SNAPSHOT_ROOT):
+    return os.path.join(snapshot_root, repo_name)
+
+
+def list_snapshots(repo_name, snapshot_root=SNAPSHOT_ROOT):
+    """
+    Returns the labels of a repository's snapshots, oldest first by capture time.
+    """
+    path = snapshot_dir(repo_name, snapshot_root)
+    if not os.path.isdir(path):
+        return []
+    labels = [label for label in os.listdir(path) if not label.endswith('.tmp')]
+    return sorted(labels, key=lambda label: (os.path.getmtime(os.path.join(path, label)), label))
+
+
+def capture_snapshot(repo_path, label=None, snapshot_root=SNAPSHOT_ROOT):
+    """
+    Captures the current state of a repository, including node_modules.
+
+    Args:
+        repo_path (str): Path of the repository to capture.
+        label (str): Name of the snapshot, defaults to the current timestamp.
+        snapshot_root (str): Directory holding all snapshots.
+
+    Returns:
+        str: The label of the snapshot.
+    """
+    repo_name = os.path.basename(os.path.normpath(repo_path))
+    label = label or time.strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(snapshot_dir(repo_name, snapshot_root), label)
+    if os.path.exists(path):
+        raise FileExistsError(f"Snapshot '{label}' already exists for {repo_name}")
+
+    tmp_path = path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    start = time.monotonic()
+    clone_tree(repo_path, tmp_path)
+    # clone_tree copies the repository's mtime; stamp the capture time, which list_snapshots sorts by
+    os.utime(tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"Captured snapshot '{label}' of {repo_name} in {time.monotonic() - start:.2f}s")
+    return label
+
+
+def restore_snapshot(repo_path, label=None, snapshot_root=SNAPSHOT_ROOT):
+    """
+    Replaces a repository with one of its snapshots, by default the one captured last
+    (whatever its label). Files are reflinked or copied out of the snapshot, so writes to
+    the restored repository, node_modules included, never reach the snapshot.
+
+    Returns:
+        str: The label of the restored snapshot.
+    """
+    repo_name = os.path.basename(os.path.normpath(repo_path))
+    labels = list_snapshots(repo_name, snapshot_root)
+    if not labels:
+        raise FileNotFoundError(f"No snapshots found for {repo_name}")
+    label = label or labels[-1]
+    path = os.path.join(snapshot_dir(repo_name, snapshot_root), label)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"Snapshot '{label}' not found for {repo_name}")
+
+    start = time.monotonic()
+    # Build the restored tree next to the repository, then swap it in
+    restore_path = os.path.normpath(repo_path) + '.restore'
+    shutil.rmtree(restore_path, ignore_errors=True)
+    clone_tree(path, restore_path)
+    if os.path.exists(repo_path):
+        shutil.rmtree(repo_path)
+    os.replace(restore_path, repo_path)
+    logger.info(f"Restored snapshot '{label}' of {repo_name} in {time.monotonic() - start:.2f}s")
+    return label
+
+
+def remove_snapshot(repo_name, label, snapshot_root=SNAPSHOT_ROOT):
+    shutil.rmtree(os.path.join(snapshot_dir(repo_name, snapshot_root), label), ignore_errors=True)
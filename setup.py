@@ -35,6 +35,12 @@ setuptools.setup(
         'inference': [
             'openai',     
         ],
+        'collect': [
+            'httpx[http2]',
+        ],
+        'results': [
+            'pyarrow',
+        ],
     },
     include_package_data=True,
 )
\ No newline at end of file
@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+import types
+
+# JavaScriptTestMigration/constants.py holds machine-specific paths and keys and is not checked in.
+# Without one, point the paths the tests can touch at a scratch directory.
+try:
+    import JavaScriptTestMigration.constants
+except ImportError:
+    root = tempfile.mkdtemp(prefix='jstm-tests-')
+    constants = types.ModuleType('JavaScriptTestMigration.constants')
+    constants.ABSOLUTE_PATH = os.path.join(root, 'repos') + os.sep
+    constants.ABSOLUTE_PATH_MIGRATION = os.path.join(root, 'migration') + os.sep
+    constants.ABSOLUTE_PATH_NAIVE_COPY = os.path.join(root, 'naive_copy') + os.sep
+    constants.SEART_FILTERED_REPOS = os.path.join(root, 'filtered')
+    constants.SEART_REPOS = os.path.join(root, 'JavascriptRepos.csv')
+    constants.GLOBAL_TIMEOUT = 60
+    constants.OPENAI_API_KEY = 'sk-test'
+    sys.modules['JavaScriptTestMigration.constants'] = constants
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import time
+
+import pytest
+
+from JavaScriptTestMigration.scripts.stub_package_server import StubPackageHandler, start_stub_server
+from JavaScriptTestMigration.utils.async_package_checks import PROBE_HEDGE_DELAY, RateLimiter, create_http_client, fetch_first_package_json, run_async_package_checks
+from JavaScriptTestMigration.utils.branch_resolver import BranchResolver
+from JavaScriptTestMigration.utils.framework_tally import FrameworkTally
+from JavaScriptTestMigration.utils.manifest_cache import ManifestCache
+from JavaScriptTestMigration.utils.utils import iter_names_from_csv
+
+MANIFEST = {'dependencies': {'react': '18.0.0'}, 'devDependencies': {'enzyme': '3.0.0', 'jest': '29.0.0'}}
+
+
+class ListSink:
+    def __init__(self):
+        self.rows = []
+
+    def write(self, path, line):
+        self.rows.append(line)
+
+
+def add_manifest(root, repo, branch, manifest=MANIFEST):
+    directory = os.path.join(root, repo, branch)
+    os.makedirs(directory)
+    with open(os.path.join(directory, 'package.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+
+@pytest.fixture
+def stub_server(tmp_path):
+    root = tmp_path / 'raw'
+    root.mkdir()
+    server, base_url = start_stub_server(str(root))
+    yield str(root), base_url
+    server.shutdown()
+    server.server_close()
+
+
+def run_checks(repos, base_url, resolver):
+    tally = FrameworkTally(['react'], ['enzyme'], ['jest'])
+    sink = ListSink()
+    matched = run_async_package_checks(repos, tally, ['react'], ['enzyme'], ['jest'], max_concurrency=2,
+                                       requests_per_second=None, base_url=base_url, resolver=resolver, sink=sink)
+    return matched, sink.rows
+
+
+def test_csv_default_branch_is_used(stub_server, tmp_path):
+    root, base_url = stub_server
+    add_manifest(root, 'owner/on-dev', 'dev')
+    add_manifest(root, 'owner/on-main', 'main')
+    csv_path = tmp_path / 'repos.csv'
+    csv_path.write_text('name,defaultBranch\nowner/on-dev,dev\nowner/on-main,\n', encoding='utf-8')
+
+    # As in collect_valid_repos: the dict is still empty when the resolver is created
+    default_branches = {}
+    repos = iter_names_from_csv(str(csv_path), default_branches=default_branches)
+    resolver = BranchResolver(memo_path=None, csv_branches=default_branches, token='')
+    matched, rows = run_checks(repos, base_url, resolver)
+
+    assert matched == 2
+    assert sorted(row.split(',')[0] for row in rows) == ['owner/on-dev', 'owner/on-main']
+    assert resolver.known_branch('owner/on-dev') == 'dev'
+
+
+@pytest.fixture
+def requested_paths(monkeypatch):
+    paths = []
+    do_GET = StubPackageHandler.do_GET
+
+    def recording_do_GET(self):
+        paths.append(self.path)
+        if '/slow/' in self.path:
+            time.sleep(1)
+        do_GET(self)
+
+    monkeypatch.setattr(StubPackageHandler, 'do_GET', recording_do_GET)
+    return paths
+
+
+def fetch_first(base_url, repo, branches, cache=None, hedge_delay=PROBE_HEDGE_DELAY):
+    async def fetch():
+        async with create_http_client(4) as client:
+            return await fetch_first_package_json(client, RateLimiter(None), repo, branches, base_url, cache, hedge_delay)
+    return asyncio.run(fetch())
+
+
+def test_probing_falls_back_only_when_needed(stub_server, requested_paths):
+    root, base_url = stub_server
+    add_manifest(root, 'owner/both', 'main')
+    add_manifest(root, 'owner/both', 'master')
+    add_manifest(root, 'owner/legacy', 'master')
+
+    # The first candidate answers well within the hedge delay, so the second is never requested
+    assert fetch_first(base_url, 'owner/both', ['main', 'master']) == ('main', MANIFEST)
+    assert requested_paths == ['/owner/both/main/package.json']
+
+    # A 404 moves on to the next candidate at once
+    requested_paths.clear()
+    assert fetch_first(base_url, 'owner/legacy', ['main', 'master']) == ('master', MANIFEST)
+    assert requested_paths == ['/owner/legacy/main/package.json', '/owner/legacy/master/package.json']
+
+    assert fetch_first(base_url, 'owner/missing', ['main', 'master']) == (None, None)
+
+
+def test_slow_candidate_is_hedged_and_only_the_winner_cached(stub_server, requested_paths, tmp_path):
+    root, base_url = stub_server
+    add_manifest(root, 'owner/repo', 'slow')
+    add_manifest(root, 'owner/repo', 'master')
+
+    with ManifestCache(str(tmp_path / 'manifests.sqlite')) as cache:
+        start = time.monotonic()
+        assert fetch_first(base_url, 'owner/repo', ['slow', 'master'], cache, hedge_delay=0.2) == ('master', MANIFEST)
+        assert time.monotonic() - start < 0.9
+        assert sorted(requested_paths) == ['/owner/repo/master/package.json', '/owner/repo/slow/package.json']
+        assert [branch for _, branch, _ in cache.iter_manifests()] == ['master']
+
+
+def test_resolver_tries_the_most_common_default_branch_first():
+    resolver = BranchResolver(memo_path=None, token='')
+    assert resolver.candidates('owner/new') == ['main', 'master']
+    resolver.record('owner/a', 'master')
+    resolver.record('owner/b', 'master')
+    resolver.record('owner/c', 'main')
+    assert resolver.candidates('owner/new') == ['master', 'main']
+    # Re-recording a repository moves its count instead of adding to it
+    resolver.record('owner/a', 'main')
+    resolver.record('owner/b', 'main')
+    assert resolver.candidates('owner/new') == ['main', 'master']
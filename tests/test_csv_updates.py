@@ -0,0 +1,81 @@
+import csv
+import threading
+
+from JavaScriptTestMigration.utils.csv_updates import CsvRowUpdates
+
+
+def write_csv(path, names):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write('name,stars\n')
+        for name in names:
+            f.write(f'{name},1\n')
+
+
+def read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return {row[0]: row[1:] for row in list(csv.reader(f))[1:]}
+
+
+def test_every_append_is_applied_in_order(tmp_path):
+    path = tmp_path / 'results.csv'
+    write_csv(path, ['owner/a', 'owner/b'])
+    updates = CsvRowUpdates(str(path), export_every=None)
+    updates.append('a', ['1', '2'])
+    updates.append('b', ['3'])
+    updates.append('a', ['4'])
+    updates.append('missing', ['5'])
+
+    assert updates.export() == 3
+    assert read_rows(path) == {'owner/a': ['1', '1', '2', '4'], 'owner/b': ['1', '3']}
+    # Applied and unmatched updates are both gone, so a second export changes nothing
+    assert updates.pending() == []
+    assert updates.export() == 0
+    updates.close()
+
+
+def test_periodic_export_matches_a_single_export(tmp_path):
+    names = [f'owner/r{i}' for i in range(5)]
+    periodic_path, single_path = tmp_path / 'periodic.csv', tmp_path / 'single.csv'
+    write_csv(periodic_path, names)
+    write_csv(single_path, names)
+    periodic = CsvRowUpdates(str(periodic_path), export_every=3)
+    single = CsvRowUpdates(str(single_path), export_every=None)
+
+    for i in range(7):
+        for updates in (periodic, single):
+            updates.append(f'r{i % 5}', [str(i)])
+        if i == 2:
+            # The third append exported; the file reflects it before the run ends
+            assert read_rows(periodic_path)['owner/r2'] == ['1', '2']
+            assert periodic.pending() == []
+    assert periodic.pending() == [('r1', ['6'])]
+
+    periodic.export()
+    single.export()
+    assert read_rows(periodic_path) == read_rows(single_path)
+    assert read_rows(periodic_path)['owner/r0'] == ['1', '0', '5']
+    periodic.close()
+    single.close()
+
+
+def test_concurrent_appends_are_not_lost(tmp_path):
+    path = tmp_path / 'results.csv'
+    write_csv(path, [f'owner/r{i}' for i in range(20)])
+    updates = CsvRowUpdates(str(path), export_every=7)
+
+    def worker(offset):
+        for i in range(offset, 200, 10):
+            updates.append(f'r{i % 20}', [str(i)])
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    updates.export()
+
+    rows = read_rows(path)
+    assert sum(len(cells) - 1 for cells in rows.values()) == 200
+    for i in range(20):
+        assert sorted(int(cell) for cell in rows[f'owner/r{i}'][1:]) == list(range(i, 200, 20))
+    updates.close()
@@ -0,0 +1,73 @@
+from JavaScriptTestMigration.utils.import_diff import added_packages, import_specifiers, imported_packages, package_name
+
+
+def test_static_dynamic_and_require_imports():
+    source = """import React from 'react';
+import {
+  render,
+  screen,
+} from '@testing-library/react/pure';
+import '@testing-library/jest-dom';
+import type { Props } from "prop-types";
+export * from 'redux';
+const sinon = require('sinon');
+const lazy = () => import('react-dom/server');
+jest.mock('axios', () => ({ ...jest.requireActual('axios') }));
+"""
+    assert import_specifiers(source) == [
+        'react', '@testing-library/react/pure', '@testing-library/jest-dom', 'prop-types', 'redux',
+        'sinon', 'react-dom/server', 'axios',
+    ]
+
+
+def test_package_names():
+    assert package_name('lodash/fp') == 'lodash'
+    assert package_name('@testing-library/react/pure') == '@testing-library/react'
+    assert package_name('./Button') is None
+    assert package_name('../Button') is None
+    assert package_name('/abs/path') is None
+    assert package_name('fs') is None
+    assert package_name('node:path') is None
+    assert package_name('@/components/Alias') is None
+    assert package_name('style-loader!css-loader!./x.css') is None
+
+
+def test_comments_are_ignored():
+    source = """x(); // import foo from 'commented'
+/* import bar from 'blocked' */
+// const baz = require('line');
+import real from 'real';
+"""
+    assert imported_packages(source) == {'real'}
+
+
+def test_strings_and_templates_are_ignored():
+    source = """it('should export rows from "db"', () => {});
+const message = "import x from 'quoted'";
+const template = `require('templated') ${value}`;
+const url = 'http://example.com'; import after from 'after';
+"""
+    assert imported_packages(source) == {'after'}
+
+
+def test_regular_expressions_and_division():
+    source = """const pattern = /from 'regex'/;
+const ratio = width / height; import lib from 'lib';
+const quote = /'/.test(value);
+import other from 'other';
+"""
+    assert imported_packages(source) == {'lib', 'other'}
+
+
+def test_added_packages():
+    before = """import React from 'react';
+import { shallow } from 'enzyme';
+import Button from '../Button';
+"""
+    after = """import React from 'react';
+import { render, screen } from '@testing-library/react';
+import userEvent from '@testing-library/user-event';
+import Button from '../Button';
+// import { shallow } from 'enzyme';
+"""
+    assert added_packages(before, after) == {'@testing-library/react', '@testing-library/user-event'}
@@ -0,0 +1,77 @@
+import pytest
+
+from openai import OpenAI
+
+from JavaScriptTestMigration.scripts import migrate_test_files
+from JavaScriptTestMigration.scripts.mock_openai_server import start_mock_server
+from JavaScriptTestMigration.utils import llm_batch
+from JavaScriptTestMigration.utils.llm_batch import BatchJob
+
+REPLY = "import { render } from '@testing-library/react';"
+
+
+@pytest.fixture
+def mock_client():
+    server, base_url = start_mock_server(reply=REPLY, batch_delay=0.1)
+    yield OpenAI(base_url=base_url, api_key='sk-test', max_retries=0)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def migration_root(tmp_path, monkeypatch):
+    root = tmp_path / 'migration'
+    for name in ('app', 'lib'):
+        (root / name / 'src').mkdir(parents=True)
+        for i in range(2):
+            (root / name / 'src' / f'c{i}.test.js').write_text(f"import {{ shallow }} from 'enzyme'; // {name} {i}", encoding='utf-8')
+    monkeypatch.setattr(migrate_test_files, 'ABSOLUTE_PATH_MIGRATION', str(root))
+    return root
+
+
+def test_duplicate_repo_names_are_queued_once(migration_root, tmp_path):
+    job = BatchJob('sweep', root=str(tmp_path / 'batches'))
+    repos = [{'repo_name': 'alice/app'}, {'repo_name': 'bob/app'}, {'repo_name': 'alice/lib'}, {'repo_name': 'alice/lib'}]
+
+    assert migrate_test_files.queue_batch_migration(repos, job) == 4
+    assert sorted(job.state['requests']) == ['alice__app-0', 'alice__app-1', 'alice__lib-0', 'alice__lib-1']
+
+
+def test_interrupted_submit_and_apply_resume(migration_root, tmp_path, mock_client, monkeypatch):
+    monkeypatch.setattr(llm_batch, 'MAX_REQUESTS_PER_BATCH', 1)
+    batch_root = str(tmp_path / 'batches')
+    repos = [{'repo_name': 'alice/app'}, {'repo_name': 'bob/lib'}]
+
+    create_batch = mock_client.batches.create
+    calls = []
+
+    def create_then_fail(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 3:
+            raise ConnectionError('network down')
+        return create_batch(**kwargs)
+
+    monkeypatch.setattr(mock_client.batches, 'create', create_then_fail)
+    job = BatchJob('sweep', root=batch_root, client=mock_client)
+    migrate_test_files.queue_batch_migration(repos, job)
+    with pytest.raises(ConnectionError):
+        job.submit()
+    assert len(job.state['batches']) == 2
+
+    # A new process picks the job up from its state file and creates only the missing batches
+    job = BatchJob('sweep', root=batch_root, client=mock_client)
+    assert not job.submitted
+    job.submit()
+    assert len(job.state['batches']) == 4
+    assert len(calls) == 5
+    assert job.wait(poll_interval=0.05, timeout=10)
+
+    results = list(job.results())
+    assert sorted(custom_id for custom_id, _, _, _ in results) == ['alice__app-0', 'alice__app-1', 'bob__lib-0', 'bob__lib-1']
+    assert all(content == REPLY and error is None for _, _, content, error in results)
+    job.mark_applied(['alice__app-0', 'bob__lib-1'])
+    job.mark_applied(['alice__app-1'])
+
+    # Applied ids are journaled, so a resumed run only gets the rest
+    job = BatchJob('sweep', root=batch_root, client=mock_client)
+    assert [custom_id for custom_id, _, _, _ in job.results()] == ['bob__lib-0']
@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import openai
+import pytest
+
+from JavaScriptTestMigration.scripts import mock_openai_server
+from JavaScriptTestMigration.scripts.mock_openai_server import start_mock_server
+from JavaScriptTestMigration.utils import llm_gateway
+from JavaScriptTestMigration.utils.llm_gateway import LLMGateway, TokenBucket, retry_delay
+
+REPLY = "import { render } from '@testing-library/react';"
+MESSAGES = [{'role': 'user', 'content': 'Migrate this test'}]
+
+
+class ScriptedFailures:
+    """
+    Stands in for the mock server's `random` module so the injected failures are fixed:
+    the listed status codes fail in order, every later request succeeds.
+    """
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    def random(self):
+        return 0.0 if self.statuses else 1.0
+
+    def choice(self, options):
+        return self.statuses.pop(0)
+
+
+@pytest.fixture
+def mock_server():
+    server, base_url = start_mock_server(reply=REPLY, fail_rate=0.5)
+    yield server, base_url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    calls = []
+
+    def recording_retry_delay(attempt, retry_after=None):
+        calls.append((attempt, retry_after))
+        return retry_delay(attempt, retry_after)
+
+    # Keep the real backoff shape but in milliseconds
+    monkeypatch.setattr(llm_gateway, 'BASE_RETRY_DELAY', 0.01)
+    monkeypatch.setattr(llm_gateway, 'retry_delay', recording_retry_delay)
+    return calls
+
+
+def test_rate_limits_and_server_errors_are_retried_with_backoff(mock_server, delays, monkeypatch):
+    server, base_url = mock_server
+    monkeypatch.setattr(mock_openai_server, 'random', ScriptedFailures([429, 500, 429]))
+    gateway = LLMGateway(base_url=base_url, cache_path=None)
+    try:
+        assert gateway.complete_sync(MESSAGES) == REPLY
+    finally:
+        gateway.close()
+
+    assert server.stats == {429: 2, 500: 1, 200: 1}
+    assert gateway.stats['requests'] == 1
+    assert gateway.stats['retries'] == 3
+    assert gateway.stats['failures'] == 0
+    # Each retry backs off one step further and honours the server's Retry-After
+    assert delays == [(0, '0'), (1, '0'), (2, '0')]
+
+
+def test_retries_give_up_after_max_retries(mock_server, delays, monkeypatch):
+    server, base_url = mock_server
+    monkeypatch.setattr(mock_openai_server, 'random', ScriptedFailures([500, 500, 500]))
+    gateway = LLMGateway(base_url=base_url, cache_path=None, max_retries=2)
+    try:
+        with pytest.raises(openai.InternalServerError):
+            gateway.complete_sync(MESSAGES)
+    finally:
+        gateway.close()
+
+    assert server.stats == {500: 3}
+    assert gateway.stats['failures'] == 1
+    assert gateway.stats['retries'] == 2
+    assert len(delays) == 2
+
+
+def test_retry_delay_is_jittered_capped_and_respects_retry_after():
+    for attempt in range(10):
+        delays = [retry_delay(attempt) for _ in range(50)]
+        bound = min(llm_gateway.MAX_RETRY_DELAY, llm_gateway.BASE_RETRY_DELAY * 2 ** attempt)
+        assert all(0 <= delay <= bound for delay in delays)
+        assert len(set(delays)) > 1
+    assert all(retry_delay(0, '5') >= 5 for _ in range(20))
+    assert retry_delay(0, 'Wed, 21 Oct 2026 07:28:00 GMT') <= llm_gateway.BASE_RETRY_DELAY
+
+
+def test_token_bucket_waits_for_refill():
+    async def drain():
+        bucket = TokenBucket(6000)
+        start = time.monotonic()
+        await bucket.acquire(6000)
+        burst = time.monotonic() - start
+        # 100 tokens a second, so another 50 take about half a second
+        await bucket.acquire(50)
+        return burst, time.monotonic() - start
+
+    burst, total = asyncio.run(drain())
+    assert burst < 0.1
+    assert 0.4 <= total < 1.5
+
+
+def test_requests_are_throttled_to_the_request_budget(mock_server, monkeypatch):
+    server, base_url = mock_server
+    server.fail_rate = 0.0
+    gateway = LLMGateway(base_url=base_url, cache_path=None, requests_per_minute=600)
+    try:
+        gateway.ensure_loop()
+        # Start from an empty bucket rather than a full minute's burst: 10 requests a second
+        gateway.request_bucket.tokens = 0
+        gateway.request_bucket.updated = time.monotonic()
+        start = time.monotonic()
+        results = gateway.run_all([gateway.complete(MESSAGES) for _ in range(5)])
+        elapsed = time.monotonic() - start
+    finally:
+        gateway.close()
+
+    assert results == [REPLY] * 5
+    assert server.stats == {200: 5}
+    assert 0.45 <= elapsed < 3
@@ -0,0 +1,80 @@
+import shutil
+import subprocess
+
+import pytest
+
+from JavaScriptTestMigration.utils import mirror_cache
+from JavaScriptTestMigration.utils.mirror_cache import checkout_from_mirror, ensure_mirror, mirror_path
+
+
+def git(*args, cwd):
+    return subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                          cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def commit_file(repo, name, content):
+    (repo / name).write_text(content, encoding='utf-8')
+    git('add', name, cwd=repo)
+    git('commit', '-q', '-m', f'Update {name}', cwd=repo)
+
+
+@pytest.fixture
+def remote(tmp_path):
+    repo = tmp_path / 'remote' / 'app'
+    repo.mkdir(parents=True)
+    git('init', '-q', cwd=repo)
+    commit_file(repo, 'package.json', '{"name": "app"}')
+    return repo
+
+
+@pytest.fixture
+def clones(monkeypatch):
+    calls = []
+    run_git = mirror_cache.run_git
+
+    def recording_run_git(args, cwd=None):
+        if args[0] == 'clone' and '--mirror' in args:
+            calls.append(args)
+        return run_git(args, cwd)
+
+    monkeypatch.setattr(mirror_cache, 'run_git', recording_run_git)
+    return calls
+
+
+@pytest.mark.parametrize('mode', mirror_cache.CHECKOUT_MODES)
+def test_experiment_roots_share_one_mirror(remote, clones, tmp_path, mode):
+    url = remote.as_uri()
+    mirror_root = str(tmp_path / 'mirrors')
+    for root in ('repos', 'migration'):
+        assert checkout_from_mirror('owner/app', str(tmp_path / root), url, mirror_root, mode) == 'app'
+        assert (tmp_path / root / 'app' / 'package.json').read_text(encoding='utf-8') == '{"name": "app"}'
+    assert len(clones) == 1
+
+    # Checkouts are independent: editing one leaves the other and the remote untouched
+    (tmp_path / 'migration' / 'app' / 'package.json').write_text('{}', encoding='utf-8')
+    assert (tmp_path / 'repos' / 'app' / 'package.json').read_text(encoding='utf-8') == '{"name": "app"}'
+    assert git('status', '--porcelain', cwd=remote) == ''
+
+    # A checkout deleted by a clean-up can be created again
+    shutil.rmtree(tmp_path / 'repos' / 'app')
+    checkout_from_mirror('owner/app', str(tmp_path / 'repos'), url, mirror_root, mode)
+    assert (tmp_path / 'repos' / 'app' / 'package.json').exists()
+    assert len(clones) == 1
+
+
+def test_refresh_fetches_new_commits(remote, clones, tmp_path):
+    url = remote.as_uri()
+    mirror_root = str(tmp_path / 'mirrors')
+    path = ensure_mirror('owner/app', url, mirror_root)
+    assert path == mirror_path('owner/app', mirror_root)
+
+    commit_file(remote, 'index.js', 'module.exports = 1;')
+    head = git('rev-parse', 'HEAD', cwd=remote)
+    assert ensure_mirror('owner/app', url, mirror_root) == path
+    assert git('rev-parse', 'HEAD', cwd=path) != head
+    ensure_mirror('owner/app', url, mirror_root, refresh=True)
+    assert git('rev-parse', 'HEAD', cwd=path) == head
+    assert len(clones) == 1
+
+    checkout_from_mirror('owner/app', str(tmp_path / 'repos'), url, mirror_root)
+    assert (tmp_path / 'repos' / 'app' / 'index.js').exists()
@@ -0,0 +1,45 @@
+import os
+import time
+
+from JavaScriptTestMigration.utils.process_runner import run_command
+
+
+def is_running(pid):
+    try:
+        with open(f'/proc/{pid}/stat', encoding='utf-8') as f:
+            # A killed process that its new parent has not reaped yet shows up as a zombie
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+def test_background_child_holding_the_pipes_is_killed(tmp_path):
+    log_path = tmp_path / 'command.log'
+    result = run_command(['sh', '-c', 'sleep 30 & echo $!; echo done >&2'], str(tmp_path), timeout=20, log_path=str(log_path))
+
+    assert result.returncode == 0
+    assert not result.timed_out
+    assert result.duration < 3
+    background_pid = int(next(line for line in result.tail.splitlines() if not line.startswith('[stderr]')))
+    deadline = time.monotonic() + 2
+    while is_running(background_pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not is_running(background_pid)
+    assert '[stderr] done' in log_path.read_text(encoding='utf-8')
+
+
+def test_both_streams_are_drained_and_the_timeout_kills_the_group(tmp_path):
+    # Far more stderr than a pipe buffer holds, written before anything on stdout
+    log_path = tmp_path / 'command.log'
+    result = run_command(['sh', '-c', 'head -c 1000000 /dev/zero | tr "\\0" "x" | fold -w 100 >&2; echo >&2; echo out; exit 3'],
+                         str(tmp_path), timeout=20, log_path=str(log_path), tail_lines=5)
+    assert result.returncode == 3
+    lines = log_path.read_text(encoding='utf-8').splitlines()
+    assert len(lines) == 10001
+    assert 'out' in lines
+    assert len(result.tail.splitlines()) == 5
+
+    result = run_command(['sh', '-c', 'sleep 30'], str(tmp_path), timeout=0.5)
+    assert result.timed_out
+    assert result.returncode < 0
+    assert result.duration < 10
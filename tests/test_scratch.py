@@ -0,0 +1,41 @@
+import threading
+import time
+
+from JavaScriptTestMigration.utils import scratch as scratch_module
+from JavaScriptTestMigration.utils.scratch import ScratchSpace
+
+
+def test_concurrent_stage_of_one_repo_copies_it_once(tmp_path, monkeypatch):
+    repo = tmp_path / 'repos' / 'app'
+    (repo / 'src').mkdir(parents=True)
+    (repo / 'package.json').write_text('{}', encoding='utf-8')
+    (repo / 'src' / 'a.test.js').write_text('test', encoding='utf-8')
+
+    copies = []
+    clone_tree = scratch_module.clone_tree
+
+    def slow_clone_tree(src, dst):
+        copies.append((src, dst))
+        time.sleep(0.2)
+        clone_tree(src, dst)
+
+    monkeypatch.setattr(scratch_module, 'clone_tree', slow_clone_tree)
+    space = ScratchSpace(str(tmp_path / 'scratch'), capacity_bytes=1024 ** 3)
+    seen = []
+
+    def worker():
+        with space.stage(str(repo)) as path:
+            seen.append((path, (tmp_path / path / 'src' / 'a.test.js').read_text(encoding='utf-8')))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(copies) == 1
+    assert seen == [(space.scratch_path(str(repo)), 'test')] * 4
+
+    (tmp_path / space.scratch_path(str(repo)) / 'src' / 'a.test.js').write_text('migrated', encoding='utf-8')
+    space.flush()
+    assert (repo / 'src' / 'a.test.js').read_text(encoding='utf-8') == 'migrated'